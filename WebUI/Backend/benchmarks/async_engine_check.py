@@ -0,0 +1,124 @@
+"""
+Offline check of the asyncssh engine against local SSH stand-ins.
+
+    cd WebUI/Backend
+    python -m benchmarks.async_engine_check
+    python -m benchmarks.async_engine_check --devices 200 --concurrency 100
+
+Starts one IOS-like stand-in per loopback address (see ssh_standin.py) and
+runs every task type (exec, config, interactive_exec, write_memory) on all
+of them through AsyncTaskRunner and AsyncDeviceFanout, then checks the
+failure paths: a device over the per-device timeout is reported timed out,
+and a device that never shows its prompt fails with PromptNotDetected
+rather than as a timeout. Exits 1 if any check fails; prints devices/sec.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime
+
+from benchmarks.ssh_standin import hostname_for, start_standins, stop_standins
+from wug_backend.routers.async_engine import (
+    AsyncCliSession,
+    AsyncDeviceFanout,
+    AsyncTaskRunner,
+    PromptNotDetected,
+    asyncssh_connector,
+)
+from wug_backend.routers.simple import RouterTarget, SshCredentials
+from wug_backend.routers.task_plan import compile_task_plan
+
+TASKS = [
+    {"type": "exec", "command": "show version"},
+    {"type": "config", "commands": ["interface Loopback0", "description stand-in"]},
+    {
+        "type": "interactive_exec",
+        "command": "copy running-config tftp:",
+        "steps": [
+            {"prompt": "Address or name of remote host", "answer": "10.0.0.99"},
+            {"prompt": "Destination filename", "answer": "{hostname}.cfg"},
+        ],
+    },
+    {"type": "write_memory"},
+]
+
+
+def _expected(hostname: str) -> list[str]:
+    return [f"{hostname} uptime is", f"{hostname}(config)#", f"10.0.0.99/{hostname}.cfg", "[OK]"]
+
+
+async def _checks(devices: int, concurrency: int, port: int) -> list[str]:
+    failures = []
+    credentials = SshCredentials("check", "check", "check")
+    runner = AsyncTaskRunner(connector=asyncssh_connector(port=port, connect_timeout=10), credentials=credentials)
+    plan = compile_task_plan(TASKS)
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    targets = [RouterTarget(f"127.0.0.{i}", "cisco_ios") for i in range(1, devices + 1)]
+
+    started = time.monotonic()
+    results = await AsyncDeviceFanout(concurrency=concurrency, device_timeout=60).run(
+        targets, lambda r, device_type, ctx: runner.execute_tasks(r, plan, device_type, timestamp, ctx), "cisco_ios",
+        on_result=lambda result: None,
+    )
+    elapsed = time.monotonic() - started
+    for result in results:
+        if not result.ok:
+            failures.append(f"{result.ip}: {result.error_class}: {result.error}")
+            continue
+        missing = [text for text in _expected(hostname_for(result.ip)) if text not in result.output]
+        if missing:
+            failures.append(f"{result.ip}: output lacks {missing}")
+    print(f"tasks: {len(results)} device(s) in {elapsed:.2f}s ({len(results) / elapsed:.1f} devices/sec)")
+
+    slow = compile_task_plan([{"type": "exec", "command": "slow 5"}])
+    [result] = await AsyncDeviceFanout(device_timeout=1).run(
+        targets[:1], lambda r, device_type, ctx: runner.execute_tasks(r, slow, device_type, timestamp, ctx), "cisco_ios",
+        on_result=lambda result: None,
+    )
+    if not result.timed_out:
+        failures.append(f"device timeout: expected timed_out, got {result.error_class}: {result.error}")
+    print(f"device timeout: timed_out={result.timed_out} ({result.error})")
+
+    channel = await asyncssh_connector(port=port)(targets[0].ip, "check", "check", "cisco_ios")
+    session = AsyncCliSession(channel, "cisco_ios", secret="check", read_timeout=1)
+    try:
+        await session.open()
+        await session.enable()
+        await session.send_command("hang")
+        failures.append("prompt not detected: send_command returned")
+    except PromptNotDetected as e:
+        print(f"prompt not detected: {type(e).__name__}")
+    except Exception as e:
+        failures.append(f"prompt not detected: expected PromptNotDetected, got {type(e).__name__}: {e}")
+    finally:
+        await session.close()
+    return failures
+
+
+async def _main(devices: int, concurrency: int, port: int) -> int:
+    servers = await start_standins(devices, port)
+    try:
+        failures = await _checks(devices, concurrency, port)
+    finally:
+        await stop_standins(servers)
+    for failure in failures:
+        print(f"FAILED {failure}", file=sys.stderr)
+    print("OK" if not failures else f"{len(failures)} check(s) failed")
+    return 1 if failures else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.async_engine_check")
+    parser.add_argument("--devices", type=int, default=20, help="stand-in routers, 1-254")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8022)
+    args = parser.parse_args(argv)
+    return asyncio.run(_main(args.devices, args.concurrency, args.port))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
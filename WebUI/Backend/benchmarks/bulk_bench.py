@@ -0,0 +1,286 @@
+"""
+Offline throughput benchmark for the bulk runners.
+
+    cd WebUI/Backend
+    python -m benchmarks.bulk_bench
+    python -m benchmarks.bulk_bench --sizes 1000 10000 --modes add upsert --parallelism 1 4
+    python -m benchmarks.bulk_bench --baseline benchmarks/results/bulk-20260101-120000.json
+
+Every case (mode x rows x parallelism) runs in its own child process against
+a fresh sqlite file holding the WUG tables the bulk code touches (see
+sqlite_odbc.py), so peak RSS is per case. Absolute numbers are not SQL
+Server numbers; round trips and relative rows/sec between releases are what
+to watch. sqlite serialises writers, so parallelism > 1 only shows the
+engine's own overhead here.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import csv
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+MODES = ("add", "update", "update-diff", "delete", "upsert", "monitor")
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEVICE_TYPES = 5
+DEVICE_GROUPS = 10
+MONITOR_TYPE_ID = 7
+
+
+def _address(i: int) -> str:
+    return f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"
+
+
+def _name(i: int) -> str:
+    return f"bench-{i:07d}"
+
+
+def _group(i: int) -> int:
+    return i % DEVICE_GROUPS + 1
+
+
+# ---------- fixtures ----------
+def seed_database(path: str, devices: int) -> None:
+    import sqlite3
+
+    from benchmarks.sqlite_odbc import create_schema
+
+    create_schema(path)
+    conn = sqlite3.connect(path)
+    try:
+        conn.executemany("INSERT INTO DeviceType VALUES (?, ?)", [(i, f"Type {i}") for i in range(1, DEVICE_TYPES + 1)])
+        conn.executemany("INSERT INTO DeviceGroup VALUES (?, ?)", [(i, f"Group {i}") for i in range(1, DEVICE_GROUPS + 1)])
+        conn.executemany(
+            "INSERT INTO ActiveMonitorType (nActiveMonitorTypeID, sMonitorTypeName, bRemoved) VALUES (?, ?, 0)",
+            [(2, "Ping"), (MONITOR_TYPE_ID, "SNMP")],
+        )
+        ids = range(1, devices + 1)
+        conn.executemany(
+            "INSERT INTO Device (nDeviceID, sDisplayName, nDeviceTypeID, sNote, nActionPolicyID, "
+            "nDefaultNetworkInterfaceID, bRemoved) VALUES (?, ?, ?, 'seed', ?, ?, 0)",
+            [(i, _name(i), i % DEVICE_TYPES + 1, i, i) for i in ids],
+        )
+        conn.executemany(
+            "INSERT INTO NetworkInterface (nNetworkInterfaceID, nDeviceID, nAddressType, bPollUsingNetworkName, "
+            "sNetworkAddress, sNetworkName) VALUES (?, ?, 1, 0, ?, ?)",
+            [(i, i, _address(i), _name(i)) for i in ids],
+        )
+        conn.executemany("INSERT INTO PivotDeviceToGroup VALUES (?, ?)", [(i, _group(i)) for i in ids])
+        conn.executemany(
+            "INSERT INTO PivotActiveMonitorTypeToDevice (nDeviceID, nActiveMonitorTypeID, nNetworkInterfaceID, "
+            "bRemoved, sArgument, sComment) VALUES (?, 2, ?, 0, '', '')",
+            [(i, i) for i in ids],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def write_sheet(path: Path, mode: str, rows: int) -> None:
+    """Sheet in the shape the runners get after ingest (lookups already resolved to ids)."""
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        w = csv.writer(f)
+        if mode in ("add", "upsert"):
+            w.writerow(["DisplayName", "DeviceType", "DeviceGroup", "NetworkAddress", "NetworkName", "Notes", "nPollInterval"])
+            # upsert: the first half of the sheet already exists (seeded), the rest is new
+            for i in range(1, rows + 1):
+                w.writerow([_name(i), i % DEVICE_TYPES + 1, _group(i), _address(i), _name(i), f"note {i}", ""])
+        elif mode in ("update", "update-diff"):
+            w.writerow(["sDisplayName", "sDeviceGroup", "sNetworkAddress", "NewNotes", "NewNetworkName"])
+            for i in range(1, rows + 1):
+                # every other row asks for the value the device already has, so diff mode can skip it
+                note = "seed" if i % 2 else f"changed {i}"
+                w.writerow([_name(i), f"Group {_group(i)}", _address(i), note, _name(i)])
+        elif mode in ("delete", "monitor"):
+            w.writerow(["sDisplayName", "sNetworkAddress"])
+            for i in range(1, rows + 1):
+                w.writerow([_name(i), _address(i)])
+        else:
+            raise ValueError(f"Unknown mode: {mode}")
+
+
+# ---------- child: one case ----------
+def _peak_rss_kb() -> int | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _install_stand_in() -> None:
+    # The bulk modules import pyodbc at module level; without an ODBC driver the stand-in takes its place.
+    try:
+        import pyodbc  # noqa: F401
+    except ImportError:
+        from benchmarks import sqlite_odbc
+
+        sys.modules["pyodbc"] = sqlite_odbc
+
+
+def _use_case(mode: str, db_path: str):
+    from benchmarks.sqlite_odbc import connect
+
+    if mode == "add":
+        from wug_backend.bulk.add import BulkAddUseCase as cls
+    elif mode in ("update", "update-diff"):
+        from wug_backend.bulk.update import BulkUpdateUseCase as cls
+    elif mode == "delete":
+        from wug_backend.bulk.delete import BulkDeleteUseCase as cls
+    elif mode == "upsert":
+        from wug_backend.bulk.upsert import BulkUpsertUseCase as cls
+    else:
+        from wug_backend.bulk.monitors import BulkMonitorUseCase as cls
+
+    uc = cls(db_path)
+    uc._connect = lambda: connect(db_path)
+    return uc
+
+
+def run_case(mode: str, rows: int, parallelism: int, batch_size: int) -> dict:
+    _install_stand_in()
+    from benchmarks.sqlite_odbc import COUNTER
+    from wug_backend.bulk.engine import BulkRunOptions
+
+    with tempfile.TemporaryDirectory(prefix="wug-bench-") as tmp:
+        db_path = str(Path(tmp) / "wug.db")
+        seeded = 0 if mode == "add" else rows // 2 if mode == "upsert" else rows
+        seed_database(db_path, seeded)
+        sheet = Path(tmp) / f"{mode}.csv"
+        write_sheet(sheet, mode, rows)
+
+        uc = _use_case(mode, db_path)
+        options = BulkRunOptions(parallelism=parallelism, batch_size=batch_size, diff=mode == "update-diff")
+        start = time.perf_counter()
+        with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink), contextlib.redirect_stderr(sink):
+            if mode == "monitor":
+                rc = uc.execute("assign", str(MONITOR_TYPE_ID), csv_path=str(sheet))
+            else:
+                rc = uc.execute_from_csv_path(str(sheet), options)
+        seconds = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "rows": rows,
+        "parallelism": parallelism,
+        "batch_size": batch_size,
+        "returncode": rc,
+        "seconds": round(seconds, 4),
+        "rows_per_sec": round(rows / seconds, 1) if seconds else None,
+        "round_trips": COUNTER.total,
+        "executes": COUNTER.executes,
+        "commits": COUNTER.commits,
+        "round_trips_per_row": round(COUNTER.total / rows, 3) if rows else None,
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+
+
+# ---------- parent ----------
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _case_key(case: dict) -> tuple:
+    return case["mode"], case["rows"], case["parallelism"], case["batch_size"]
+
+
+def compare(results: dict, baseline_path: Path, tolerance: float) -> int:
+    baseline = {_case_key(c): c for c in json.loads(baseline_path.read_text(encoding="utf-8"))["cases"]}
+    regressions = 0
+    print(f"\nAgainst {baseline_path.name} (tolerance {tolerance:.0%}):")
+    for case in results["cases"]:
+        before = baseline.get(_case_key(case))
+        if not before or not before.get("rows_per_sec") or not case.get("rows_per_sec"):
+            continue
+        change = case["rows_per_sec"] / before["rows_per_sec"] - 1
+        flag = ""
+        if change < -tolerance or case["round_trips"] > before["round_trips"]:
+            flag = "  <-- regression"
+            regressions += 1
+        print(
+            f"  {case['mode']:<12} rows={case['rows']:<7} p={case['parallelism']} "
+            f"{before['rows_per_sec']:>10} -> {case['rows_per_sec']:>10} rows/s ({change:+.1%}), "
+            f"round trips {before['round_trips']} -> {case['round_trips']}{flag}"
+        )
+    return 1 if regressions else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bulk_bench")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--parallelism", type=int, nargs="+", default=[1])
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--out", default="")
+    parser.add_argument("--baseline", default="")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    parser.add_argument("--child", default="", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        spec = json.loads(args.child)
+        print(json.dumps(run_case(**spec)))
+        return 0
+
+    from constants import BULK_BATCH_SIZE
+
+    batch_size = args.batch_size or BULK_BATCH_SIZE
+    results = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "engine": "sqlite stand-in",
+        "cases": [],
+    }
+    for rows in args.sizes:
+        for mode in args.modes:
+            for parallelism in args.parallelism:
+                spec = {"mode": mode, "rows": rows, "parallelism": parallelism, "batch_size": batch_size}
+                proc = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bulk_bench", "--child", json.dumps(spec)],
+                    cwd=BACKEND_DIR,
+                    capture_output=True,
+                    text=True,
+                )
+                if proc.returncode != 0:
+                    print(f"{mode} rows={rows} p={parallelism}: FAILED\n{proc.stderr}", file=sys.stderr)
+                    continue
+                case = json.loads(proc.stdout.strip().splitlines()[-1])
+                results["cases"].append(case)
+                print(
+                    f"{mode:<12} rows={rows:<7} p={parallelism} {case['seconds']:>9.2f}s "
+                    f"{case['rows_per_sec']:>10} rows/s  {case['round_trips_per_row']} rt/row  "
+                    f"peak {case['peak_rss_kb']} KB",
+                    flush=True,
+                )
+
+    out = Path(args.out) if args.out else RESULTS_DIR / f"bulk-{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"Results written to {out}")
+
+    if args.baseline:
+        return compare(results, Path(args.baseline), args.tolerance)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,145 @@
+"""
+Offline check of resuming a checkpointed bulk run.
+
+    cd WebUI/Backend
+    python -m benchmarks.bulk_resume_check
+    python -m benchmarks.bulk_resume_check --rows 5000 --parallelism 1 2 4
+
+Runs BulkRowEngine over a fake connection: the first run fails one early
+row and is killed part-way through, the second resumes from its checkpoint.
+The resume must finish (not hang on its own unflushed batch), report every
+row once and in order, re-run only the failed and unreached rows, and
+leave every row committed. Exits 1 if any check fails.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+from wug_backend.bulk.checkpoint import BulkCheckpoint
+from wug_backend.bulk.engine import BulkRowEngine, BulkRunOptions
+
+
+class _Crash(BaseException):
+    """Stands in for the runner process being killed; not caught by the engine."""
+
+
+class _FakeConnection:
+    def __init__(self, committed: set[int], lock: threading.Lock) -> None:
+        self._committed = committed
+        self._lock = lock
+        self.staged: list[int] = []
+
+    def cursor(self) -> "_FakeConnection":
+        return self
+
+    def commit(self) -> None:
+        with self._lock:
+            self._committed.update(self.staged)
+        self.staged = []
+
+    def rollback(self) -> None:
+        self.staged = []
+
+    def close(self) -> None:
+        pass
+
+
+def _run(path: Path, rows: list[dict], options: BulkRunOptions, resume: bool, fail: int, crash: int, committed: set[int]):
+    lock = threading.Lock()
+    conns: list[_FakeConnection] = []
+    processed: list[int] = []
+
+    def connect() -> _FakeConnection:
+        conns.append(_FakeConnection(committed, lock))
+        return conns[-1]
+
+    def process_row(cursor: _FakeConnection, row: dict) -> tuple[bool, str]:
+        n = row["n"]
+        if crash and n == crash:
+            raise _Crash()
+        if n == fail:
+            raise ValueError(f"row {n} rejected")
+        with lock:
+            processed.append(n)
+        cursor.staged.append(n)
+        return True, ""
+
+    checkpoint = BulkCheckpoint(path)
+    checkpoint.open("check", "check.csv", {}, resume=resume)
+    reported: list[int] = []
+    engine = BulkRowEngine(connect, process_row, lambda r: str(r["n"]), lambda r: str(r["n"]),
+                           lambda o: reported.append(o.index), options, checkpoint)
+    outcome: dict = {}
+
+    def _target() -> None:
+        try:
+            outcome["outcomes"] = engine.run(rows)
+        except _Crash:
+            outcome["crashed"] = True
+
+    worker = threading.Thread(target=_target, daemon=True)
+    worker.start()
+    worker.join(timeout=60)
+    return worker.is_alive(), outcome, reported, processed
+
+
+def check(rows: int, parallelism: int, batch_size: int, fail: int, crash: int) -> list[str]:
+    failures = []
+    sheet = [{"n": n} for n in range(1, rows + 1)]
+    options = BulkRunOptions(parallelism=parallelism, batch_size=batch_size)
+    committed: set[int] = set()
+    with tempfile.TemporaryDirectory(prefix="wug-resume-") as tmp:
+        path = Path(tmp) / "check.checkpoint.jsonl"
+        hung, first, _, _ = _run(path, sheet, options, False, fail, crash, committed)
+        if hung or not first.get("crashed"):
+            return [f"first run: expected a crash at row {crash}, got hung={hung} {sorted(first)}"]
+        before = set(committed)
+
+        hung, second, reported, processed = _run(path, sheet, options, True, 0, 0, committed)
+        if hung:
+            return ["resume: did not finish within 60s"]
+        outcomes = second.get("outcomes") or []
+        if [o.index for o in outcomes] != list(range(1, rows + 1)):
+            failures.append("resume: outcomes are not every row once, in order")
+        if reported != sorted(reported):
+            failures.append("resume: rows were reported out of order")
+        rerun = set(processed) & before
+        if rerun:
+            failures.append(f"resume: {len(rerun)} already committed row(s) were run again, e.g. {min(rerun)}")
+        if fail not in processed:
+            failures.append(f"resume: failed row {fail} was not retried")
+        if committed != set(range(1, rows + 1)):
+            failures.append(f"resume: {rows - len(committed)} row(s) are not committed")
+        if not all(o.ok for o in outcomes):
+            failures.append("resume: some rows failed")
+    return failures
+
+
+def main(argv: list[str] | None = None) -> int:
+    from constants import BULK_BATCH_SIZE
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bulk_resume_check")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--parallelism", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE)
+    parser.add_argument("--fail", type=int, default=5, help="row that fails in the first run")
+    parser.add_argument("--crash", type=int, default=1001, help="row the first run is killed at")
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for parallelism in args.parallelism:
+        failures = check(args.rows, parallelism, args.batch_size, args.fail, args.crash)
+        for failure in failures:
+            print(f"FAILED p={parallelism} {failure}", file=sys.stderr)
+        print(f"parallelism={parallelism}: {'OK' if not failures else f'{len(failures)} check(s) failed'}")
+        failed += len(failures)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,154 @@
+"""
+pyodbc-shaped stand-in over sqlite3 for offline bulk benchmarks.
+
+Only what wug_backend/bulk/*.py needs is supported: `connect()`,
+`cursor.execute(sql, *params)` / `execute(sql, [params])`, fetchone/fetchall,
+rowcount, commit/rollback. T-SQL used by the bulk SQL is rewritten on the fly
+(SET NOCOUNT, DECLARE @x INT = SCOPE_IDENTITY(), GETDATE(), ISNULL()).
+Every `execute()` and `commit()` is counted as one round trip, which is what
+it costs against SQL Server.
+"""
+
+from __future__ import annotations
+
+import re
+import sqlite3
+import threading
+
+_DECLARE = re.compile(r"^DECLARE\s+(@\w+)\s+\w+\s*=\s*SCOPE_IDENTITY\(\)$", re.IGNORECASE)
+_VARIABLE = re.compile(r"@\w+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS DeviceType (nDeviceTypeID INTEGER PRIMARY KEY, sDisplayName TEXT);
+CREATE TABLE IF NOT EXISTS DeviceGroup (nDeviceGroupID INTEGER PRIMARY KEY, sGroupName TEXT);
+CREATE TABLE IF NOT EXISTS ActionPolicy (
+    nActionPolicyID INTEGER PRIMARY KEY, sPolicyName TEXT, bExecuteAll INTEGER, bGlobalActionPolicy INTEGER
+);
+CREATE TABLE IF NOT EXISTS Device (
+    nDeviceID INTEGER PRIMARY KEY, sDisplayName TEXT, nDeviceTypeID INTEGER, nDeviceMenuSetID INTEGER,
+    nDeviceWebMenuSetID INTEGER, bSnmpManageable INTEGER, sSnmpOID TEXT, bAssumedState INTEGER,
+    nWorstStateID INTEGER, nBestStateID INTEGER, nPollInterval NUMERIC, sNote TEXT, sStatus TEXT,
+    sL2MainIPAddress TEXT, nActionPolicyID INTEGER, bGatherPerformanceData INTEGER, bFireActions INTEGER,
+    bRemoved INTEGER DEFAULT 0, sMaintenanceSchedule TEXT, bManualMaintenanceMode INTEGER,
+    nUnAcknowledgedPassiveMonitors INTEGER, nUnAcknowledgedActiveMonitors INTEGER, bPollingOrder INTEGER,
+    nDefaultNetworkInterfaceID INTEGER
+);
+CREATE INDEX IF NOT EXISTS IX_Device_Name ON Device (sDisplayName);
+CREATE TABLE IF NOT EXISTS NetworkInterface (
+    nNetworkInterfaceID INTEGER PRIMARY KEY, nDeviceID INTEGER, nPhysicalInterfaceID INTEGER,
+    nAddressType INTEGER, bPollUsingNetworkName INTEGER, sNetworkAddress TEXT, sNetworkName TEXT
+);
+CREATE INDEX IF NOT EXISTS IX_NetworkInterface_Device ON NetworkInterface (nDeviceID);
+CREATE INDEX IF NOT EXISTS IX_NetworkInterface_Address ON NetworkInterface (sNetworkAddress);
+CREATE TABLE IF NOT EXISTS DeviceAttribute (
+    nDeviceAttributeID INTEGER PRIMARY KEY, nDeviceID INTEGER, sName TEXT, sValue TEXT
+);
+CREATE INDEX IF NOT EXISTS IX_DeviceAttribute_Device ON DeviceAttribute (nDeviceID);
+CREATE TABLE IF NOT EXISTS PivotDeviceToGroup (nDeviceID INTEGER, nDeviceGroupID INTEGER);
+CREATE INDEX IF NOT EXISTS IX_PivotDeviceToGroup_Device ON PivotDeviceToGroup (nDeviceID);
+CREATE TABLE IF NOT EXISTS ActiveMonitorType (
+    nActiveMonitorTypeID INTEGER PRIMARY KEY, sMonitorTypeName TEXT, bRemoved INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS PivotActiveMonitorTypeToDevice (
+    nPivotActiveMonitorTypeToDeviceID INTEGER PRIMARY KEY, nDeviceID INTEGER, nActiveMonitorTypeID INTEGER,
+    nNetworkInterfaceID INTEGER, bAssumedState INTEGER, nMonitorStateID INTEGER, dLastInternalStateTime TEXT,
+    nActionPolicyID INTEGER, nPollInterval INTEGER, bGatherPerformanceData INTEGER, bFireActions INTEGER,
+    bDisabled INTEGER, bRemoved INTEGER, sArgument TEXT, sComment TEXT, nCriticalPollingOrder INTEGER
+);
+CREATE INDEX IF NOT EXISTS IX_PivotActiveMonitor_Device ON PivotActiveMonitorTypeToDevice (nDeviceID);
+CREATE TABLE IF NOT EXISTS Annotation (nAnnotationID INTEGER PRIMARY KEY, nDeviceID INTEGER, sNote TEXT);
+"""
+
+
+class RoundTripCounter:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.executes = 0
+        self.commits = 0
+
+    def add(self, executes: int = 0, commits: int = 0) -> None:
+        with self._lock:
+            self.executes += executes
+            self.commits += commits
+
+    @property
+    def total(self) -> int:
+        return self.executes + self.commits
+
+
+COUNTER = RoundTripCounter()
+
+
+def _translate(sql: str) -> list[str]:
+    sql = re.sub(r"SET\s+NOCOUNT\s+ON\s*;", "", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"GETDATE\(\)", "CURRENT_TIMESTAMP", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bISNULL\(", "IFNULL(", sql, flags=re.IGNORECASE)
+    return [s.strip() for s in sql.split(";") if s.strip()]
+
+
+class Cursor:
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self._cur = conn.cursor()
+        self.rowcount = -1
+
+    def execute(self, sql: str, *params):
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            params = tuple(params[0])
+        COUNTER.add(executes=1)
+
+        # One pyodbc batch may hold several statements; hand each its share of the parameters.
+        variables: dict[str, int] = {}
+        remaining = list(params)
+        for statement in _translate(sql):
+            declare = _DECLARE.match(statement)
+            if declare:
+                variables[declare.group(1).lower()] = self._cur.lastrowid
+                continue
+            statement = _VARIABLE.sub(lambda m: str(variables[m.group(0).lower()]), statement)
+            n = statement.count("?")
+            self._cur.execute(statement, remaining[:n])
+            remaining = remaining[n:]
+            self.rowcount = self._cur.rowcount
+        return self
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    def close(self) -> None:
+        self._cur.close()
+
+
+class Connection:
+    def __init__(self, path: str) -> None:
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level="DEFERRED")
+        self.autocommit = False
+
+    def cursor(self) -> Cursor:
+        return Cursor(self._conn)
+
+    def commit(self) -> None:
+        COUNTER.add(commits=1)
+        self._conn.commit()
+
+    def rollback(self) -> None:
+        self._conn.rollback()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def connect(path: str, autocommit: bool = False) -> Connection:
+    return Connection(path)
+
+
+def create_schema(path: str) -> None:
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.commit()
+    finally:
+        conn.close()
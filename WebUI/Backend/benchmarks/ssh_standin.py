@@ -0,0 +1,116 @@
+"""
+IOS-like SSH server stand-in for exercising the asyncssh engine offline.
+
+One asyncssh listener per loopback address (127.0.0.1, 127.0.0.2, ...) on a
+shared port, so every address is a separate "router" whose hostname is
+derived from it (R127-0-0-5). Any username/password is accepted. The CLI
+supports what the task model sends: enable (any secret), terminal length 0,
+configure terminal / end, write memory, a few show commands, and
+
+    copy running-config tftp:   asks for the remote host and filename
+    slow <seconds>              sleeps, then returns to the prompt
+    hang                        prints output but never a prompt again
+"""
+
+from __future__ import annotations
+
+import asyncio
+
+import asyncssh
+
+SHOW_OUTPUTS = {
+    "show version": "Cisco IOS Software, stand-in\n{hostname} uptime is 1 week, 2 days",
+    "show clock": "*12:00:00.000 UTC Mon Jan 1 2024",
+    "show ip interface brief": (
+        "Interface              IP-Address      OK? Method Status                Protocol\n"
+        "GigabitEthernet0/0     {ip}       YES manual up                    up"
+    ),
+}
+
+
+def hostname_for(address: str) -> str:
+    return "R" + address.replace(".", "-")
+
+
+class _Server(asyncssh.SSHServer):
+    def begin_auth(self, username: str) -> bool:
+        return True
+
+    def password_auth_supported(self) -> bool:
+        return True
+
+    def validate_password(self, username: str, password: str) -> bool:
+        return True
+
+
+async def _cli(process: asyncssh.SSHServerProcess) -> None:
+    address = process.get_extra_info("sockname")[0]
+    hostname = hostname_for(address)
+    mode = ">"
+
+    def prompt() -> str:
+        return f"{hostname}{mode}"
+
+    async def ask(question: str) -> str:
+        process.stdout.write(question)
+        return (await process.stdin.readline()).strip()
+
+    process.stdout.write(f"\r\nStand-in router {hostname}\r\n\r\n{prompt()}")
+    try:
+        while True:
+            line = await process.stdin.readline()
+            if not line:
+                break
+            command = line.strip()
+            out = ""
+            if command == "enable":
+                await ask("Password: ")
+                mode = "#"
+            elif command == "configure terminal":
+                out = "Enter configuration commands, one per line.  End with CNTL/Z."
+                mode = "(config)#"
+            elif command == "end":
+                mode = "#"
+            elif mode == "(config)#" or command.startswith("terminal ") or not command:
+                pass
+            elif command == "write memory":
+                out = "Building configuration...\n[OK]"
+            elif command == "copy running-config tftp:":
+                remote = await ask("Address or name of remote host []? ")
+                filename = await ask(f"Destination filename [{hostname.lower()}-confg]? ")
+                out = f"!!\n1234 bytes copied to {remote}/{filename}"
+            elif command.startswith("slow "):
+                await asyncio.sleep(float(command.split()[1]))
+                out = "done"
+            elif command == "hang":
+                process.stdout.write("working...\r\n")
+                await asyncio.Event().wait()
+            elif command in SHOW_OUTPUTS:
+                out = SHOW_OUTPUTS[command].format(hostname=hostname, ip=address)
+            else:
+                out = "% Invalid input detected at '^' marker."
+            if out:
+                process.stdout.write(out.replace("\n", "\r\n") + "\r\n")
+            process.stdout.write(prompt())
+    except (asyncssh.BreakReceived, asyncssh.TerminalSizeChanged, asyncssh.ConnectionLost):
+        pass
+    process.exit(0)
+
+
+async def start_standins(count: int, port: int) -> list[asyncssh.SSHAcceptor]:
+    """Listeners on 127.0.0.1 .. 127.0.0.<count> (Linux routes all of 127/8 to loopback)."""
+    if not 0 < count < 255:
+        raise ValueError("count must be between 1 and 254")
+    host_key = asyncssh.generate_private_key("ssh-ed25519")
+    return [
+        await asyncssh.create_server(
+            _Server, f"127.0.0.{i}", port, server_host_keys=[host_key], process_factory=_cli
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+async def stop_standins(servers: list[asyncssh.SSHAcceptor]) -> None:
+    for server in servers:
+        server.close()
+        await server.wait_closed()
@@ -100,6 +100,8 @@ BACKUP_BASE_DIR = DATA_DIR / "backups"
 CONFIG_BULK_ADD_DIR = CONFIG_DIR / "bulk_add"
 CONFIG_BULK_UPDATE_DIR = CONFIG_DIR / "bulk_update"
 CONFIG_BULK_DELETE_DIR = CONFIG_DIR / "bulk_delete"
+CONFIG_BULK_UPSERT_DIR = CONFIG_DIR / "bulk_upsert"
+CONFIG_BULK_MONITOR_DIR = CONFIG_DIR / "bulk_monitor"
 CONFIG_ROUTER_SIMPLE_DIR = CONFIG_DIR / "router_simple"
 CONFIG_ROUTER_INTERACTIVE_DIR = CONFIG_DIR / "router_interactive"
 
@@ -113,6 +115,8 @@ BACKUP_DEVICE_CREDENTIALS_FILE = DATA_DIR / "backup_device_credentials.json"
 # JSON-based schedule used by the API and scheduler
 REPORT_SCHEDULE_JSON_FILE = DATA_DIR / "report_schedule.json"
 BACKUP_SCHEDULE_JSON_FILE = DATA_DIR / "backup_schedule.json"
+# History of background bulk jobs (summaries only; live events are kept in memory)
+BULK_JOBS_HISTORY_FILE = DATA_DIR / "bulk_jobs.json"
 USERS_FILE = DATA_DIR / "users.json"
 ACTIVITY_LOG_FILE = DATA_DIR / "activity_log.json"
 
@@ -122,13 +126,39 @@ SCRIPTS = {
     "add": "wug_backend.runners.bulk_add",
     "update": "wug_backend.runners.bulk_update",
     "delete": "wug_backend.runners.bulk_delete",
+    "upsert": "wug_backend.runners.bulk_upsert",
 }
 
+# Active monitor assign/remove runner (POST /bulk/monitors); takes its own CLI flags
+BULK_MONITOR_SCRIPT = "wug_backend.runners.bulk_monitor"
+BULK_MONITOR_CHUNK_SIZE = 500
+BULK_MONITOR_ACTIONS = ("assign", "remove")
+
+# Background bulk jobs (POST /run with async_job=true)
+BULK_JOB_WORKERS = int(os.environ.get("WUG_BULK_JOB_WORKERS", "2"))
+BULK_JOB_HISTORY_LIMIT = 200
+# Finished jobs kept in memory with their events; older ones are served from the history file.
+BULK_JOB_LIVE_LIMIT = 20
+BULK_JOB_EVENT_POLL_SECONDS = 0.5
+
+# Uploads are streamed into the saved config in chunks of this many rows
+BULK_INGEST_CHUNK_ROWS = 5000
+
+# Bulk engine: rows per transaction and upper bound on sharded DB connections
+BULK_BATCH_SIZE = int(os.environ.get("WUG_BULK_BATCH_SIZE", "100"))
+BULK_MAX_PARALLELISM = int(os.environ.get("WUG_BULK_MAX_PARALLELISM", "8"))
+# update_mode of POST /run: write every column, or only the ones that differ from the DB
+BULK_UPDATE_MODES = ("write", "diff")
+
+# Per-run commit journal kept next to the saved config (Name.csv -> Name.checkpoint.jsonl)
+BULK_CHECKPOINT_SUFFIX = ".checkpoint.jsonl"
+
 # CSV filenames for bulk operations
 CSV_NAMES = {
     "add": "Add.csv",
     "update": "Update.csv",
     "delete": "Delete.csv",
+    "upsert": "Upsert.csv",
 }
 
 # ================= ENVIRONMENT VARIABLES =================
@@ -138,6 +168,119 @@ ENV_WUG_TASKS = "WUG_TASKS"
 ENV_WUG_SSH_USER = "WUG_SSH_USER"
 ENV_WUG_SSH_PASS = "WUG_SSH_PASS"
 ENV_WUG_SSH_ENABLE = "WUG_SSH_ENABLE"
+ENV_WUG_ROUTER_CONCURRENCY = "WUG_ROUTER_CONCURRENCY"
+ENV_WUG_DEVICE_TIMEOUT = "WUG_DEVICE_TIMEOUT"
+ENV_WUG_SSH_ENGINE = "WUG_SSH_ENGINE"
+ENV_WUG_ROUTER_EVENTS = "WUG_ROUTER_EVENTS"
+ENV_WUG_ROUTER_RESULTS = "WUG_ROUTER_RESULTS_FILE"
+ENV_WUG_ROUTER_PREFLIGHT = "WUG_ROUTER_PREFLIGHT"
+ENV_WUG_RUN_BUDGET = "WUG_RUN_BUDGET"
+ENV_WUG_ROUTER_CANCEL_FILE = "WUG_ROUTER_CANCEL_FILE"
+ENV_WUG_ROUTER_AUTODETECT = "WUG_ROUTER_AUTODETECT"
+ENV_WUG_QUERY_COMMAND = "WUG_QUERY_COMMAND"
+ENV_WUG_QUERY_PARSER = "WUG_QUERY_PARSER"
+ENV_WUG_QUERY_TEMPLATE = "WUG_QUERY_TEMPLATE"
+ENV_WUG_EXEC_CACHE_MAX_AGE = "WUG_EXEC_CACHE_MAX_AGE"
+ENV_WUG_EXEC_CACHE_REFRESH = "WUG_EXEC_CACHE_REFRESH"
+
+# Router runs: devices handled at once and per-device wall-clock limit (seconds, 0 = none)
+ROUTER_CONCURRENCY_DEFAULT = int(os.environ.get("WUG_ROUTER_CONCURRENCY_DEFAULT", "10"))
+ROUTER_MAX_CONCURRENCY = int(os.environ.get("WUG_ROUTER_MAX_CONCURRENCY", "64"))
+ROUTER_DEVICE_TIMEOUT_DEFAULT = float(os.environ.get("WUG_DEVICE_TIMEOUT_DEFAULT", "300"))
+
+# Run-level wall-clock budget (seconds, 0 = none): devices still in flight when it runs out are
+# aborted and reported as timed out. Runner processes get the budget plus a grace period to write
+# their results before they are killed.
+ROUTER_RUN_BUDGET_DEFAULT = float(os.environ.get("WUG_ROUTER_RUN_BUDGET_DEFAULT", "3600"))
+ROUTER_RUN_KILL_GRACE = float(os.environ.get("WUG_ROUTER_RUN_KILL_GRACE", "30"))
+BACKUP_RUN_TIMEOUT = float(os.environ.get("WUG_BACKUP_RUN_TIMEOUT", "3600"))
+
+# SSH engines for router runs: "netmiko" (thread per device) or "asyncssh" (one event loop, needs asyncssh installed)
+ROUTER_SSH_ENGINES = ("netmiko", "asyncssh")
+ROUTER_ASYNC_MAX_CONCURRENCY = int(os.environ.get("WUG_ROUTER_ASYNC_MAX_CONCURRENCY", "2000"))
+ROUTER_ASYNC_CONNECT_TIMEOUT = float(os.environ.get("WUG_ROUTER_ASYNC_CONNECT_TIMEOUT", "20"))
+ROUTER_ASYNC_SSH_PORT = int(os.environ.get("WUG_ROUTER_ASYNC_SSH_PORT", "22"))
+
+# Persistent SSH session pool (netmiko): when enabled, router runs and backups execute in the API
+# process and reuse logged-in sessions keyed by (host, username, device_type).
+ROUTER_SESSION_POOL_ENABLED = os.environ.get("WUG_ROUTER_SESSION_POOL_ENABLED", "false").lower() == "true"
+ROUTER_SESSION_POOL_MAX = int(os.environ.get("WUG_ROUTER_SESSION_POOL_MAX", "50"))
+ROUTER_SESSION_IDLE_TIMEOUT = float(os.environ.get("WUG_ROUTER_SESSION_IDLE_TIMEOUT", "600"))
+ROUTER_SESSION_KEEPALIVE = int(os.environ.get("WUG_ROUTER_SESSION_KEEPALIVE", "30"))
+
+# TCP reachability preflight: every target's SSH port (TELNET_PORT for *_telnet device types) is
+# probed at once before any SSH work; unreachable hosts are reported and skipped. Results are cached
+# on disk for back-to-back runs: reachable ones for CACHE_TTL, unreachable ones only NEGATIVE_TTL.
+ROUTER_PREFLIGHT_ENABLED = os.environ.get("WUG_ROUTER_PREFLIGHT_ENABLED", "true").lower() == "true"
+ROUTER_PREFLIGHT_PORT = int(os.environ.get("WUG_ROUTER_PREFLIGHT_PORT", "22"))
+ROUTER_PREFLIGHT_TELNET_PORT = int(os.environ.get("WUG_ROUTER_PREFLIGHT_TELNET_PORT", "23"))
+ROUTER_PREFLIGHT_TIMEOUT = float(os.environ.get("WUG_ROUTER_PREFLIGHT_TIMEOUT", "2"))
+ROUTER_PREFLIGHT_CONCURRENCY = int(os.environ.get("WUG_ROUTER_PREFLIGHT_CONCURRENCY", "256"))
+ROUTER_PREFLIGHT_CACHE_TTL = float(os.environ.get("WUG_ROUTER_PREFLIGHT_CACHE_TTL", "30"))
+ROUTER_PREFLIGHT_NEGATIVE_TTL = float(os.environ.get("WUG_ROUTER_PREFLIGHT_NEGATIVE_TTL", "5"))
+ROUTER_PREFLIGHT_CACHE_FILE = DATA_DIR / "preflight_cache.json"
+
+# Config push fast path: configs of at least MIN_LINES lines are copied to the device over SCP and
+# applied with one `copy <file> running-config` instead of line by line (0 = always line mode).
+# FILE_SYSTEM "" lets netmiko pick the device's default (flash:, bootflash:, ...).
+ROUTER_FILE_PUSH_MIN_LINES = int(os.environ.get("WUG_ROUTER_FILE_PUSH_MIN_LINES", "500"))
+ROUTER_FILE_PUSH_FILE_SYSTEM = os.environ.get("WUG_ROUTER_FILE_PUSH_FILE_SYSTEM", "")
+ROUTER_FILE_PUSH_APPLY_TIMEOUT = float(os.environ.get("WUG_ROUTER_FILE_PUSH_APPLY_TIMEOUT", "300"))
+
+# Device-type autodetection (opt-in per run): routers listed without a type, or typed "autodetect",
+# are probed once with netmiko's SSHDetect; results are cached per host and reused by runs and backups.
+ROUTER_AUTODETECT_ENABLED = os.environ.get("WUG_ROUTER_AUTODETECT_ENABLED", "false").lower() == "true"
+ROUTER_AUTODETECT_CONCURRENCY = int(os.environ.get("WUG_ROUTER_AUTODETECT_CONCURRENCY", "16"))
+ROUTER_AUTODETECT_CACHE_TTL = float(os.environ.get("WUG_ROUTER_AUTODETECT_CACHE_TTL", str(7 * 24 * 3600)))
+ROUTER_AUTODETECT_CACHE_FILE = DATA_DIR / "device_type_cache.json"
+
+# Connect governor shared by router runs and backups in the API process, the worker pool and runner
+# subprocesses through STATE_FILE (under a file lock; 0 = no limit). Sessions are
+# capped globally, per site (a `site=` tag in the routers list, else the IP's /SITE_PREFIX network)
+# and per AAA server group (an `aaa=` tag); new connects are rate limited with a token bucket.
+# Per-key overrides: "nyc=5,10.20.0.0/16=2" (sites) and "tacacs-east=20" (AAA groups).
+ROUTER_GOVERNOR_GLOBAL_LIMIT = int(os.environ.get("WUG_ROUTER_GOVERNOR_GLOBAL_LIMIT", "0"))
+ROUTER_GOVERNOR_SITE_LIMIT = int(os.environ.get("WUG_ROUTER_GOVERNOR_SITE_LIMIT", "0"))
+ROUTER_GOVERNOR_SITE_LIMITS = os.environ.get("WUG_ROUTER_GOVERNOR_SITE_LIMITS", "")
+ROUTER_GOVERNOR_SITE_PREFIX = int(os.environ.get("WUG_ROUTER_GOVERNOR_SITE_PREFIX", "24"))
+ROUTER_GOVERNOR_AAA_LIMIT = int(os.environ.get("WUG_ROUTER_GOVERNOR_AAA_LIMIT", "0"))
+ROUTER_GOVERNOR_AAA_LIMITS = os.environ.get("WUG_ROUTER_GOVERNOR_AAA_LIMITS", "")
+ROUTER_GOVERNOR_CONNECT_RATE = float(os.environ.get("WUG_ROUTER_GOVERNOR_CONNECT_RATE", "0"))
+ROUTER_GOVERNOR_CONNECT_BURST = int(os.environ.get("WUG_ROUTER_GOVERNOR_CONNECT_BURST", "10"))
+ROUTER_GOVERNOR_STATE_FILE = DATA_DIR / "governor_state.json"
+# A permit not released within LEASE_TTL seconds (or whose process has exited) is dropped.
+ROUTER_GOVERNOR_LEASE_TTL = float(os.environ.get("WUG_ROUTER_GOVERNOR_LEASE_TTL", "1800"))
+
+# Fleet show queries: one exec command on every router, each output parsed into rows with
+# TextFSM (ntc-templates when no template is given) or TTP. Parsing runs in a process pool of
+# PARSE_WORKERS processes (0 = parse in the run's own thread).
+ROUTER_QUERY_PARSERS = ("textfsm", "ttp")
+ROUTER_QUERY_PARSE_WORKERS = int(os.environ.get("WUG_ROUTER_QUERY_PARSE_WORKERS", "2"))
+
+# Result cache for read-only exec tasks (opt-in per run with max_age seconds): outputs are kept per
+# (host, SSH username, command) under CACHE_DIR, readable by the service account only, and a run
+# whose tasks are all read-only exec commands serves a router from the cache instead of opening a
+# session. MAX_AGE caps what a caller may ask for; READ_ONLY lists the command verbs treated as
+# read-only ("show ... | redirect" never is); NEVER lists what a read-only verb is followed by in
+# commands that are never cached (configs and tech-support carry secrets), abbreviations included.
+ROUTER_EXEC_CACHE_DIR = DATA_DIR / "exec_cache"
+ROUTER_EXEC_CACHE_MAX_AGE = float(os.environ.get("WUG_ROUTER_EXEC_CACHE_MAX_AGE", "900"))
+ROUTER_EXEC_CACHE_READ_ONLY = os.environ.get("WUG_ROUTER_EXEC_CACHE_READ_ONLY", "show,sh,display,dis")
+ROUTER_EXEC_CACHE_NEVER = os.environ.get(
+    "WUG_ROUTER_EXEC_CACHE_NEVER",
+    "running-config,startup-config,tech-support,configuration,current-configuration,saved-configuration",
+)
+
+# Streamed router runs (/routers/runs/{run_id}/events)
+ROUTER_RUN_WORKERS = int(os.environ.get("WUG_ROUTER_RUN_WORKERS", "4"))
+ROUTER_RUN_HISTORY_LIMIT = 50
+ROUTER_RUN_EVENT_POLL_SECONDS = 0.5
+
+# Pre-warmed router worker processes (netmiko already imported); 0 = spawn a runner per run
+ROUTER_WORKER_PROCESSES = int(os.environ.get("WUG_ROUTER_WORKER_PROCESSES", "2"))
+ROUTER_WORKER_MAX_JOBS = int(os.environ.get("WUG_ROUTER_WORKER_MAX_JOBS", "100"))
+# Longest a run waits for a free worker before it fails
+ROUTER_WORKER_ACQUIRE_TIMEOUT = float(os.environ.get("WUG_ROUTER_WORKER_ACQUIRE_TIMEOUT", "600"))
 
 # ================= PRIVILEGE & ROLE DEFINITIONS =================
 # Page-to-privilege mapping
@@ -198,6 +341,13 @@ ENCODING_UTF8_SIG = "utf-8-sig"
 # Common SQL queries
 QUERY_DEVICE_TYPES = "SELECT nDeviceTypeID, sDisplayName FROM DeviceType"
 QUERY_DEVICE_GROUPS = "SELECT nDeviceGroupID, sGroupName FROM DeviceGroup"
+QUERY_INVENTORY_KEYS = (
+    "SELECT d.sDisplayName, ni.sNetworkAddress, dg.sGroupName "
+    "FROM Device d "
+    "LEFT JOIN NetworkInterface ni ON ni.nDeviceID = d.nDeviceID "
+    "LEFT JOIN PivotDeviceToGroup pdg ON pdg.nDeviceID = d.nDeviceID "
+    "LEFT JOIN DeviceGroup dg ON dg.nDeviceGroupID = pdg.nDeviceGroupID"
+)
 
 # ================= LOG PATTERNS & CONSTANTS =================
 # Log-related constants
@@ -205,6 +355,13 @@ LOG_SEPARATOR = "="
 LOG_PREFIX_EXIT_CODE = "EXIT CODE:"
 LOG_PREFIX_STDOUT = "STDOUT:"
 LOG_PREFIX_STDERR = "STDERR:"
+
+# Per-device output of a router run, kept beside its log: one gzip member per device
+# (<log>.devices.gz) and an index of device, status, offset and size (<log>.devices.json)
+LOG_DEVICE_SHARDS_SUFFIX = ".devices.gz"
+LOG_DEVICE_INDEX_SUFFIX = ".devices.json"
+LOG_RESULTS_SUFFIX = ".jsonl"
+LOG_DEVICE_SHARD_LEVEL = int(os.environ.get("WUG_LOG_DEVICE_SHARD_LEVEL", "6"))
 WORKDIR_PLACEHOLDER = "[WORKDIR]"
 
 # ================= FORM FIELD NAMES =================
@@ -224,11 +381,16 @@ ERROR_INVALID_OPERATION = "Invalid operation"
 ERROR_UNKNOWN_TEMPLATE = "Unknown template"
 ERROR_CSV_EMPTY = "CSV empty or headers mismatch"
 ERROR_OPERATION_NOT_FOUND = "Operation not found"
+ERROR_PREFLIGHT_FAILED = "Preflight validation failed; fix the listed rows and re-upload"
+ERROR_NO_CHECKPOINT = "No checkpoint found for this config"
+ERROR_CHECKPOINT_FINISHED = "This bulk run already completed; nothing to resume"
+ERROR_BULK_RUN_ACTIVE = "A bulk job for this config is still queued or running"
 
 # ================= LOG FILE NAMES =================
 LOG_FILE_PREFIX_BULK = "bulk_operation"
 LOG_FILE_PREFIX_INTERACTIVE = "interactive_commands"
 LOG_FILE_PREFIX_SIMPLE = "simple_commands"
+LOG_FILE_PREFIX_QUERY = "show_query"
 LOG_FILE_PREFIX_BACKUP = "backup"
 
 # ================= ACTIVITY LOG ACTIONS =================
@@ -237,6 +399,8 @@ ACTIVITY_INTERACTIVE_COMMANDS = "interactive_commands"
 ACTIVITY_INTERACTIVE_COMMANDS_ERROR = "interactive_commands_error"
 ACTIVITY_SIMPLE_COMMANDS = "simple_commands"
 ACTIVITY_SIMPLE_COMMANDS_ERROR = "simple_commands_error"
+ACTIVITY_SHOW_QUERY = "show_query"
+ACTIVITY_SHOW_QUERY_ERROR = "show_query_error"
 ACTIVITY_BACKUP = "backup"
 
 # ================= CONFIG FILE PREFIXES =================
@@ -7,7 +7,7 @@ from datetime import datetime, timedelta
 from typing import List, Optional
 
 import pyodbc
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Body, Depends, Response
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Body, Depends, Response, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, StreamingResponse
 import io
@@ -40,6 +40,8 @@ from constants import (
     CONFIG_BULK_ADD_DIR,
     CONFIG_BULK_UPDATE_DIR,
     CONFIG_BULK_DELETE_DIR,
+    CONFIG_BULK_UPSERT_DIR,
+    CONFIG_BULK_MONITOR_DIR,
     CONFIG_ROUTER_SIMPLE_DIR,
     CONFIG_ROUTER_INTERACTIVE_DIR,
     LOG_DIR,
@@ -47,7 +49,19 @@ from constants import (
     TEMPLATE_FILE,
     MEDIA_TYPE_EXCEL,
     DEFAULT_ENCODING,
+    ROUTER_AUTODETECT_ENABLED,
+    ROUTER_CONCURRENCY_DEFAULT,
+    ROUTER_DEVICE_TIMEOUT_DEFAULT,
+    ROUTER_PREFLIGHT_ENABLED,
+    ROUTER_QUERY_PARSERS,
+    ROUTER_RUN_BUDGET_DEFAULT,
     ROUTER_SCRIPTS_DIR,
+    ROUTER_RUN_EVENT_POLL_SECONDS,
+    ROUTER_RUN_HISTORY_LIMIT,
+    ROUTER_RUN_WORKERS,
+    ROUTER_SESSION_POOL_ENABLED,
+    ROUTER_WORKER_PROCESSES,
+    ROUTER_SSH_ENGINES,
     BULK_SCRIPTS_DIR,
     BACKUP_SCRIPTS_DIR,
     REPORTING_SCRIPTS_DIR,
@@ -59,10 +73,13 @@ from constants import (
     ERROR_UNKNOWN_TEMPLATE,
     LOG_FILE_PREFIX_INTERACTIVE,
     LOG_FILE_PREFIX_SIMPLE,
+    LOG_FILE_PREFIX_QUERY,
     ACTIVITY_BULK_OPERATION,
     ACTIVITY_INTERACTIVE_COMMANDS,
     ACTIVITY_INTERACTIVE_COMMANDS_ERROR,
     ACTIVITY_SIMPLE_COMMANDS,
+    ACTIVITY_SHOW_QUERY,
+    ACTIVITY_SHOW_QUERY_ERROR,
     CONFIG_PREFIX_BULK,
     CONFIG_PREFIX_INTERACTIVE,
     CONFIG_PREFIX_SIMPLE,
@@ -71,6 +88,13 @@ from constants import (
     SSH_CREDENTIALS_FILE,
     REPORT_SCHEDULE_JSON_FILE,
     BACKUP_SCHEDULE_JSON_FILE,
+    BULK_JOBS_HISTORY_FILE,
+    BULK_JOB_WORKERS,
+    BULK_JOB_HISTORY_LIMIT,
+    BULK_JOB_LIVE_LIMIT,
+    BULK_UPDATE_MODES,
+    BULK_JOB_EVENT_POLL_SECONDS,
+    BULK_BATCH_SIZE,
     get_connection_string,
 )
 
@@ -79,10 +103,20 @@ from wug_backend.reporting.device_uptime_report import DeviceUpTimeReportService
 from wug_backend.reporting.report_scheduler import run_scheduled_reports
 
 from wug_backend.infra.db import DbConnectionFactory
+from wug_backend.bulk.checkpoint import checkpoint_path_for, is_checkpoint_file
+from wug_backend.bulk.engine import BulkRunOptions
+from wug_backend.bulk.preflight import PREFLIGHT_ERROR_COLUMNS
 from wug_backend.repos.device_repo import DeviceLookupRepository
 from wug_backend.repos.template_repo import BulkTemplateRepository
-from wug_backend.services.bulk_service import BulkOperationService
+from wug_backend.services.bulk_service import BulkOperationService, BulkPreflightFailed
+from wug_backend.services.bulk_job_service import BulkJobManager
 from wug_backend.services.router_service import RouterCommandService
+from wug_backend.services.router_run_service import RouterRunManager
+from wug_backend.routers.governor import shared_governor
+from wug_backend.routers.session_pool import SshSessionPool
+from wug_backend.routers.show_query import aggregate_table, table_csv
+from wug_backend.routers.task_plan import compile_task_plan
+from wug_backend.routers.worker_pool import RunnerWorkerPool
 from wug_backend.backup.backup_collector import load_backup_target_lines
 from wug_backend.repos.backup_device_credentials_repo import (
     device_row_for_api,
@@ -104,7 +138,14 @@ from wug_backend.services.backup_schedule_config import (
 from wug_backend.services.router_credential_resolver import resolve_ssh_for_router_run
 from wug_backend.repos import ssh_credentials_repo
 from wug_backend.utils.file_utils import FileNameService
-from wug_backend.utils.log_utils import LogCollector, OutputSanitizer, LogWriter
+from wug_backend.utils.log_utils import (
+    DeviceLogShards,
+    LogCollector,
+    OutputSanitizer,
+    LogWriter,
+    is_log_companion,
+    log_companions,
+)
 
 
 def _parse_credential_ids_json(raw: Optional[str]) -> Optional[List[str]]:
@@ -138,6 +179,12 @@ def _credential_public_meta(c: dict) -> dict:
     }
 
 
+def _require_owner(owner_id: str, current_user: dict) -> None:
+    """Jobs and runs are visible to the user who started them and to admins only."""
+    if owner_id != current_user["id"] and not user_has_admin_access(current_user):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
 def create_app() -> FastAPI:
     # ================= INITIALIZATION =================
     DATA_DIR.mkdir(parents=True, exist_ok=True)
@@ -147,6 +194,8 @@ def create_app() -> FastAPI:
         CONFIG_BULK_ADD_DIR,
         CONFIG_BULK_UPDATE_DIR,
         CONFIG_BULK_DELETE_DIR,
+        CONFIG_BULK_UPSERT_DIR,
+        CONFIG_BULK_MONITOR_DIR,
         CONFIG_ROUTER_SIMPLE_DIR,
         CONFIG_ROUTER_INTERACTIVE_DIR,
         LOG_DIR,
@@ -184,6 +233,14 @@ def create_app() -> FastAPI:
 
     db_factory = DbConnectionFactory()
     device_repo = DeviceLookupRepository(db_factory=db_factory)
+    bulk_job_manager = BulkJobManager(
+        history_file=BULK_JOBS_HISTORY_FILE,
+        output_sanitizer=output_sanitizer,
+        log_writer=log_writer,
+        max_workers=BULK_JOB_WORKERS,
+        history_limit=BULK_JOB_HISTORY_LIMIT,
+        live_limit=BULK_JOB_LIVE_LIMIT,
+    )
     bulk_service = BulkOperationService(
         device_repo=device_repo,
         config_dir=CONFIG_DIR,
@@ -193,6 +250,15 @@ def create_app() -> FastAPI:
         activity_logger=log_activity,
         config_prefix_bulk=CONFIG_PREFIX_BULK,
         activity_bulk_operation=ACTIVITY_BULK_OPERATION,
+        job_manager=bulk_job_manager,
+    )
+    ssh_session_pool = SshSessionPool() if ROUTER_SESSION_POOL_ENABLED else None
+    router_worker_pool = RunnerWorkerPool() if ROUTER_WORKER_PROCESSES > 0 else None
+    router_run_manager = RouterRunManager(
+        output_sanitizer=output_sanitizer,
+        log_writer=log_writer,
+        max_workers=ROUTER_RUN_WORKERS,
+        history_limit=ROUTER_RUN_HISTORY_LIMIT,
     )
     router_service = RouterCommandService(
         router_scripts_dir=ROUTER_SCRIPTS_DIR,
@@ -215,8 +281,14 @@ def create_app() -> FastAPI:
         activity_interactive_commands=ACTIVITY_INTERACTIVE_COMMANDS,
         activity_interactive_commands_error=ACTIVITY_INTERACTIVE_COMMANDS_ERROR,
         activity_simple_commands=ACTIVITY_SIMPLE_COMMANDS,
+        log_file_prefix_query=LOG_FILE_PREFIX_QUERY,
+        activity_show_query=ACTIVITY_SHOW_QUERY,
+        activity_show_query_error=ACTIVITY_SHOW_QUERY_ERROR,
+        session_pool=ssh_session_pool,
+        run_manager=router_run_manager,
+        worker_pool=router_worker_pool,
     )
-    backup_service = BackupService()
+    backup_service = BackupService(session_pool=ssh_session_pool)
     BackupScheduler.create(backup_service, BACKUP_SCHEDULE_JSON_FILE).install(app)
     template_repo = BulkTemplateRepository(template_file=TEMPLATE_FILE, default_encoding=DEFAULT_ENCODING)
     availability_service = AvailabilityReportService()
@@ -229,19 +301,218 @@ def create_app() -> FastAPI:
         file: UploadFile = File(...),
         config_name: str = Form(""),
         log_name: str = Form(""),
+        async_job: bool = Form(False),
+        preflight: bool = Form(True),
+        parallelism: int = Form(1),
+        batch_size: int = Form(BULK_BATCH_SIZE),
+        update_mode: str = Form("write"),
+        dry_run: bool = Form(False),
         current_user: dict = Depends(require_privilege("bulk_operations")),
     ):
+        update_mode = (update_mode or "write").strip().lower()
+        if update_mode not in BULK_UPDATE_MODES:
+            raise HTTPException(400, f"update_mode must be one of: {', '.join(BULK_UPDATE_MODES)}")
+        diff = update_mode == "diff"
+        if diff and operation != "update":
+            raise HTTPException(400, "update_mode=diff is only supported for the update operation")
+        if dry_run and operation not in ("update", "upsert"):
+            raise HTTPException(400, "dry_run is only supported for the update and upsert operations")
+        options = BulkRunOptions(parallelism=parallelism, batch_size=batch_size, diff=diff, dry_run=dry_run)
         try:
+            if async_job:
+                return bulk_service.enqueue_bulk(
+                    operation=operation,
+                    upload_file=file,
+                    config_name=config_name,
+                    log_name=log_name,
+                    current_user=current_user,
+                    preflight=preflight,
+                    options=options,
+                )
             return bulk_service.run_bulk(
                 operation=operation,
                 upload_file=file,
                 config_name=config_name,
                 log_name=log_name,
                 current_user=current_user,
+                preflight=preflight,
+                options=options,
+            )
+        except BulkPreflightFailed as e:
+            raise HTTPException(422, e.to_detail())
+        except ValueError:
+            raise HTTPException(400, ERROR_INVALID_OPERATION)
+
+    @app.post("/bulk/preflight")
+    def preflight_bulk(
+        operation: str = Form(...),
+        file: UploadFile = File(...),
+        format: str = Form("json"),
+        current_user: dict = Depends(require_privilege("bulk_operations")),
+    ):
+        try:
+            result = bulk_service.preflight(operation=operation, upload_file=file)
+        except ValueError:
+            raise HTTPException(400, ERROR_INVALID_OPERATION)
+        log_activity(
+            current_user["id"],
+            "bulk_preflight",
+            f"Validated {operation} upload: {result['row_count']} rows, {len(result['errors'])} error(s)",
+            "bulk",
+        )
+        if format == "csv":
+            buffer = io.StringIO()
+            pd.DataFrame(result["errors"], columns=PREFLIGHT_ERROR_COLUMNS).to_csv(buffer, index=False)
+            return StreamingResponse(
+                iter([buffer.getvalue()]),
+                media_type="text/csv",
+                headers={"Content-Disposition": f'attachment; filename="bulk_{operation}_preflight.csv"'},
+            )
+        return result
+
+    @app.get("/bulk/checkpoint/{operation}/{config_file}")
+    def get_bulk_checkpoint(
+        operation: str,
+        config_file: str,
+        current_user: dict = Depends(require_privilege("bulk_operations")),
+    ):
+        try:
+            return bulk_service.checkpoint_status(operation, config_file)
+        except FileNotFoundError:
+            raise HTTPException(404, "File not found")
+        except ValueError:
+            raise HTTPException(400, ERROR_INVALID_OPERATION)
+
+    @app.post("/bulk/resume")
+    def resume_bulk(
+        operation: str = Form(...),
+        config_file: str = Form(...),
+        log_name: str = Form(""),
+        async_job: bool = Form(False),
+        current_user: dict = Depends(require_privilege("bulk_operations")),
+    ):
+        try:
+            return bulk_service.resume_bulk(
+                operation=operation,
+                config_file=config_file,
+                log_name=log_name,
+                current_user=current_user,
+                async_job=async_job,
             )
+        except FileNotFoundError:
+            raise HTTPException(404, "File not found")
+        except LookupError as e:
+            raise HTTPException(409, str(e))
         except ValueError:
             raise HTTPException(400, ERROR_INVALID_OPERATION)
 
+    @app.post("/bulk/monitors")
+    def run_bulk_monitors(
+        action: str = Form(...),
+        monitor: str = Form(...),
+        file: Optional[UploadFile] = File(None),
+        device_group: str = Form(""),
+        argument: str = Form(""),
+        comment: str = Form(""),
+        config_name: str = Form(""),
+        log_name: str = Form(""),
+        async_job: bool = Form(False),
+        current_user: dict = Depends(require_privilege("bulk_operations")),
+    ):
+        try:
+            return bulk_service.run_monitor(
+                action=action,
+                monitor=monitor,
+                upload_file=file,
+                group_name=device_group.strip(),
+                argument=argument,
+                comment=comment,
+                config_name=config_name,
+                log_name=log_name,
+                current_user=current_user,
+                async_job=async_job,
+            )
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+
+    # ================= BULK JOBS =================
+    @app.get("/jobs")
+    def list_bulk_jobs(
+        limit: int = 50,
+        current_user: dict = Depends(require_privilege("bulk_operations")),
+    ):
+        owner = None if user_has_admin_access(current_user) else current_user["id"]
+        return bulk_job_manager.list_jobs(limit=limit, user_id=owner)
+
+    @app.get("/jobs/{job_id}")
+    def get_bulk_job(
+        job_id: str,
+        current_user: dict = Depends(require_privilege("bulk_operations")),
+    ):
+        summary = bulk_job_manager.get_summary(job_id)
+        if summary is None:
+            raise HTTPException(404, "Job not found")
+        _require_owner(summary.get("user_id"), current_user)
+        return summary
+
+    @app.get("/jobs/{job_id}/events")
+    async def stream_bulk_job_events(
+        job_id: str,
+        request: Request,
+        after: int = 0,
+        current_user: dict = Depends(require_privilege("bulk_operations")),
+    ):
+        job = bulk_job_manager.get_job(job_id)
+        if job is None:
+            raise HTTPException(404, "Job not found or no longer live; see /jobs/{job_id} for its final status")
+        _require_owner(job.user_id, current_user)
+
+        # EventSource reconnects send Last-Event-ID; honour it so the UI can reattach without duplicates.
+        last_event_id = request.headers.get("last-event-id")
+        if last_event_id and last_event_id.isdigit():
+            after = max(after, int(last_event_id))
+
+        async def _events():
+            seq = after
+            while True:
+                finished = job.is_finished()
+                for ev in job.events_after(seq):
+                    seq = ev["seq"]
+                    yield f"id: {seq}\nevent: row\ndata: {json.dumps(ev)}\n\n"
+                if finished:
+                    yield f"event: done\ndata: {json.dumps(job.summary())}\n\n"
+                    return
+                if await request.is_disconnected():
+                    return
+                await asyncio.sleep(BULK_JOB_EVENT_POLL_SECONDS)
+
+        return StreamingResponse(
+            _events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.post("/jobs/{job_id}/cancel")
+    def cancel_bulk_job(
+        job_id: str,
+        current_user: dict = Depends(require_privilege("bulk_operations")),
+    ):
+        job = bulk_job_manager.get_job(job_id)
+        if job is None:
+            raise HTTPException(404, "Job not found")
+        _require_owner(job.user_id, current_user)
+        summary = bulk_job_manager.cancel(job_id)
+        log_activity(current_user["id"], "cancel_bulk_job", f"Cancelled bulk job {job_id}", "bulk")
+        return summary
+
+    @app.on_event("startup")
+    def _fail_interrupted_bulk_jobs():
+        bulk_job_manager.fail_interrupted()
+
+    @app.on_event("shutdown")
+    def _stop_bulk_jobs():
+        bulk_job_manager.shutdown()
+
     @app.get("/bulk/template/{operation}")
     def download_bulk_template(
         operation: str,
@@ -317,8 +588,24 @@ JOIN DeviceType dt            ON d.nDeviceTypeID = dt.nDeviceTypeID;
         credential_id: str = Form(""),
         config_name: str = Form(""),
         log_name: str = Form(""),
+        concurrency: int = Form(ROUTER_CONCURRENCY_DEFAULT),
+        device_timeout: float = Form(ROUTER_DEVICE_TIMEOUT_DEFAULT),
+        engine: str = Form("netmiko"),
+        stream: bool = Form(False),
+        preflight: bool = Form(ROUTER_PREFLIGHT_ENABLED),
+        run_budget: float = Form(ROUTER_RUN_BUDGET_DEFAULT),
+        run_id: str = Form(""),
+        autodetect: bool = Form(ROUTER_AUTODETECT_ENABLED),
+        max_age: float = Form(0),
+        force_refresh: bool = Form(False),
         current_user: dict = Depends(require_privilege("router_commands")),
     ):
+        if engine not in ROUTER_SSH_ENGINES:
+            raise HTTPException(status_code=400, detail=f"engine must be one of: {', '.join(ROUTER_SSH_ENGINES)}")
+        try:
+            compile_task_plan(json.loads(tasks_json))
+        except ValueError as e:
+            raise HTTPException(400, f"Invalid tasks: {e}")
         u, p, en = resolve_ssh_for_router_run(
             current_user,
             credential_id or None,
@@ -326,18 +613,31 @@ JOIN DeviceType dt            ON d.nDeviceTypeID = dt.nDeviceTypeID;
             password,
             enable_password,
         )
-        return router_service.run_interactive(
-            routers=routers,
-            device_type_default=device_type_default,
-            tasks_json=tasks_json,
-            username=u,
-            password=p,
-            enable_password=en,
-            config_name=config_name,
-            log_name=log_name,
-            current_user=current_user,
-            filename_service=filename_service,
-        )
+        try:
+            return router_service.run_interactive(
+                routers=routers,
+                device_type_default=device_type_default,
+                tasks_json=tasks_json,
+                username=u,
+                password=p,
+                enable_password=en,
+                config_name=config_name,
+                log_name=log_name,
+                current_user=current_user,
+                filename_service=filename_service,
+                concurrency=concurrency,
+                device_timeout=device_timeout,
+                engine=engine,
+                stream=stream,
+                preflight=preflight,
+                run_budget=run_budget,
+                run_id=run_id or None,
+                autodetect=autodetect,
+                max_age=max_age,
+                force_refresh=force_refresh,
+            )
+        except ValueError as e:
+            raise HTTPException(400, str(e))
 
     @app.post("/routers/run-simple")
     def run_simple(
@@ -350,8 +650,75 @@ JOIN DeviceType dt            ON d.nDeviceTypeID = dt.nDeviceTypeID;
         credential_id: str = Form(""),
         config_name: str = Form(""),
         log_name: str = Form(""),
+        concurrency: int = Form(ROUTER_CONCURRENCY_DEFAULT),
+        device_timeout: float = Form(ROUTER_DEVICE_TIMEOUT_DEFAULT),
+        engine: str = Form("netmiko"),
+        stream: bool = Form(False),
+        preflight: bool = Form(ROUTER_PREFLIGHT_ENABLED),
+        run_budget: float = Form(ROUTER_RUN_BUDGET_DEFAULT),
+        run_id: str = Form(""),
+        autodetect: bool = Form(ROUTER_AUTODETECT_ENABLED),
+        current_user: dict = Depends(require_privilege("router_commands")),
+    ):
+        if engine not in ROUTER_SSH_ENGINES:
+            raise HTTPException(status_code=400, detail=f"engine must be one of: {', '.join(ROUTER_SSH_ENGINES)}")
+        u, p, en = resolve_ssh_for_router_run(
+            current_user,
+            credential_id or None,
+            username,
+            password,
+            enable_password,
+        )
+        try:
+            return router_service.run_simple(
+                routers=routers,
+                config=config,
+                device_type_default=device_type_default,
+                username=u,
+                password=p,
+                enable_password=en,
+                config_name=config_name,
+                log_name=log_name,
+                current_user=current_user,
+                filename_service=filename_service,
+                concurrency=concurrency,
+                device_timeout=device_timeout,
+                engine=engine,
+                stream=stream,
+                preflight=preflight,
+                run_budget=run_budget,
+                run_id=run_id or None,
+                autodetect=autodetect,
+            )
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+
+    @app.post("/routers/query")
+    def run_router_query(
+        routers: str = Form(...),
+        command: str = Form(...),
+        parser: str = Form(ROUTER_QUERY_PARSERS[0]),
+        template: str = Form(""),
+        device_type_default: str = Form("cisco_ios"),
+        username: str = Form(""),
+        password: str = Form(""),
+        enable_password: str = Form(""),
+        credential_id: str = Form(""),
+        log_name: str = Form(""),
+        concurrency: int = Form(ROUTER_CONCURRENCY_DEFAULT),
+        device_timeout: float = Form(ROUTER_DEVICE_TIMEOUT_DEFAULT),
+        engine: str = Form("netmiko"),
+        stream: bool = Form(False),
+        preflight: bool = Form(ROUTER_PREFLIGHT_ENABLED),
+        run_budget: float = Form(ROUTER_RUN_BUDGET_DEFAULT),
+        run_id: str = Form(""),
+        autodetect: bool = Form(ROUTER_AUTODETECT_ENABLED),
+        max_age: float = Form(0),
+        force_refresh: bool = Form(False),
         current_user: dict = Depends(require_privilege("router_commands")),
     ):
+        if engine not in ROUTER_SSH_ENGINES:
+            raise HTTPException(status_code=400, detail=f"engine must be one of: {', '.join(ROUTER_SSH_ENGINES)}")
         u, p, en = resolve_ssh_for_router_run(
             current_user,
             credential_id or None,
@@ -359,19 +726,165 @@ JOIN DeviceType dt            ON d.nDeviceTypeID = dt.nDeviceTypeID;
             password,
             enable_password,
         )
-        return router_service.run_simple(
-            routers=routers,
-            config=config,
-            device_type_default=device_type_default,
-            username=u,
-            password=p,
-            enable_password=en,
-            config_name=config_name,
-            log_name=log_name,
-            current_user=current_user,
-            filename_service=filename_service,
+        try:
+            return router_service.run_query(
+                routers=routers,
+                command=command,
+                parser=parser,
+                template=template,
+                device_type_default=device_type_default,
+                username=u,
+                password=p,
+                enable_password=en,
+                log_name=log_name,
+                current_user=current_user,
+                concurrency=concurrency,
+                device_timeout=device_timeout,
+                engine=engine,
+                stream=stream,
+                preflight=preflight,
+                run_budget=run_budget,
+                run_id=run_id or None,
+                autodetect=autodetect,
+                max_age=max_age,
+                force_refresh=force_refresh,
+            )
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+
+    @app.get("/routers/runs")
+    def list_router_runs(current_user: dict = Depends(require_privilege("router_commands"))):
+        owner = None if user_has_admin_access(current_user) else current_user["id"]
+        return router_run_manager.list_runs(user_id=owner)
+
+    @app.get("/routers/runs/{run_id}")
+    def get_router_run(run_id: str, current_user: dict = Depends(require_privilege("router_commands"))):
+        run = router_run_manager.get_run(run_id)
+        if run is None:
+            raise HTTPException(404, "Run not found")
+        _require_owner(run.user_id, current_user)
+        return run.summary()
+
+    @app.post("/routers/runs/{run_id}/cancel")
+    def cancel_router_run(run_id: str, current_user: dict = Depends(require_privilege("router_commands"))):
+        run = router_run_manager.get_run(run_id)
+        if run is None:
+            raise HTTPException(404, "Run not found")
+        _require_owner(run.user_id, current_user)
+        run = router_run_manager.cancel(run_id)
+        log_activity(current_user["id"], "cancel_router_run", f"Cancelled router run {run_id}", "routers")
+        return run.summary()
+
+    @app.get("/routers/runs/{run_id}/results")
+    def get_router_run_results(
+        run_id: str,
+        status: Optional[str] = None,
+        current_user: dict = Depends(require_privilege("router_commands")),
+    ):
+        run = router_run_manager.get_run(run_id)
+        if run is None:
+            raise HTTPException(404, "Run not found")
+        _require_owner(run.user_id, current_user)
+        with run.lock:
+            devices = [r for r in run.results if status is None or r.get("status") == status]
+        return {"summary": run.results_summary(), "devices": devices}
+
+    @app.get("/routers/runs/{run_id}/table")
+    def get_router_run_table(
+        run_id: str,
+        format: str = "json",
+        current_user: dict = Depends(require_privilege("router_commands")),
+    ):
+        # Query runs: rows parsed so far, one table across devices (CSV for export).
+        run = router_run_manager.get_run(run_id)
+        if run is None:
+            raise HTTPException(404, "Run not found")
+        _require_owner(run.user_id, current_user)
+        with run.lock:
+            table = aggregate_table(list(run.results))
+        if format == "csv":
+            return StreamingResponse(
+                iter([table_csv(table)]),
+                media_type="text/csv",
+                headers={"Content-Disposition": f'attachment; filename="query_{run_id}.csv"'},
+            )
+        return {"status": run.status, **table}
+
+    @app.get("/routers/runs/{run_id}/events")
+    async def stream_router_run_events(
+        run_id: str,
+        request: Request,
+        after: int = 0,
+        current_user: dict = Depends(require_privilege("router_commands")),
+    ):
+        run = router_run_manager.get_run(run_id)
+        if run is None:
+            raise HTTPException(404, "Run not found")
+        _require_owner(run.user_id, current_user)
+
+        last_event_id = request.headers.get("last-event-id")
+        if last_event_id and last_event_id.isdigit():
+            after = max(after, int(last_event_id))
+
+        async def _events():
+            seq = after
+            while True:
+                finished = run.is_finished()
+                for ev in run.events_after(seq):
+                    seq = ev["seq"]
+                    yield f"id: {seq}\nevent: {ev['type']}\ndata: {json.dumps(ev)}\n\n"
+                if finished:
+                    yield f"event: done\ndata: {json.dumps(run.summary())}\n\n"
+                    return
+                if await request.is_disconnected():
+                    return
+                await asyncio.sleep(ROUTER_RUN_EVENT_POLL_SECONDS)
+
+        return StreamingResponse(
+            _events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
         )
 
+    @app.on_event("shutdown")
+    def _stop_router_runs():
+        router_run_manager.shutdown()
+
+    @app.get("/routers/session-pool")
+    def router_session_pool_stats(current_user: dict = Depends(require_privilege("router_commands"))):
+        if ssh_session_pool is None:
+            return {"enabled": False}
+        return {"enabled": True, **ssh_session_pool.stats()}
+
+    @app.on_event("shutdown")
+    def _close_ssh_sessions():
+        if ssh_session_pool is not None:
+            ssh_session_pool.close_all()
+
+    @app.get("/routers/worker-pool")
+    def router_worker_pool_stats(current_user: dict = Depends(require_privilege("router_commands"))):
+        if router_worker_pool is None:
+            return {"enabled": False}
+        return {"enabled": True, **router_worker_pool.stats()}
+
+    @app.get("/routers/governor")
+    def router_governor_stats(current_user: dict = Depends(require_privilege("router_commands"))):
+        # Permits held by runs and backups in every process (API, pooled workers, runner subprocesses).
+        governor = shared_governor()
+        if governor is None:
+            return {"enabled": False}
+        return {"enabled": True, **governor.stats()}
+
+    @app.on_event("startup")
+    def _start_router_workers():
+        if router_worker_pool is not None:
+            router_worker_pool.start()
+
+    @app.on_event("shutdown")
+    def _stop_router_workers():
+        if router_worker_pool is not None:
+            router_worker_pool.shutdown()
+
     # ================= SSH CREDENTIALS (eligible = metadata only; secrets server-side) =================
     @app.get("/credentials/eligible")
     def list_eligible_credentials(current_user: dict = Depends(get_current_user)):
@@ -872,7 +1385,7 @@ JOIN DeviceType dt            ON d.nDeviceTypeID = dt.nDeviceTypeID;
         import os
 
         log_activity(current_user["id"], "list_configs", f"Listed configs in {section}", "history")
-        return os.listdir(CONFIG_DIR / section)
+        return [name for name in os.listdir(CONFIG_DIR / section) if not is_checkpoint_file(name)]
 
     @app.get("/configs/{section}/{name}")
     def get_config(section: str, name: str, download: bool = False, current_user: dict = Depends(require_privilege("view_history"))):
@@ -889,6 +1402,7 @@ JOIN DeviceType dt            ON d.nDeviceTypeID = dt.nDeviceTypeID;
         import os
 
         os.remove(CONFIG_DIR / section / name)
+        checkpoint_path_for(CONFIG_DIR / section / name).unlink(missing_ok=True)
         log_activity(current_user["id"], "delete_config", f"Deleted {section}/{name}", "history")
         return {"status": "deleted"}
 
@@ -908,6 +1422,8 @@ JOIN DeviceType dt            ON d.nDeviceTypeID = dt.nDeviceTypeID;
         if not old_path.exists():
             raise HTTPException(404, "File not found")
         old_path.rename(new_path)
+        if checkpoint_path_for(old_path).exists():
+            checkpoint_path_for(old_path).rename(checkpoint_path_for(new_path))
         log_activity(current_user["id"], "rename_config", f"Renamed {section}/{name} to {sanitized}{old_ext}", "history")
         return {"status": "renamed", "new_name": f"{sanitized}{old_ext}"}
 
@@ -916,7 +1432,7 @@ JOIN DeviceType dt            ON d.nDeviceTypeID = dt.nDeviceTypeID;
         import os
 
         log_activity(current_user["id"], "list_logs", "Listed log files", "history")
-        return os.listdir(LOG_DIR)
+        return [name for name in os.listdir(LOG_DIR) if not is_log_companion(name)]
 
     @app.get("/logs/{name}")
     def get_log(name: str, download: bool = False, current_user: dict = Depends(require_privilege("view_history"))):
@@ -928,11 +1444,34 @@ JOIN DeviceType dt            ON d.nDeviceTypeID = dt.nDeviceTypeID;
             return FileResponse(path=str(file_path), filename=name, media_type="text/plain")
         return file_path.read_text()
 
+    def _device_logs(name: str) -> DeviceLogShards:
+        shards = DeviceLogShards(LOG_DIR / name, DEFAULT_ENCODING)
+        if not shards.exists():
+            raise HTTPException(404, "No per-device logs for this run")
+        return shards
+
+    @app.get("/logs/{name}/devices")
+    def get_log_devices(name: str, current_user: dict = Depends(require_privilege("view_history"))):
+        shards = _device_logs(name)
+        log_activity(current_user["id"], "view_log", f"Viewed device index of log: {name}", "history")
+        return {"log": name, "devices": shards.index()}
+
+    @app.get("/logs/{name}/devices/{ip}")
+    def get_log_device(name: str, ip: str, current_user: dict = Depends(require_privilege("view_history"))):
+        output = _device_logs(name).read(ip)
+        if output is None:
+            raise HTTPException(404, "Device not found in this log")
+        log_activity(current_user["id"], "view_log", f"Viewed {ip} in log: {name}", "history")
+        return output
+
     @app.delete("/logs/{name}")
     def delete_log(name: str, current_user: dict = Depends(require_privilege("view_history"))):
         import os
 
         os.remove(LOG_DIR / name)
+        for companion in log_companions(LOG_DIR / name):
+            if companion.exists():
+                os.remove(companion)
         log_activity(current_user["id"], "delete_log", f"Deleted log: {name}", "history")
         return {"status": "deleted"}
 
@@ -952,6 +1491,9 @@ JOIN DeviceType dt            ON d.nDeviceTypeID = dt.nDeviceTypeID;
         if not old_path.exists():
             raise HTTPException(404, "File not found")
         old_path.rename(new_path)
+        for old_companion, new_companion in zip(log_companions(old_path), log_companions(new_path)):
+            if old_companion.exists():
+                old_companion.rename(new_companion)
         log_activity(current_user["id"], "rename_log", f"Renamed log {name} to {sanitized}{old_ext}", "history")
         return {"status": "renamed", "new_name": f"{sanitized}{old_ext}"}
 
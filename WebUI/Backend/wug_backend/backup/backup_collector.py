@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import sys
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
@@ -16,6 +17,9 @@ from wug_backend.repos.backup_device_credentials_repo import (
     storage_folder_for_backup_line,
 )
 from wug_backend.repos import backup_device_credentials_repo
+from wug_backend.routers.autodetect import DeviceTypeCache
+from wug_backend.routers.governor import shared_governor
+from wug_backend.routers.simple import RouterTarget
 
 
 def load_backup_target_lines(routers_path: Path | None = None) -> list[str]:
@@ -38,8 +42,22 @@ class BackupCommand:
 
 
 class BackupCollector:
-    def __init__(self, credentials_path: Path | None = None) -> None:
+    def __init__(
+        self,
+        credentials_path: Path | None = None,
+        session_pool=None,
+        out=None,
+        err=None,
+        stop=None,
+    ) -> None:
         self._credentials_path = credentials_path or BACKUP_DEVICE_CREDENTIALS_FILE
+        self._session_pool = session_pool
+        self._out = out or sys.stdout
+        self._err = err or sys.stderr
+        # Checked while waiting for a governor permit, so a timed-out backup stops queueing.
+        self._stop = stop
+        # Types detected by autodetect-enabled router runs; other hosts are treated as cisco_ios.
+        self._device_types: dict[str, str] = {}
 
     def _load_routers(self) -> list[str]:
         return load_backup_target_lines(ROUTERS_FILE)
@@ -64,6 +82,37 @@ class BackupCollector:
         }
         return ConnectHandler(**device)
 
+    @contextmanager
+    def _session(self, ip: str, username: str, password: str, secret: str):
+        governor = shared_governor()
+        if governor is None:
+            with self._open(ip, username, password, secret) as conn:
+                yield conn
+            return
+        target = RouterTarget(ip, self._device_types.get(ip, "cisco_ios"))
+        with governor.slot(target, stop=self._stop) as permit:
+            if permit.waited >= 0.1:
+                print(f"Waited {permit.waited:.1f}s for a connection slot", file=self._out, flush=True)
+            with self._open(ip, username, password, secret) as conn:
+                yield conn
+
+    @contextmanager
+    def _open(self, ip: str, username: str, password: str, secret: str):
+        device_type = self._device_types.get(ip, "cisco_ios")
+        if self._session_pool is not None:
+            with self._session_pool.lease(ip, username, password, secret, device_type) as conn:
+                yield conn
+            return
+        conn = self._create_connection(ip, device_type, username, password, secret)
+        try:
+            conn.enable()
+            yield conn
+        finally:
+            try:
+                conn.disconnect()
+            except Exception:
+                pass
+
     def _collect_one(
         self,
         connect_host: str,
@@ -77,58 +126,48 @@ class BackupCollector:
         folder.mkdir(parents=True, exist_ok=True)
 
         secret = enable_password if (enable_password or "").strip() else password
-        conn = None
         try:
-            conn = self._create_connection(
-                connect_host, "cisco_ios", username, password, secret
-            )
-            conn.enable()
-
-            print(
-                f"Getting {backup_command.label} from {connect_host} ...",
-                flush=True,
-            )
-            output = conn.send_command(
-                backup_command.command,
-                expect_string=r"#",
-                read_timeout=60,
-            )
-
-            conn.disconnect()
+            with self._session(connect_host, username, password, secret) as conn:
+                print(
+                    f"Getting {backup_command.label} from {connect_host} ...",
+                    file=self._out,
+                    flush=True,
+                )
+                output = conn.send_command(
+                    backup_command.command,
+                    expect_string=r"#",
+                    read_timeout=60,
+                )
 
             timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
             filename = folder / f"{backup_command.output_filename_prefix}_{timestamp}.txt"
             filename.write_text(output, encoding="utf-8")
-            print(f"Saved config to {filename}", flush=True)
+            print(f"Saved config to {filename}", file=self._out, flush=True)
         except Exception as e:
             err_msg = f"ERROR on {connect_host}: {e}"
-            print(err_msg, file=sys.stderr, flush=True)
-            try:
-                if conn is not None:
-                    conn.disconnect()
-            except Exception:
-                pass
+            print(err_msg, file=self._err, flush=True)
 
     def collect(self, backup_command: BackupCommand) -> int:
         ips = self._load_routers()
         if not ips:
-            print(f"No router IPs/lines found in {ROUTERS_FILE.name}", flush=True)
+            print(f"No router IPs/lines found in {ROUTERS_FILE.name}", file=self._out, flush=True)
             raise SystemExit(1)
 
         creds = self._load_credentials()
         err = backup_device_credentials_repo.validate_all_targets_have_credentials(ips, creds)
         if err:
-            print(err, file=sys.stderr, flush=True)
+            print(err, file=self._err, flush=True)
             raise SystemExit(2)
 
-        print(f"Found {len(ips)} router(s) in {ROUTERS_FILE.name}")
+        print(f"Found {len(ips)} router(s) in {ROUTERS_FILE.name}", file=self._out)
+        self._device_types = DeviceTypeCache().load()
 
         for line in ips:
             c = resolve_effective_credentials(line, creds)
             if not c:
                 print(
                     f"ERROR: no credentials for line {line!r}",
-                    file=sys.stderr,
+                    file=self._err,
                     flush=True,
                 )
                 raise SystemExit(2)
@@ -137,7 +176,7 @@ class BackupCollector:
             en = c.get("enable_password") or ""
             host = connect_host_for_backup_line(line)
             folder_name = storage_folder_for_backup_line(line)
-            print(f"\n=== Connecting to {host} ===", flush=True)
+            print(f"\n=== Connecting to {host} ===", file=self._out, flush=True)
             self._collect_one(
                 host, folder_name, backup_command, u, p, en
             )
@@ -145,21 +184,21 @@ class BackupCollector:
         return 0
 
 
+RUNNING_CONFIG = BackupCommand(
+    label="running-config",
+    command="show running-config",
+    output_filename_prefix="running-config",
+)
+STARTUP_CONFIG = BackupCommand(
+    label="start-config",
+    command="show startup-config",
+    output_filename_prefix="startup_config",
+)
+
+
 def run_running_cli(argv: list[str] | None = None) -> int:
-    return BackupCollector().collect(
-        BackupCommand(
-            label="running-config",
-            command="show running-config",
-            output_filename_prefix="running-config",
-        )
-    )
+    return BackupCollector().collect(RUNNING_CONFIG)
 
 
 def run_startup_cli(argv: list[str] | None = None) -> int:
-    return BackupCollector().collect(
-        BackupCommand(
-            label="start-config",
-            command="show startup-config",
-            output_filename_prefix="startup_config",
-        )
-    )
+    return BackupCollector().collect(STARTUP_CONFIG)
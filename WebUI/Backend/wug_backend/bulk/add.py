@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import csv
+import itertools
 import sys
 
 import pyodbc
@@ -11,6 +12,14 @@ from constants import (
     TEMP_DEFAULT_NETIF_ID,
     get_connection_string,
 )
+from wug_backend.bulk.checkpoint import checkpoint_from_args
+from wug_backend.bulk.engine import (
+    BulkRowEngine,
+    BulkRunOptions,
+    RowOutcome,
+    options_from_args,
+    parse_bulk_cli_args,
+)
 
 
 class BulkAddUseCase:
@@ -110,51 +119,66 @@ SET NOCOUNT ON;
             return ""
         return "".join(char for char in text if ord(char) < 128)
 
-    def execute_from_csv_path(self, csv_path: str) -> int:
-        rows = []
+    def _connect(self):
+        conn = pyodbc.connect(self._connection_string, autocommit=False)
+        conn.autocommit = False
+        return conn
+
+    def row_label(self, r) -> str:
+        return r.get("DisplayName") or ""
+
+    def shard_key(self, r) -> str:
+        return self.clean_name(r.get("DisplayName"))
+
+    def _process_row(self, cursor, r):
+        poll_interval = r.get("PollInterval") or r.get("nPollInterval")
+        if isinstance(poll_interval, str):
+            poll_interval = poll_interval.strip()
+            poll_interval = poll_interval if poll_interval else None
+
+        cursor.execute(
+            self._sql,
+            self.clean_name(r["DisplayName"]),
+            r["DeviceType"],
+            poll_interval,
+            r.get("Notes", ""),
+            r["NetworkAddress"],
+            r["NetworkName"],
+            r["DeviceGroup"],
+        )
+        return True, None
+
+    def _report(self, outcome: RowOutcome) -> None:
+        if outcome.ok:
+            print(f"SUCCESS: Inserted row {outcome.index} - {outcome.label}", flush=True)
+        else:
+            print(f"WARNING: Failed row {outcome.index} ({outcome.label}): {outcome.message}", file=sys.stderr, flush=True)
+
+    def execute_from_csv_path(self, csv_path: str, options: BulkRunOptions | None = None, checkpoint=None) -> int:
         with open(csv_path, newline="", encoding="utf-8-sig") as f:
             reader = csv.DictReader(f)
-            rows = list(reader)
-
-        if not rows:
-            print(f"ERROR: CSV empty or headers mismatch: {csv_path}", file=sys.stderr)
-            return 1
-
-        conn = pyodbc.connect(self._connection_string)
-        cursor = conn.cursor()
-        cursor.fast_executemany = False
-
-        row_num = 0
-        for r in rows:
-            row_num += 1
-            try:
-                poll_interval = r.get("PollInterval") or r.get("nPollInterval")
-                if isinstance(poll_interval, str):
-                    poll_interval = poll_interval.strip()
-                    poll_interval = poll_interval if poll_interval else None
-
-                cursor.execute(
-                    self._sql,
-                    self.clean_name(r["DisplayName"]),
-                    r["DeviceType"],
-                    poll_interval,
-                    r.get("Notes", ""),
-                    r["NetworkAddress"],
-                    r["NetworkName"],
-                    r["DeviceGroup"],
-                )
-                conn.commit()
-                print(f"SUCCESS: Inserted row {row_num} - {r['DisplayName']}", flush=True)
-            except Exception as e:
-                conn.rollback()
-                print(f"WARNING: Failed row {row_num} ({r['DisplayName']}): {e}", file=sys.stderr, flush=True)
-
-        conn.close()
+            first = next(reader, None)
+            if first is None:
+                print(f"ERROR: CSV empty or headers mismatch: {csv_path}", file=sys.stderr)
+                if checkpoint is not None:
+                    checkpoint.close(False)
+                return 1
+
+            engine = BulkRowEngine(
+                connect=self._connect,
+                process_row=self._process_row,
+                row_label=self.row_label,
+                shard_key=self.shard_key,
+                report=self._report,
+                options=options,
+                checkpoint=checkpoint,
+            )
+            engine.run(itertools.chain([first], reader))
         return 0
 
 
 def run_bulk_add_cli(argv: list[str]) -> int:
-    csv_path = argv[1]
+    args = parse_bulk_cli_args(argv)
+    options = options_from_args(args)
     uc = BulkAddUseCase(connection_string=get_connection_string())
-    return uc.execute_from_csv_path(csv_path)
-
+    return uc.execute_from_csv_path(args.csv_path, options, checkpoint_from_args(args, "add", options))
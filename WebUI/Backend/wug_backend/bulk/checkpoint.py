@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+from constants import BULK_CHECKPOINT_SUFFIX
+
+
+def checkpoint_path_for(config_path: Path) -> Path:
+    """Checkpoint file that sits next to a saved bulk config (`Name.csv` -> `Name.checkpoint.jsonl`)."""
+    return config_path.with_name(config_path.stem + BULK_CHECKPOINT_SUFFIX)
+
+
+def is_checkpoint_file(name: str) -> bool:
+    return name.endswith(BULK_CHECKPOINT_SUFFIX)
+
+
+class BulkCheckpoint:
+    """
+    Append-only JSON-lines journal of a bulk run.
+
+    Every batch writes a `pending` line with its per-row outcomes just before
+    COMMIT and a `committed` line right after it, each fsync'd. A batch with no
+    `committed` line was either rolled back or interrupted mid-commit; its rows
+    are treated as uncertain unless a later line resolves them.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+        self._batch = 0
+        self._f = None
+        self._resumed: CheckpointState | None = None
+
+    def _write(self, record: dict) -> None:
+        record.setdefault("at", datetime.now().isoformat())
+        self._f.write(json.dumps(record) + "\n")
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def open(self, operation: str, config_file: str, options: dict, resume: bool) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        if resume and self._path.exists():
+            self._resumed = load_checkpoint(self._path)
+            self._batch = self._resumed.last_batch
+            self._f = open(self._path, "a", encoding="utf-8")
+            self._write({"type": "resume", "operation": operation, "config_file": config_file, "options": options})
+        else:
+            self._f = open(self._path, "w", encoding="utf-8")
+            self._write({"type": "start", "operation": operation, "config_file": config_file, "options": options})
+
+    def skipped_rows(self) -> dict[int, tuple[bool, str]]:
+        """Rows a resumed run must not touch again: {index: (ok, reason)}. Failed rows are retried."""
+        if self._resumed is None:
+            return {}
+        skip = {index: (True, "Already committed in a previous run") for index in self._resumed.committed}
+        for index in self._resumed.uncertain:
+            skip[index] = (False, "Interrupted during commit in a previous run; not re-run, verify it in WUG")
+        return skip
+
+    def before_commit(self, outcomes) -> int:
+        with self._lock:
+            self._batch += 1
+            self._write(
+                {
+                    "type": "pending",
+                    "batch": self._batch,
+                    "rows": [[o.index, o.ok, o.message] for o in outcomes],
+                }
+            )
+            return self._batch
+
+    def after_commit(self, batch: int) -> None:
+        with self._lock:
+            self._write({"type": "committed", "batch": batch})
+
+    def record_failed(self, outcomes) -> None:
+        """Rows that raised and were rolled back; nothing of theirs is in the DB."""
+        with self._lock:
+            self._write({"type": "failed", "rows": [[o.index, False, o.message] for o in outcomes]})
+
+    def close(self, finished: bool, summary: dict | None = None) -> None:
+        with self._lock:
+            if self._f is None:
+                return
+            if finished:
+                self._write({"type": "done", **(summary or {})})
+            self._f.close()
+            self._f = None
+
+
+def checkpoint_from_args(args, operation: str, options) -> BulkCheckpoint | None:
+    """Open the runner's checkpoint from `--checkpoint/--resume`; dry runs write nothing, so they keep none."""
+    if not getattr(args, "checkpoint", None) or options.dry_run:
+        return None
+    checkpoint = BulkCheckpoint(Path(args.checkpoint))
+    checkpoint.open(operation, Path(args.csv_path).name, asdict(options), resume=args.resume)
+    return checkpoint
+
+
+@dataclass
+class CheckpointState:
+    operation: str = ""
+    config_file: str = ""
+    options: dict = field(default_factory=dict)
+    committed: set[int] = field(default_factory=set)
+    failed: dict[int, str] = field(default_factory=dict)
+    uncertain: set[int] = field(default_factory=set)
+    last_batch: int = 0
+    last_committed_batch: int = 0
+    finished: bool = False
+    runs: int = 0
+
+    def summary(self) -> dict:
+        return {
+            "operation": self.operation,
+            "config_file": self.config_file,
+            "options": self.options,
+            "committed_rows": len(self.committed),
+            "failed_rows": len(self.failed),
+            "uncertain_rows": sorted(self.uncertain),
+            "last_committed_batch": self.last_committed_batch,
+            "finished": self.finished,
+            "runs": self.runs,
+        }
+
+
+def load_checkpoint(path: Path) -> CheckpointState:
+    state = CheckpointState()
+    if not path.exists():
+        return state
+
+    pending: dict[int, list] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for raw in f:
+            try:
+                rec = json.loads(raw)
+            except json.JSONDecodeError:
+                # A torn final line from a crash mid-write; everything before it is intact.
+                break
+            kind = rec.get("type")
+            if kind in ("start", "resume"):
+                state.runs += 1
+                state.finished = False
+                state.operation = rec.get("operation") or state.operation
+                state.config_file = rec.get("config_file") or state.config_file
+                state.options = rec.get("options") or state.options
+            elif kind == "pending":
+                state.last_batch = max(state.last_batch, int(rec["batch"]))
+                pending[int(rec["batch"])] = rec.get("rows") or []
+            elif kind == "committed":
+                batch = int(rec["batch"])
+                state.last_committed_batch = max(state.last_committed_batch, batch)
+                for index, ok, message in pending.pop(batch, []):
+                    if ok:
+                        state.committed.add(index)
+                        state.failed.pop(index, None)
+                    elif index not in state.committed:
+                        state.failed[index] = message
+            elif kind == "failed":
+                for index, _, message in rec.get("rows") or []:
+                    if index not in state.committed:
+                        state.failed[index] = message
+            elif kind == "done":
+                state.finished = True
+
+    resolved = state.committed | set(state.failed)
+    for rows in pending.values():
+        for index, ok, _ in rows:
+            if ok and index not in resolved:
+                state.uncertain.add(index)
+    return state
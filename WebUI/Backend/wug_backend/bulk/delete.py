@@ -2,11 +2,18 @@ from __future__ import annotations
 
 import csv
 import sys
-import traceback
 
 import pyodbc
 
 from constants import get_connection_string
+from wug_backend.bulk.checkpoint import checkpoint_from_args
+from wug_backend.bulk.engine import (
+    BulkRowEngine,
+    BulkRunOptions,
+    RowOutcome,
+    options_from_args,
+    parse_bulk_cli_args,
+)
 
 
 class BulkDeleteUseCase:
@@ -58,64 +65,81 @@ class BulkDeleteUseCase:
         cursor.execute("DELETE FROM NetworkInterface WHERE nDeviceID = ?", device_id)
         cursor.execute("DELETE FROM Device WHERE nDeviceID = ?", device_id)
 
-    def execute_from_csv_path(self, csv_path: str) -> int:
-        def debug(msg):
-            print(msg, flush=True)
-
-        conn = self._connect()
-        cur = conn.cursor()
-
-        successes = 0
-        failures = []
-
+    def _detect_mode(self, fieldnames) -> str | None:
+        headers = [h.lower() for h in (fieldnames or [])]
+        if "sdisplayname" in headers and "snetworkaddress" in headers:
+            return "both"
+        if "sdisplayname" in headers:
+            return "display"
+        if "snetworkaddress" in headers:
+            return "address"
+        return None
+
+    def _row_keys(self, row):
+        name = row.get("sDisplayName") or row.get("sdisplayname")
+        addr = row.get("sNetworkAddress") or row.get("snetworkaddress")
+        return name, addr
+
+    def row_label(self, row) -> str:
+        name, addr = self._row_keys(row)
+        return name or addr or ""
+
+    def shard_key(self, row, mode: str) -> str:
+        # The key the file's mode matches on, so every row naming a device lands on one shard.
+        name, addr = self._row_keys(row)
+        return (addr if mode == "address" else name) or ""
+
+    def _process_row(self, cursor, row, mode: str):
+        name, addr = self._row_keys(row)
+        if mode == "both":
+            device_id = self._find_device_by_both(cursor, name, addr)
+        elif mode == "display":
+            device_id = self._find_device_by_display(cursor, name)
+        else:
+            device_id = self._find_device_by_address(cursor, addr)
+
+        if not device_id:
+            return False, "Not found"
+
+        self._delete_device(cursor, device_id)
+        return True, {"device_id": device_id}
+
+    def _report(self, outcome: RowOutcome) -> None:
+        if outcome.ok:
+            print(f"Deleted device {outcome.info['device_id']} ({outcome.label})", flush=True)
+        elif outcome.trace:
+            print("ERROR: Error traceback:", file=sys.stderr)
+            print(outcome.trace, file=sys.stderr, flush=True)
+
+    def execute_from_csv_path(self, csv_path: str, options: BulkRunOptions | None = None, checkpoint=None) -> int:
         with open(csv_path, newline="", encoding="utf-8-sig") as f:
             reader = csv.DictReader(f)
-            headers = [h.lower() for h in reader.fieldnames]
-
-            mode = None
-            if "sdisplayname" in headers and "snetworkaddress" in headers:
-                mode = "both"
-            elif "sdisplayname" in headers:
-                mode = "display"
-            elif "snetworkaddress" in headers:
-                mode = "address"
-            else:
+            mode = self._detect_mode(reader.fieldnames)
+            if mode is None:
                 print("ERROR: CSV must contain sDisplayName OR sNetworkAddress.", file=sys.stderr)
+                if checkpoint is not None:
+                    checkpoint.close(False)
                 return 1
 
-            for i, row in enumerate(reader, start=1):
-                try:
-                    name = row.get("sDisplayName") or row.get("sdisplayname")
-                    addr = row.get("sNetworkAddress") or row.get("snetworkaddress")
-
-                    device_id = None
-                    if mode == "both":
-                        device_id = self._find_device_by_both(cur, name, addr)
-                    elif mode == "display":
-                        device_id = self._find_device_by_display(cur, name)
-                    else:
-                        device_id = self._find_device_by_address(cur, addr)
-
-                    if not device_id:
-                        failures.append((i, name or addr, "Not found"))
-                        continue
-
-                    self._delete_device(cur, device_id)
-                    conn.commit()
-                    successes += 1
-                    debug(f"Deleted device {device_id} ({name or addr})")
-
-                except Exception as e:
-                    conn.rollback()
-                    failures.append((i, name or addr, str(e)))
-                    print("ERROR: Error traceback:", file=sys.stderr)
-                    print(traceback.format_exc(), file=sys.stderr, flush=True)
-
-        cur.close()
-        conn.close()
+            engine = BulkRowEngine(
+                connect=self._connect,
+                process_row=lambda cursor, row: self._process_row(cursor, row, mode),
+                row_label=self.row_label,
+                shard_key=lambda row: self.shard_key(row, mode),
+                report=self._report,
+                options=options,
+                checkpoint=checkpoint,
+            )
+            outcomes = engine.run(reader)
+
+        successes = sum(1 for o in outcomes if o.ok and not o.skipped)
+        failures = [(o.index, o.label, o.message) for o in outcomes if not o.ok]
+        resumed = sum(1 for o in outcomes if o.ok and o.skipped)
 
         print("Done.", flush=True)
         print(f"Successes: {successes}; Failures: {len(failures)}", flush=True)
+        if resumed:
+            print(f"Already committed in a previous run: {resumed}", flush=True)
         if failures:
             print("Failures:", file=sys.stderr)
             for f in failures:
@@ -125,7 +149,7 @@ class BulkDeleteUseCase:
 
 
 def run_bulk_delete_cli(argv: list[str]) -> int:
-    csv_path = argv[1]
+    args = parse_bulk_cli_args(argv)
+    options = options_from_args(args)
     uc = BulkDeleteUseCase(connection_string=get_connection_string())
-    return uc.execute_from_csv_path(csv_path)
-
+    return uc.execute_from_csv_path(args.csv_path, options, checkpoint_from_args(args, "delete", options))
@@ -0,0 +1,355 @@
+from __future__ import annotations
+
+import argparse
+import queue
+import sys
+import threading
+import traceback
+import zlib
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator
+
+from constants import BULK_BATCH_SIZE, BULK_MAX_PARALLELISM
+
+
+@dataclass
+class RowOutcome:
+    index: int
+    label: str
+    ok: bool
+    message: str = ""
+    info: Any = None
+    trace: str = ""
+    # resumed run: the row was settled by an earlier run and not processed again
+    skipped: bool = False
+
+
+@dataclass(frozen=True)
+class BulkRunOptions:
+    parallelism: int = 1
+    batch_size: int = BULK_BATCH_SIZE
+    # update only: write just the columns that differ from the DB / report the plan without writing
+    diff: bool = False
+    dry_run: bool = False
+
+    def normalized(self) -> "BulkRunOptions":
+        return BulkRunOptions(
+            parallelism=min(max(1, int(self.parallelism)), BULK_MAX_PARALLELISM),
+            batch_size=max(1, int(self.batch_size)),
+            diff=bool(self.diff or self.dry_run),
+            dry_run=bool(self.dry_run),
+        )
+
+    def to_cli_args(self) -> list[str]:
+        opts = self.normalized()
+        args = ["--parallelism", str(opts.parallelism), "--batch-size", str(opts.batch_size)]
+        if opts.diff:
+            args.append("--diff")
+        if opts.dry_run:
+            args.append("--dry-run")
+        return args
+
+
+def parse_bulk_cli_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog=argv[0] if argv else "bulk")
+    parser.add_argument("csv_path")
+    parser.add_argument("--parallelism", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE)
+    parser.add_argument("--diff", action="store_true")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--checkpoint", default="")
+    parser.add_argument("--resume", action="store_true")
+    return parser.parse_args(argv[1:])
+
+
+def options_from_args(args: argparse.Namespace) -> BulkRunOptions:
+    return BulkRunOptions(
+        parallelism=args.parallelism,
+        batch_size=args.batch_size,
+        diff=args.diff,
+        dry_run=args.dry_run,
+    ).normalized()
+
+
+def shard_for_key(key: str, shard_count: int) -> int:
+    """Stable shard number for a device key (same key -> same shard in every run)."""
+    if shard_count <= 1:
+        return 0
+    return zlib.crc32((key or "").strip().lower().encode("utf-8")) % shard_count
+
+
+def _is_retryable(exc: Exception) -> bool:
+    text = str(exc).lower()
+    return "40001" in text or "deadlock" in text
+
+
+class OrderedOutcomeSink:
+    """
+    Re-sequences outcomes coming from several shards so they are reported in
+    original row order. With `max_pending`, the producer calls wait_for_room()
+    before handing out a row, so at most that many outcomes wait here for a
+    slower shard. Only for a producer that does not also run a shard, which
+    would wait on itself.
+    """
+
+    def __init__(self, report: Callable[[RowOutcome], None], first_index: int = 1, max_pending: int = 0) -> None:
+        self._report = report
+        self._next = first_index
+        self._pending: dict[int, RowOutcome] = {}
+        self._max_pending = max_pending
+        self._stalled = False
+        self._cond = threading.Condition()
+        self.outcomes: list[RowOutcome] = []
+
+    def put(self, outcomes: list[RowOutcome]) -> None:
+        with self._cond:
+            for o in outcomes:
+                self._pending[o.index] = o
+            while self._next in self._pending:
+                o = self._pending.pop(self._next)
+                self.outcomes.append(o)
+                self._report(o)
+                self._next += 1
+            self._cond.notify_all()
+
+    def wait_for_room(self, index: int) -> None:
+        """Block until row `index` is less than `max_pending` rows ahead of the next one to report."""
+        if not self._max_pending:
+            return
+        with self._cond:
+            self._cond.wait_for(lambda: self._stalled or index - self._next < self._max_pending)
+
+    def stall(self) -> None:
+        # A shard died: its rows will never be reported, so stop holding the producer back.
+        with self._cond:
+            self._stalled = True
+            self._cond.notify_all()
+
+    def drain(self) -> None:
+        # Only reached if a shard died mid-run; report whatever is left in index order.
+        with self._cond:
+            for index in sorted(self._pending):
+                o = self._pending.pop(index)
+                self.outcomes.append(o)
+                self._report(o)
+
+
+# Handed to a shard when its queue is momentarily empty: report the rows it holds instead of
+# waiting for a full batch, so the rows behind them in the sink are not held back.
+_FLUSH = object()
+
+
+def _queued_rows(q: queue.Queue, sentinel: object) -> Iterator:
+    while True:
+        try:
+            item = q.get_nowait()
+        except queue.Empty:
+            yield _FLUSH
+            item = q.get()
+        if item is sentinel:
+            return
+        yield item
+
+
+class BulkRowEngine:
+    """
+    Runs a use case's per-row handler over CSV rows in batched transactions.
+
+    `process_row(cursor, row)` returns (ok, info). It must only return ok=False
+    when it wrote nothing (e.g. "device not found"); any write failure should
+    raise, which rolls back the batch and replays its rows one by one so a
+    single bad row does not sink its neighbours.
+
+    With parallelism > 1 rows are sharded by `shard_key(row)` across that many
+    connections, so all rows for one device run on the same connection, and
+    outcomes are merged back into original row order before being reported.
+
+    With a `checkpoint` every commit is journaled (see bulk/checkpoint.py); on a
+    resumed run the rows it already settled are reported as skipped, not re-run.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        process_row: Callable[[Any, dict], tuple[bool, Any]],
+        row_label: Callable[[dict], str],
+        shard_key: Callable[[dict], str],
+        report: Callable[[RowOutcome], None],
+        options: BulkRunOptions | None = None,
+        checkpoint=None,
+    ) -> None:
+        self._connect = connect
+        self._process_row = process_row
+        self._row_label = row_label
+        self._shard_key = shard_key
+        self._report = report
+        self._options = (options or BulkRunOptions()).normalized()
+        self._checkpoint = checkpoint
+
+    def _outcome(self, index: int, row: dict, ok: bool, info: Any) -> RowOutcome:
+        return RowOutcome(
+            index=index,
+            label=self._row_label(row),
+            ok=ok,
+            message="" if ok else str(info),
+            info=info,
+        )
+
+    def _commit(self, conn, outcomes: list[RowOutcome]) -> None:
+        if self._checkpoint is None:
+            conn.commit()
+            return
+        batch = self._checkpoint.before_commit(outcomes)
+        conn.commit()
+        self._checkpoint.after_commit(batch)
+
+    def _run_one(self, conn, cursor, index: int, row: dict) -> RowOutcome:
+        attempts = 2
+        while True:
+            try:
+                ok, info = self._process_row(cursor, row)
+                outcome = self._outcome(index, row, ok, info)
+                self._commit(conn, [outcome])
+                return outcome
+            except Exception as e:
+                conn.rollback()
+                attempts -= 1
+                if attempts > 0 and _is_retryable(e):
+                    continue
+                o = self._outcome(index, row, False, e)
+                o.trace = traceback.format_exc()
+                if self._checkpoint is not None:
+                    self._checkpoint.record_failed([o])
+                return o
+
+    def _run_batch(self, conn, cursor, batch: list[tuple[int, dict]]) -> list[RowOutcome]:
+        if len(batch) == 1:
+            return [self._run_one(conn, cursor, *batch[0])]
+        outcomes = []
+        try:
+            for index, row in batch:
+                ok, info = self._process_row(cursor, row)
+                outcomes.append(self._outcome(index, row, ok, info))
+            self._commit(conn, outcomes)
+            return outcomes
+        except Exception:
+            conn.rollback()
+            return [self._run_one(conn, cursor, index, row) for index, row in batch]
+
+    def _run_shard(self, conn, items: Iterator[tuple[int, dict]], sink: OrderedOutcomeSink) -> None:
+        cursor = conn.cursor()
+        try:
+            batch: list[tuple[int, dict]] = []
+            for item in items:
+                if item is _FLUSH:
+                    if batch:
+                        sink.put(self._run_batch(conn, cursor, batch))
+                        batch = []
+                    continue
+                batch.append(item)
+                if len(batch) >= self._options.batch_size:
+                    sink.put(self._run_batch(conn, cursor, batch))
+                    batch = []
+            if batch:
+                sink.put(self._run_batch(conn, cursor, batch))
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+    def _emit(self, outcome: RowOutcome) -> None:
+        if not outcome.skipped:
+            self._report(outcome)
+        elif not outcome.ok:
+            print(f"WARNING: Row {outcome.index} ({outcome.label}): {outcome.message}", file=sys.stderr, flush=True)
+
+    def _pending_rows(self, rows: Iterable[dict], sink: OrderedOutcomeSink) -> Iterator[tuple[int, dict]]:
+        skip = self._checkpoint.skipped_rows() if self._checkpoint is not None else {}
+        if skip:
+            done = sum(1 for ok, _ in skip.values() if ok)
+            print(f"Resuming from checkpoint: {done} row(s) already committed will be skipped", flush=True)
+        sharded = self._options.parallelism > 1
+        unflushed = False
+        for index, row in enumerate(rows, start=1):
+            if index in skip:
+                # Still goes through the sink so the reported sequence has no gaps.
+                ok, reason = skip[index]
+                if sharded:
+                    sink.wait_for_room(index)
+                elif unflushed:
+                    # One shard runs in this thread: it must commit the rows it holds before
+                    # this one can be reported, as nothing else will.
+                    yield _FLUSH
+                    unflushed = False
+                sink.put([RowOutcome(index=index, label=self._row_label(row), ok=ok, message=reason, skipped=True)])
+                continue
+            unflushed = True
+            yield index, row
+
+    def run(self, rows: Iterable[dict]) -> list[RowOutcome]:
+        finished = False
+        try:
+            outcomes = self._run(rows)
+            finished = True
+            return outcomes
+        finally:
+            if self._checkpoint is not None:
+                summary = None
+                if finished:
+                    summary = {
+                        "rows": len(outcomes),
+                        "ok": sum(1 for o in outcomes if o.ok),
+                        "failed": sum(1 for o in outcomes if not o.ok),
+                    }
+                self._checkpoint.close(finished, summary)
+
+    def _run(self, rows: Iterable[dict]) -> list[RowOutcome]:
+        shard_count = self._options.parallelism
+        # Connect up front so a bad connection string fails the run before any row is read.
+        conns = [self._connect() for _ in range(shard_count)]
+        # Enough room for every shard to be a few batches ahead of the slowest one.
+        sink = OrderedOutcomeSink(self._emit, max_pending=self._options.batch_size * shard_count * 4)
+        try:
+            numbered = self._pending_rows(rows, sink)
+            if shard_count == 1:
+                self._run_shard(conns[0], numbered, sink)
+                return sink.outcomes
+
+            sentinel = object()
+            queues = [queue.Queue(maxsize=self._options.batch_size * 4) for _ in range(shard_count)]
+            errors: list[BaseException] = []
+
+            def _worker(n: int) -> None:
+                try:
+                    self._run_shard(conns[n], _queued_rows(queues[n], sentinel), sink)
+                except BaseException as e:
+                    errors.append(e)
+                    sink.stall()
+                    # keep draining so the producer never blocks on a dead shard
+                    for _ in iter(queues[n].get, sentinel):
+                        pass
+
+            workers = [
+                threading.Thread(target=_worker, args=(n,), name=f"bulk-shard-{n}", daemon=True)
+                for n in range(shard_count)
+            ]
+            for w in workers:
+                w.start()
+            for item in numbered:
+                sink.wait_for_room(item[0])
+                queues[shard_for_key(self._shard_key(item[1]), shard_count)].put(item)
+            for q in queues:
+                q.put(sentinel)
+            for w in workers:
+                w.join()
+            sink.drain()
+            if errors:
+                raise errors[0]
+            return sink.outcomes
+        finally:
+            for conn in conns:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import csv
+import io
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+
+from constants import BULK_INGEST_CHUNK_ROWS, ENCODING_UTF8_SIG
+
+
+# Columns whose human-readable names are resolved to WUG ids before the runner sees them.
+LOOKUP_COLUMNS = {
+    "add": {"DeviceType": "types", "DeviceGroup": "groups"},
+    "update": {
+        "DeviceType": "types",
+        "GroupName": "groups",
+        "NewDeviceType": "types",
+        "NewDeviceGroup": "groups",
+    },
+    "upsert": {"DeviceType": "types", "DeviceGroup": "groups"},
+}
+
+
+@dataclass(frozen=True)
+class BulkIngestResult:
+    path: Path
+    row_count: int
+    columns: list[str]
+    errors: list[dict] = field(default_factory=list)
+
+
+class BulkUploadReader:
+    """Streams an uploaded sheet as DataFrame chunks without materialising the whole workbook."""
+
+    def __init__(self, chunk_rows: int = BULK_INGEST_CHUNK_ROWS) -> None:
+        self._chunk_rows = max(1, chunk_rows)
+
+    def _is_csv(self, upload_file) -> bool:
+        name = (getattr(upload_file, "filename", "") or "").lower()
+        content_type = (getattr(upload_file, "content_type", "") or "").lower()
+        return name.endswith(".csv") or content_type in ("text/csv", "application/csv")
+
+    def _iter_xlsx_rows(self, stream) -> Iterator[tuple]:
+        from openpyxl import load_workbook
+
+        wb = load_workbook(stream, read_only=True, data_only=True)
+        try:
+            ws = wb.worksheets[0]
+            for row in ws.iter_rows(values_only=True):
+                yield row
+        finally:
+            wb.close()
+
+    def _iter_csv_rows(self, stream) -> Iterator[tuple]:
+        text = io.TextIOWrapper(stream, encoding=ENCODING_UTF8_SIG, newline="")
+        try:
+            for row in csv.reader(text):
+                yield tuple(v if v != "" else None for v in row)
+        finally:
+            text.detach()
+
+    def iter_chunks(self, upload_file) -> Iterator[pd.DataFrame]:
+        stream = upload_file.file
+        rows = self._iter_csv_rows(stream) if self._is_csv(upload_file) else self._iter_xlsx_rows(stream)
+
+        header: list[str] | None = None
+        buf: list[tuple] = []
+        emitted = False
+        for row in rows:
+            if header is None:
+                header = [str(h).strip() if h is not None else f"Unnamed: {i}" for i, h in enumerate(row)]
+                continue
+            if not any(v is not None and str(v).strip() != "" for v in row):
+                continue
+            # Pad/trim ragged rows to the header width, like read_excel does.
+            buf.append(tuple(row[: len(header)]) + (None,) * (len(header) - len(row)))
+            if len(buf) >= self._chunk_rows:
+                yield pd.DataFrame(buf, columns=header, dtype=object)
+                buf = []
+                emitted = True
+
+        if header is None:
+            return
+        if buf or not emitted:
+            # A header-only sheet still yields an empty frame so the header reaches the saved CSV.
+            yield pd.DataFrame(buf, columns=header, dtype=object)
+
+
+class BulkLookupMapper:
+    """Resolves DeviceType/DeviceGroup names to ids with one vectorised map per column."""
+
+    def __init__(self, device_types: dict, device_groups: dict) -> None:
+        self._lookups = {"types": device_types, "groups": device_groups}
+
+    @staticmethod
+    def normalized_keys(series: pd.Series) -> tuple[pd.Series, pd.Series]:
+        keys = series.astype(str).str.strip()
+        present = series.notna() & (keys != "")
+        return keys, present
+
+    def map_chunk(self, operation: str, df: pd.DataFrame) -> pd.DataFrame:
+        for column, kind in LOOKUP_COLUMNS.get(operation, {}).items():
+            if column not in df:
+                continue
+            keys, present = self.normalized_keys(df[column])
+            # Int64 keeps ids integral when some names fail to resolve (plain map() would upcast to float).
+            df[column] = keys.map(self._lookups[kind]).where(present).astype("Int64")
+        return df
+
+
+class BulkUploadIngestor:
+    """
+    Upload -> single CSV copy pipeline. Rows are read in chunks, lookups are
+    resolved per chunk, and each chunk is appended to the saved config that
+    the bulk runner then consumes directly.
+    """
+
+    def __init__(self, device_repo, reader: BulkUploadReader | None = None) -> None:
+        self._device_repo = device_repo
+        self._reader = reader or BulkUploadReader()
+
+    def ingest(self, operation: str, upload_file, dest_path: Path, validate: bool = False) -> BulkIngestResult:
+        device_types = self._device_repo.load_device_types()
+        device_groups = self._device_repo.load_device_groups()
+        mapper = BulkLookupMapper(device_types, device_groups)
+        validator = None
+        if validate:
+            from wug_backend.bulk.preflight import BulkPreflightValidator
+
+            validator = BulkPreflightValidator(
+                operation,
+                device_types,
+                device_groups,
+                self._device_repo.load_inventory_keys,
+            )
+
+        row_count = 0
+        wrote_header = False
+        columns: list[str] = []
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(dest_path, "w", newline="", encoding=ENCODING_UTF8_SIG) as f:
+            for chunk in self._reader.iter_chunks(upload_file):
+                if validator is not None:
+                    validator.observe(chunk, row_count + 1)
+                chunk = mapper.map_chunk(operation, chunk)
+                if not columns:
+                    columns = list(chunk.columns)
+                chunk.to_csv(f, index=False, header=not wrote_header)
+                wrote_header = True
+                row_count += len(chunk)
+
+        errors = validator.finish() if validator is not None else []
+        return BulkIngestResult(path=dest_path, row_count=row_count, columns=columns, errors=errors)
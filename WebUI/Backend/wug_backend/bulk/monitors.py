@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import sys
+import traceback
+
+import pyodbc
+
+from constants import BULK_MONITOR_ACTIONS, BULK_MONITOR_CHUNK_SIZE, get_connection_string
+
+
+class BulkMonitorUseCase:
+    """
+    Assigns or removes one active monitor type across a set of existing
+    devices. The device set is resolved to ids first (sheet or group), then
+    written with one INSERT ... SELECT / UPDATE ... SET bRemoved = 1 per
+    chunk of ids, each chunk in its own transaction.
+    """
+
+    def __init__(self, connection_string: str, chunk_size: int = BULK_MONITOR_CHUNK_SIZE) -> None:
+        self._connection_string = connection_string
+        # SQL Server caps a statement at 2100 parameters.
+        self._chunk_size = min(max(1, chunk_size), 2000)
+
+    def _connect(self):
+        conn = pyodbc.connect(self._connection_string, autocommit=False)
+        conn.autocommit = False
+        return conn
+
+    def _chunks(self, values):
+        values = list(values)
+        for start in range(0, len(values), self._chunk_size):
+            yield values[start:start + self._chunk_size]
+
+    # ---------- resolve ----------
+    def _resolve_monitor(self, cursor, monitor: str):
+        monitor = (monitor or "").strip()
+        if monitor.isdigit():
+            cursor.execute(
+                "SELECT nActiveMonitorTypeID, sMonitorTypeName FROM ActiveMonitorType "
+                "WHERE nActiveMonitorTypeID = ? AND ISNULL(bRemoved, 0) <> 1",
+                int(monitor),
+            )
+        else:
+            cursor.execute(
+                "SELECT nActiveMonitorTypeID, sMonitorTypeName FROM ActiveMonitorType "
+                "WHERE sMonitorTypeName = ? AND ISNULL(bRemoved, 0) <> 1",
+                monitor,
+            )
+        rows = cursor.fetchall()
+        if len(rows) != 1:
+            return None, None
+        return rows[0][0], rows[0][1]
+
+    def _devices_in_group(self, cursor, group_name: str) -> list[int]:
+        cursor.execute(
+            """
+        SELECT DISTINCT p.nDeviceID
+        FROM PivotDeviceToGroup p
+        JOIN DeviceGroup g ON g.nDeviceGroupID = p.nDeviceGroupID
+        JOIN Device d ON d.nDeviceID = p.nDeviceID
+        WHERE g.sGroupName = ? AND ISNULL(d.bRemoved, 0) = 0
+    """,
+            group_name,
+        )
+        return [r[0] for r in cursor.fetchall()]
+
+    def _ids_by(self, cursor, sql_template: str, values) -> dict:
+        found: dict = {}
+        for chunk in self._chunks(sorted(values)):
+            placeholders = ", ".join("?" for _ in chunk)
+            cursor.execute(sql_template.format(placeholders=placeholders), chunk)
+            for key, device_id in cursor.fetchall():
+                found.setdefault(str(key).strip(), set()).add(device_id)
+        return found
+
+    def _devices_from_csv(self, cursor, csv_path: str) -> tuple[list[int], list[str]]:
+        """Device ids for the sheet rows (nDeviceID, sDisplayName or sNetworkAddress) plus the rows that did not resolve."""
+        with open(csv_path, newline="", encoding="utf-8-sig") as f:
+            rows = list(csv.DictReader(f))
+
+        def _cell(row, column):
+            value = (row.get(column) or "").strip()
+            return value or None
+
+        names = {_cell(r, "sDisplayName") for r in rows} - {None}
+        addresses = {_cell(r, "sNetworkAddress") for r in rows if not _cell(r, "sDisplayName")} - {None}
+        by_name = self._ids_by(
+            cursor,
+            "SELECT sDisplayName, nDeviceID FROM Device WHERE sDisplayName IN ({placeholders})",
+            names,
+        )
+        by_address = self._ids_by(
+            cursor,
+            "SELECT sNetworkAddress, nDeviceID FROM NetworkInterface WHERE sNetworkAddress IN ({placeholders})",
+            addresses,
+        )
+
+        device_ids: dict[int, None] = {}
+        missing = []
+        for i, row in enumerate(rows, start=1):
+            raw_id, name, addr = _cell(row, "nDeviceID"), _cell(row, "sDisplayName"), _cell(row, "sNetworkAddress")
+            if raw_id and raw_id.isdigit():
+                matched = {int(raw_id)}
+            elif name:
+                matched = by_name.get(name, set())
+            else:
+                matched = by_address.get(addr, set()) if addr else set()
+            if not matched:
+                missing.append(f"Row {i} ({name or addr or raw_id or ''})")
+            for device_id in matched:
+                device_ids[device_id] = None
+        return list(device_ids), missing
+
+    # ---------- write ----------
+    def _assign_chunk(self, cursor, monitor_id: int, device_ids: list[int], argument: str, comment: str) -> int:
+        placeholders = ", ".join("?" for _ in device_ids)
+        cursor.execute(
+            f"""
+        INSERT INTO PivotActiveMonitorTypeToDevice (
+            nDeviceID, nActiveMonitorTypeID, nNetworkInterfaceID,
+            bAssumedState, nMonitorStateID, dLastInternalStateTime,
+            nActionPolicyID, nPollInterval,
+            bGatherPerformanceData, bFireActions,
+            bDisabled, bRemoved, sArgument, sComment, nCriticalPollingOrder
+        )
+        SELECT
+            d.nDeviceID, ?, d.nDefaultNetworkInterfaceID,
+            0, 0, GETDATE(),
+            d.nActionPolicyID, NULL,
+            NULL, 0,
+            0, 0, ?, ?, NULL
+        FROM Device d
+        WHERE d.nDeviceID IN ({placeholders})
+          AND NOT EXISTS (
+              SELECT 1 FROM PivotActiveMonitorTypeToDevice p
+              WHERE p.nDeviceID = d.nDeviceID
+                AND p.nActiveMonitorTypeID = ?
+                AND ISNULL(p.bRemoved, 0) = 0
+          );
+    """,
+            [monitor_id, argument, comment, *device_ids, monitor_id],
+        )
+        return cursor.rowcount
+
+    def _remove_chunk(self, cursor, monitor_id: int, device_ids: list[int], argument: str | None) -> int:
+        placeholders = ", ".join("?" for _ in device_ids)
+        params = [monitor_id, *device_ids]
+        argument_filter = ""
+        if argument:
+            # Only the instance with this argument when a type is attached more than once.
+            argument_filter = " AND sArgument = ?"
+            params.append(argument)
+        # Marked removed as WUG does, never deleted, so the monitor's history and state rows keep their link.
+        cursor.execute(
+            f"UPDATE PivotActiveMonitorTypeToDevice SET bRemoved = 1 "
+            f"WHERE nActiveMonitorTypeID = ? AND nDeviceID IN ({placeholders}) "
+            f"AND ISNULL(bRemoved, 0) = 0{argument_filter}",
+            params,
+        )
+        return cursor.rowcount
+
+    def execute(
+        self,
+        action: str,
+        monitor: str,
+        csv_path: str | None = None,
+        group_name: str | None = None,
+        argument: str = "",
+        comment: str = "",
+    ) -> int:
+        if action not in BULK_MONITOR_ACTIONS:
+            print(f"ERROR: Unknown action {action!r}; expected assign or remove", file=sys.stderr)
+            return 1
+        if bool(csv_path) == bool(group_name):
+            print("ERROR: Give either a device sheet or a device group", file=sys.stderr)
+            return 1
+
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            monitor_id, monitor_name = self._resolve_monitor(cursor, monitor)
+            if monitor_id is None:
+                print(f"ERROR: Active monitor type not found (or not unique): {monitor}", file=sys.stderr)
+                return 1
+
+            if group_name:
+                device_ids, missing = self._devices_in_group(cursor, group_name), []
+                print(f"Device group {group_name!r}: {len(device_ids)} device(s)", flush=True)
+            else:
+                device_ids, missing = self._devices_from_csv(cursor, csv_path)
+                print(f"Sheet resolved to {len(device_ids)} device(s)", flush=True)
+            for m in missing:
+                print(f"WARNING: {m}: device not found", file=sys.stderr, flush=True)
+
+            changed = failed = 0
+            verb = "Assigned" if action == "assign" else "Removed"
+            for n, chunk in enumerate(self._chunks(device_ids), start=1):
+                try:
+                    if action == "assign":
+                        count = self._assign_chunk(cursor, monitor_id, chunk, argument or "", comment or "")
+                    else:
+                        count = self._remove_chunk(cursor, monitor_id, chunk, argument)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    failed += len(chunk)
+                    print(f"ERROR: Chunk {n} ({len(chunk)} device(s)) rolled back", file=sys.stderr)
+                    print(traceback.format_exc(), file=sys.stderr, flush=True)
+                    continue
+                changed += max(count, 0)
+                print(f"SUCCESS: {verb} {monitor_name} on {count} of {len(chunk)} device(s) in chunk {n}", flush=True)
+        finally:
+            conn.close()
+
+        untouched = max(len(device_ids) - changed - failed, 0)
+        print("Done.", flush=True)
+        print(
+            f"Devices: {len(device_ids)}; {verb}: {changed}; "
+            f"{'Already assigned' if action == 'assign' else 'Not attached'}: {untouched}; "
+            f"Failed: {failed}; Not found: {len(missing)}",
+            flush=True,
+        )
+        return 1 if failed else 0
+
+
+def run_bulk_monitor_cli(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog=argv[0] if argv else "bulk_monitor")
+    parser.add_argument("csv_path", nargs="?", default="")
+    parser.add_argument("--action", choices=BULK_MONITOR_ACTIONS, required=True)
+    parser.add_argument("--monitor", required=True)
+    parser.add_argument("--group", default="")
+    parser.add_argument("--argument", default="")
+    parser.add_argument("--comment", default="")
+    parser.add_argument("--chunk-size", type=int, default=BULK_MONITOR_CHUNK_SIZE)
+    args = parser.parse_args(argv[1:])
+
+    uc = BulkMonitorUseCase(connection_string=get_connection_string(), chunk_size=args.chunk_size)
+    return uc.execute(
+        action=args.action,
+        monitor=args.monitor,
+        csv_path=args.csv_path or None,
+        group_name=args.group or None,
+        argument=args.argument,
+        comment=args.comment,
+    )
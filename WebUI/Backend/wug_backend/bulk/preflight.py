@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+from typing import Callable
+
+import pandas as pd
+
+from wug_backend.bulk.ingest import LOOKUP_COLUMNS, BulkLookupMapper
+
+
+# Columns each operation needs populated on every row.
+REQUIRED_COLUMNS = {
+    "add": ["DisplayName", "DeviceType", "DeviceGroup", "NetworkAddress"],
+    "update": ["sDisplayName", "sDeviceGroup", "sNetworkAddress"],
+    "delete": [],
+    "upsert": ["DisplayName", "DeviceType", "DeviceGroup", "NetworkAddress"],
+}
+
+# Columns that must hold an IP address when present.
+ADDRESS_COLUMNS = {
+    "add": ["NetworkAddress"],
+    "update": ["sNetworkAddress", "NewNetworkAddress"],
+    "delete": ["sNetworkAddress"],
+    "upsert": ["NetworkAddress"],
+}
+
+# Columns checked for duplicates within the uploaded file.
+UNIQUE_COLUMNS = {
+    "add": ["DisplayName", "NetworkAddress"],
+    "update": ["NewDisplayName", "NewNetworkAddress"],
+    "delete": [],
+    "upsert": ["DisplayName", "NetworkAddress"],
+}
+
+PREFLIGHT_ERROR_COLUMNS = ["row", "column", "value", "error"]
+
+_IPV4_PATTERN = r"(?:\d{1,3})\.(?:\d{1,3})\.(?:\d{1,3})\.(?:\d{1,3})"
+
+
+def malformed_address_mask(keys: pd.Series, present: pd.Series) -> pd.Series:
+    """True where a present value is not a valid IPv4/IPv6 address (IPv4 checked without per-row parsing)."""
+    is_v4_shape = keys.str.fullmatch(_IPV4_PATTERN)
+    octets = keys.where(is_v4_shape, "0.0.0.0").str.split(".", expand=True).astype(int)
+    v4_ok = is_v4_shape & (octets <= 255).all(axis=1)
+
+    v6_candidates = present & ~is_v4_shape & keys.str.contains(":", regex=False)
+    v6_ok = pd.Series(False, index=keys.index)
+    if v6_candidates.any():
+        import ipaddress
+
+        def _is_v6(value: str) -> bool:
+            try:
+                return isinstance(ipaddress.ip_address(value), ipaddress.IPv6Address)
+            except ValueError:
+                return False
+
+        v6_ok[v6_candidates] = keys[v6_candidates].map(_is_v6)
+
+    return present & ~(v4_ok | v6_ok)
+
+
+class BulkPreflightValidator:
+    """
+    Validates a whole upload before any DB write. Row-local checks run per chunk
+    while the upload streams; duplicate and inventory checks run once at the end
+    over the few key columns kept from every chunk.
+    """
+
+    def __init__(
+        self,
+        operation: str,
+        device_types: dict,
+        device_groups: dict,
+        inventory_loader: Callable[[], list[tuple]],
+    ) -> None:
+        self._operation = operation
+        self._lookups = {"types": device_types, "groups": device_groups}
+        self._inventory_loader = inventory_loader
+        self._errors: list[pd.DataFrame] = []
+        self._keys: list[pd.DataFrame] = []
+        self._header_checked = False
+
+    def _key_columns(self) -> list[str]:
+        if self._operation in ("add", "upsert"):
+            return ["DisplayName", "NetworkAddress"]
+        if self._operation == "update":
+            return ["sDisplayName", "sDeviceGroup", "sNetworkAddress", "NewDisplayName", "NewNetworkAddress"]
+        return ["sDisplayName", "sNetworkAddress"]
+
+    def _check_header(self, columns: list[str]) -> None:
+        # Header problems are reported against row 0 so they sort ahead of data rows.
+        self._header_checked = True
+        header_row = pd.Series([0])
+        for column in REQUIRED_COLUMNS.get(self._operation, []):
+            if column not in columns:
+                self._add_errors(header_row, column, pd.Series([""]), "Missing column")
+        if self._operation == "delete" and not {"sDisplayName", "sNetworkAddress"} & set(columns):
+            self._add_errors(header_row, "sDisplayName", pd.Series([""]), "CSV must contain sDisplayName OR sNetworkAddress")
+
+    def _add_errors(self, rows: pd.Series, column: str, values: pd.Series, message: str) -> None:
+        if rows.empty:
+            return
+        self._errors.append(
+            pd.DataFrame(
+                {
+                    "row": rows.to_numpy(),
+                    "column": column,
+                    "value": values.to_numpy(),
+                    "error": message,
+                }
+            )
+        )
+
+    def observe(self, chunk: pd.DataFrame, first_row: int) -> None:
+        """Check one raw (pre-lookup) chunk. `first_row` is the 1-based data row of chunk[0]."""
+        rows = pd.Series(range(first_row, first_row + len(chunk)), index=chunk.index)
+        if not self._header_checked:
+            self._check_header(list(chunk.columns))
+
+        for column in REQUIRED_COLUMNS.get(self._operation, []):
+            if column not in chunk:
+                continue
+            _, present = BulkLookupMapper.normalized_keys(chunk[column])
+            self._add_errors(rows[~present], column, chunk[column][~present], "Required value is empty")
+
+        for column, kind in LOOKUP_COLUMNS.get(self._operation, {}).items():
+            if column not in chunk:
+                continue
+            keys, present = BulkLookupMapper.normalized_keys(chunk[column])
+            unknown = present & ~keys.isin(self._lookups[kind].keys())
+            label = "DeviceType" if kind == "types" else "DeviceGroup"
+            self._add_errors(rows[unknown], column, keys[unknown], f"Unknown {label}")
+
+        if self._operation == "update" and "sDeviceGroup" in chunk:
+            keys, present = BulkLookupMapper.normalized_keys(chunk["sDeviceGroup"])
+            unknown = present & ~keys.isin(self._lookups["groups"].keys())
+            self._add_errors(rows[unknown], "sDeviceGroup", keys[unknown], "Unknown DeviceGroup")
+
+        for column in ADDRESS_COLUMNS.get(self._operation, []):
+            if column not in chunk:
+                continue
+            keys, present = BulkLookupMapper.normalized_keys(chunk[column])
+            bad = malformed_address_mask(keys, present)
+            self._add_errors(rows[bad], column, keys[bad], "Malformed IP address")
+
+        keep = [c for c in self._key_columns() if c in chunk]
+        keys_frame = pd.DataFrame({"row": rows})
+        for column in keep:
+            normalized, present = BulkLookupMapper.normalized_keys(chunk[column])
+            keys_frame[column] = normalized.where(present, None)
+        self._keys.append(keys_frame)
+
+    def _check_duplicates(self, keys: pd.DataFrame) -> None:
+        for column in UNIQUE_COLUMNS.get(self._operation, []):
+            if column not in keys:
+                continue
+            values = keys[column]
+            dup = values.notna() & values.duplicated(keep=False)
+            self._add_errors(keys["row"][dup], column, values[dup], "Duplicate value within file")
+
+        if self._operation in ("update", "delete"):
+            target_cols = [c for c in ("sDisplayName", "sDeviceGroup", "sNetworkAddress") if c in keys]
+            if target_cols:
+                dup = keys[target_cols].notna().any(axis=1) & keys.duplicated(subset=target_cols, keep=False)
+                self._add_errors(keys["row"][dup], "+".join(target_cols), keys[target_cols[0]][dup], "Same device listed more than once")
+
+    def _check_inventory(self, keys: pd.DataFrame) -> None:
+        inventory = pd.DataFrame(
+            self._inventory_loader(),
+            columns=["sDisplayName", "sNetworkAddress", "sGroupName"],
+            dtype=object,
+        )
+        for column in inventory.columns:
+            inventory[column] = inventory[column].astype(str).str.strip()
+
+        if self._operation == "add":
+            for column, existing in (("DisplayName", "sDisplayName"), ("NetworkAddress", "sNetworkAddress")):
+                if column not in keys:
+                    continue
+                hit = keys[column].notna() & keys[column].isin(inventory[existing])
+                self._add_errors(keys["row"][hit], column, keys[column][hit], "Already exists in WUG inventory")
+            return
+
+        if self._operation == "update":
+            target_cols = ["sDisplayName", "sDeviceGroup", "sNetworkAddress"]
+            if not all(c in keys for c in target_cols):
+                return
+            existing = inventory.rename(columns={"sGroupName": "sDeviceGroup"})
+            merged = keys.merge(existing.drop_duplicates(), on=target_cols, how="left", indicator=True)
+            missing = (merged["_merge"] == "left_only") & keys[target_cols].notna().all(axis=1).to_numpy()
+            self._add_errors(
+                merged["row"][missing],
+                "sDisplayName",
+                merged["sDisplayName"][missing],
+                "Device not found by sDisplayName, sDeviceGroup, and sNetworkAddress",
+            )
+            return
+
+        if self._operation == "delete":
+            # Each row is matched on the keys it fills in: both, name only or address only.
+            key_cols = [c for c in ("sDisplayName", "sNetworkAddress") if c in keys]
+            if not key_cols:
+                return
+            filled = keys[key_cols].notna()
+            for match_cols in ([key_cols] + [[c] for c in key_cols] if len(key_cols) > 1 else [key_cols]):
+                others = [c for c in key_cols if c not in match_cols]
+                selected = filled[match_cols].all(axis=1) & ~filled[others].any(axis=1)
+                if not selected.any():
+                    continue
+                rows = keys[selected][["row"] + match_cols]
+                merged = rows.merge(inventory[match_cols].drop_duplicates(), on=match_cols, how="left", indicator=True)
+                missing = merged["_merge"] == "left_only"
+                self._add_errors(merged["row"][missing], match_cols[0], merged[match_cols[0]][missing], "Not found")
+
+    def finish(self) -> list[dict]:
+        """Run the whole-file checks and return the per-row error table sorted by row."""
+        if self._keys:
+            keys = pd.concat(self._keys, ignore_index=True)
+            self._check_duplicates(keys)
+            if not keys.empty:
+                self._check_inventory(keys)
+
+        if not self._errors:
+            return []
+        table = pd.concat(self._errors, ignore_index=True)[PREFLIGHT_ERROR_COLUMNS]
+        table["value"] = table["value"].where(table["value"].notna(), "")
+        table = table.sort_values(["row", "column"], kind="stable")
+        return table.to_dict(orient="records")
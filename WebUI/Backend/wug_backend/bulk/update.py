@@ -2,11 +2,18 @@ from __future__ import annotations
 
 import csv
 import sys
-import traceback
 
 import pyodbc
 
 from constants import get_connection_string
+from wug_backend.bulk.checkpoint import checkpoint_from_args
+from wug_backend.bulk.engine import (
+    BulkRowEngine,
+    BulkRunOptions,
+    RowOutcome,
+    options_from_args,
+    parse_bulk_cli_args,
+)
 
 
 class BulkUpdateUseCase:
@@ -138,12 +145,7 @@ class BulkUpdateUseCase:
         if not device_id:
             return False, "Device not found by sDisplayName, sDeviceGroup, and sNetworkAddress"
 
-        new_disp = row_dict.get("NewDisplayName")
-        new_net_addr = row_dict.get("NewNetworkAddress")
-        net_name = row_dict.get("NewNetworkName")
-        note = row_dict.get("NewNotes")
-        dev_type = self._safe_int(row_dict.get("NewDeviceType"))
-        new_group = self._safe_int(row_dict.get("NewDeviceGroup"))
+        new_disp, new_net_addr, net_name, note, dev_type, new_group = self._requested_values(row_dict)
 
         dev_count = self._update_device(cursor, device_id, new_disp, note, dev_type)
         ni_count = self._upsert_network_interface(cursor, device_id, new_net_addr, net_name)
@@ -156,42 +158,216 @@ class BulkUpdateUseCase:
         }
         return True, info
 
-    def execute_from_csv_path(self, csv_path: str) -> int:
+    def _requested_values(self, row_dict):
+        # Blank cells mean "leave as is"; DictReader hands them over as "" rather than None.
+        return (
+            self._safe_str(row_dict.get("NewDisplayName")),
+            self._safe_str(row_dict.get("NewNetworkAddress")),
+            self._safe_str(row_dict.get("NewNetworkName")),
+            self._safe_str(row_dict.get("NewNotes")),
+            self._safe_int(row_dict.get("NewDeviceType")),
+            self._safe_int(row_dict.get("NewDeviceGroup")),
+        )
+
+    # ---------- diff mode ----------
+    def _match_str(self, v):
+        # Compared the way write mode's WHERE ... = ? compares under SQL Server's default
+        # collation: case-insensitive, surrounding whitespace ignored.
+        v = self._safe_str(v)
+        return v.casefold() if v is not None else None
+
+    def _row_key(self, row_dict):
+        return (
+            self._match_str(row_dict.get("sDisplayName")),
+            self._match_str(row_dict.get("sDeviceGroup")),
+            self._match_str(row_dict.get("sNetworkAddress")),
+        )
+
+    def _fetch_current_rows(self, cursor, match_column: str, values, chunk_size: int = 500):
+        """
+        Current values for every device/interface whose `match_column` is in
+        `values`, one query per `chunk_size` values instead of one lookup per row.
+        `match_column` is one of the fixed column names below, never user input.
+        """
+        if match_column not in ("Device.sDisplayName", "NetworkInterface.sNetworkAddress"):
+            raise ValueError(f"Unsupported match column: {match_column}")
+        values = sorted(values)
+        for start in range(0, len(values), chunk_size):
+            chunk = values[start:start + chunk_size]
+            placeholders = ", ".join("?" for _ in chunk)
+            cursor.execute(
+                f"""
+        SELECT Device.nDeviceID, Device.sDisplayName, DeviceGroup.sGroupName,
+               NetworkInterface.sNetworkAddress, NetworkInterface.sNetworkName,
+               Device.sNote, Device.nDeviceTypeID, PivotDeviceToGroup.nDeviceGroupID
+        FROM Device
+        JOIN PivotDeviceToGroup
+            ON Device.nDeviceID = PivotDeviceToGroup.nDeviceID
+        JOIN DeviceGroup
+            ON DeviceGroup.nDeviceGroupID = PivotDeviceToGroup.nDeviceGroupID
+        JOIN NetworkInterface
+            ON Device.nDeviceID = NetworkInterface.nDeviceID
+        WHERE {match_column} IN ({placeholders});
+    """,
+                chunk,
+            )
+            for r in cursor.fetchall():
+                yield {
+                    "nDeviceID": r[0],
+                    "sDisplayName": r[1],
+                    "sGroupName": r[2],
+                    "sNetworkAddress": r[3],
+                    "sNetworkName": r[4],
+                    "sNote": r[5],
+                    "nDeviceTypeID": r[6],
+                    "nDeviceGroupID": r[7],
+                }
+
+    def _fetch_current_state(self, cursor, display_names, chunk_size: int = 500):
+        """Current values keyed like _row_key by (sDisplayName, sGroupName, sNetworkAddress) for the sheet's display names."""
+        state = {}
+        for current in self._fetch_current_rows(cursor, "Device.sDisplayName", display_names, chunk_size):
+            key = (
+                self._match_str(current["sDisplayName"]),
+                self._match_str(current["sGroupName"]),
+                self._match_str(current["sNetworkAddress"]),
+            )
+            state.setdefault(key, current)
+        return state
+
+    def _plan_changes(self, current, row_dict):
+        """{column: (current, requested)} for the requested values that differ from the DB."""
+        new_disp, new_net_addr, net_name, note, dev_type, new_group = self._requested_values(row_dict)
+        requested = {
+            "sDisplayName": (new_disp, self._safe_str(current["sDisplayName"])),
+            "sNote": (note, self._safe_str(current["sNote"])),
+            "nDeviceTypeID": (dev_type, self._safe_int(current["nDeviceTypeID"])),
+            "sNetworkAddress": (new_net_addr, self._safe_str(current["sNetworkAddress"])),
+            "sNetworkName": (net_name, self._safe_str(current["sNetworkName"])),
+            "nDeviceGroupID": (new_group, self._safe_int(current["nDeviceGroupID"])),
+        }
+        return {col: (old, new) for col, (new, old) in requested.items() if new is not None and new != old}
+
+    def _process_row_diff(self, cursor, row_dict, state):
+        current = state.get(self._row_key(row_dict))
+        if current is None:
+            return False, "Device not found by sDisplayName, sDeviceGroup, and sNetworkAddress"
+        return True, self._apply_changes(cursor, current, row_dict)
+
+    def _apply_changes(self, cursor, current, row_dict):
+        """Write only the requested values that differ from `current` (one `_fetch_current_rows` entry)."""
+        changes = self._plan_changes(current, row_dict)
+        device_id = current["nDeviceID"]
+        new_value = {col: new for col, (_, new) in changes.items()}
+
+        dev_count = self._update_device(
+            cursor,
+            device_id,
+            new_value.get("sDisplayName"),
+            new_value.get("sNote"),
+            new_value.get("nDeviceTypeID"),
+        )
+        ni_count = self._upsert_network_interface(
+            cursor,
+            device_id,
+            new_value.get("sNetworkAddress"),
+            new_value.get("sNetworkName"),
+        )
+        grp_count = self._update_device_group(cursor, device_id, new_value.get("nDeviceGroupID"))
+
+        return {
+            "device_updated": dev_count,
+            "network_if_updated_or_inserted": ni_count,
+            "group_updated_or_inserted": grp_count,
+            "changed_columns": sorted(changes),
+        }
+
+    def _load_state_for_csv(self, csv_path: str):
+        with open(csv_path, newline="", encoding="utf-8-sig") as f:
+            names = {self._safe_str(row.get("sDisplayName")) for row in csv.DictReader(f)}
+        names.discard(None)
+        conn = self._connect()
+        try:
+            return self._fetch_current_state(conn.cursor(), names)
+        finally:
+            conn.close()
+
+    def _dry_run(self, csv_path: str, state) -> int:
+        planned = unchanged = missing = 0
+        with open(csv_path, newline="", encoding="utf-8-sig") as f:
+            for i, row in enumerate(csv.DictReader(f), start=1):
+                label = self.row_label(row)
+                current = state.get(self._row_key(row))
+                if current is None:
+                    missing += 1
+                    print(f"WARNING: Row {i} ({label}): device not found by sDisplayName, sDeviceGroup, and sNetworkAddress", file=sys.stderr, flush=True)
+                    continue
+                changes = self._plan_changes(current, row)
+                if not changes:
+                    unchanged += 1
+                    print(f"PLAN: Row {i} ({label}) device {current['nDeviceID']}: no changes", flush=True)
+                    continue
+                planned += 1
+                detail = "; ".join(f"{col}: {old!r} -> {new!r}" for col, (old, new) in sorted(changes.items()))
+                print(f"PLAN: Row {i} ({label}) device {current['nDeviceID']}: {detail}", flush=True)
+
+        print("Dry run - nothing was written.", flush=True)
+        print(f"Rows with changes: {planned}; Unchanged: {unchanged}; Not found: {missing}", flush=True)
+        return 0
+
+    def row_label(self, row) -> str:
+        return row.get("sDisplayName") or ""
+
+    def shard_key(self, row) -> str:
+        # Rows only ever match on sDisplayName (with group and address), so it alone picks the shard.
+        return row.get("sDisplayName") or ""
+
+    def _report(self, outcome: RowOutcome) -> None:
+        print(f"Processing row {outcome.index}: {outcome.label}", flush=True)
+        if outcome.trace:
+            print("ERROR: Error traceback:", file=sys.stderr)
+            print(outcome.trace, file=sys.stderr, flush=True)
+
+    def execute_from_csv_path(self, csv_path: str, options: BulkRunOptions | None = None, checkpoint=None) -> int:
         def debug(msg):
             print(msg, flush=True)
 
-        conn = self._connect()
-        cur = conn.cursor()
-        successes = 0
-        failures = []
+        options = (options or BulkRunOptions()).normalized()
+        process_row = self._process_row
+        if options.diff:
+            state = self._load_state_for_csv(csv_path)
+            debug(f"Diff mode: loaded current values for {len(state)} device/interface key(s)")
+            if options.dry_run:
+                return self._dry_run(csv_path, state)
+            process_row = lambda cursor, row: self._process_row_diff(cursor, row, state)  # noqa: E731
 
         with open(csv_path, newline="", encoding="utf-8-sig") as f:
             reader = csv.DictReader(f)
             headers = reader.fieldnames
             debug(f"CSV headers: {headers}")
 
-            for i, row in enumerate(reader, start=1):
-                debug(f"Processing row {i}: {row.get('sDisplayName', '')}")
-
-                try:
-                    ok, info = self._process_row(cur, row)
-                    if ok:
-                        conn.commit()
-                        successes += 1
-                    else:
-                        conn.rollback()
-                        failures.append((i, row.get("sDisplayName"), info))
-                except Exception as e:
-                    conn.rollback()
-                    failures.append((i, row.get("sDisplayName"), str(e)))
-                    print("ERROR: Error traceback:", file=sys.stderr)
-                    print(traceback.format_exc(), file=sys.stderr, flush=True)
-
-        cur.close()
-        conn.close()
+            engine = BulkRowEngine(
+                connect=self._connect,
+                process_row=process_row,
+                row_label=self.row_label,
+                shard_key=self.shard_key,
+                report=self._report,
+                options=options,
+                checkpoint=checkpoint,
+            )
+            outcomes = engine.run(reader)
+
+        successes = sum(1 for o in outcomes if o.ok and not o.skipped)
+        failures = [(o.index, o.label, o.message) for o in outcomes if not o.ok]
+        resumed = sum(1 for o in outcomes if o.ok and o.skipped)
 
         print("Done.", flush=True)
         print(f"Successes: {successes}; Failures: {len(failures)}", flush=True)
+        if resumed:
+            print(f"Already committed in a previous run: {resumed}", flush=True)
+        if options.diff:
+            skipped = sum(1 for o in outcomes if o.ok and not o.skipped and not o.info.get("changed_columns"))
+            print(f"Unchanged rows skipped: {skipped}", flush=True)
         if failures:
             print("Failures detail:", file=sys.stderr)
             for f in failures:
@@ -201,7 +377,7 @@ class BulkUpdateUseCase:
 
 
 def run_bulk_update_cli(argv: list[str]) -> int:
-    csv_path = argv[1]
+    args = parse_bulk_cli_args(argv)
+    options = options_from_args(args)
     uc = BulkUpdateUseCase(connection_string=get_connection_string())
-    return uc.execute_from_csv_path(csv_path)
-
+    return uc.execute_from_csv_path(args.csv_path, options, checkpoint_from_args(args, "update", options))
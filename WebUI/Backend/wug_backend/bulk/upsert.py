@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import csv
+import sys
+
+import pyodbc
+
+from constants import get_connection_string
+from wug_backend.bulk.add import BulkAddUseCase
+from wug_backend.bulk.checkpoint import checkpoint_from_args
+from wug_backend.bulk.engine import (
+    BulkRowEngine,
+    BulkRunOptions,
+    RowOutcome,
+    options_from_args,
+    parse_bulk_cli_args,
+)
+from wug_backend.bulk.update import BulkUpdateUseCase
+
+
+class BulkUpsertUseCase:
+    """
+    Add-or-update from one sheet in the add layout. Existing devices are
+    resolved up front in a few IN-list queries (by DisplayName, then by
+    NetworkAddress); matched rows get an update of only the columns that
+    differ, the rest are inserted through the add path, all in one run.
+    """
+
+    def __init__(self, connection_string: str) -> None:
+        self._connection_string = connection_string
+        self._add = BulkAddUseCase(connection_string)
+        self._update = BulkUpdateUseCase(connection_string)
+
+    def _connect(self):
+        conn = pyodbc.connect(self._connection_string, autocommit=False)
+        conn.autocommit = False
+        return conn
+
+    def _name(self, row):
+        return self._update._safe_str(self._add.clean_name(row.get("DisplayName")))
+
+    def _address(self, row):
+        return self._update._safe_str(row.get("NetworkAddress"))
+
+    def row_label(self, row) -> str:
+        return row.get("DisplayName") or ""
+
+    def shard_key(self, row, by_name, by_address) -> str:
+        # The device the row resolves to, so two rows for one device (e.g. matched once by name and
+        # once by address) share a shard; a new device by its address, or its name without one.
+        current, _, _ = self._match(row, by_name, by_address)
+        if current is not None:
+            return f"device:{current['nDeviceID']}"
+        address = self._address(row)
+        return f"address:{address}" if address else f"name:{self._name(row) or ''}"
+
+    # ---------- resolve ----------
+    def _load_existing(self, csv_path: str):
+        names, addresses = set(), set()
+        with open(csv_path, newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                names.add(self._name(row))
+                addresses.add(self._address(row))
+        names.discard(None)
+        addresses.discard(None)
+
+        by_name: dict[str, dict] = {}
+        by_address: dict[str, dict] = {}
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            for index, column, values in (
+                (by_name, "Device.sDisplayName", names),
+                (by_address, "NetworkInterface.sNetworkAddress", addresses),
+            ):
+                key_of = "sDisplayName" if index is by_name else "sNetworkAddress"
+                for current in self._update._fetch_current_rows(cursor, column, values):
+                    index.setdefault(self._update._safe_str(current[key_of]), {}).setdefault(current["nDeviceID"], current)
+        finally:
+            conn.close()
+        return by_name, by_address
+
+    def _match(self, row, by_name, by_address):
+        """(current, matched_by, error) for a row; current is None when the device is new."""
+        for key, index, label in ((self._name(row), by_name, "DisplayName"), (self._address(row), by_address, "NetworkAddress")):
+            devices = index.get(key) if key else None
+            if not devices:
+                continue
+            if len(devices) > 1:
+                return None, label, f"{label} {key!r} matches {len(devices)} devices in WUG"
+            return next(iter(devices.values())), label, None
+        return None, None, None
+
+    def _as_update_row(self, row):
+        # Upsert sheets use the add layout; blank cells still mean "leave as is" on existing devices.
+        return {
+            "NewDisplayName": self._name(row),
+            "NewNetworkAddress": row.get("NetworkAddress"),
+            "NewNetworkName": row.get("NetworkName"),
+            "NewNotes": row.get("Notes"),
+            "NewDeviceType": row.get("DeviceType"),
+            "NewDeviceGroup": row.get("DeviceGroup"),
+        }
+
+    # ---------- run ----------
+    def _process_row(self, cursor, row, by_name, by_address):
+        current, matched_by, error = self._match(row, by_name, by_address)
+        if error:
+            return False, error
+        if current is None:
+            self._add._process_row(cursor, row)
+            return True, {"action": "inserted"}
+
+        info = self._update._apply_changes(cursor, current, self._as_update_row(row))
+        info["action"] = "updated" if info["changed_columns"] else "unchanged"
+        info["device_id"] = current["nDeviceID"]
+        info["matched_by"] = matched_by
+        return True, info
+
+    def _report(self, outcome: RowOutcome) -> None:
+        if not outcome.ok:
+            print(f"WARNING: Failed row {outcome.index} ({outcome.label}): {outcome.message}", file=sys.stderr, flush=True)
+            if outcome.trace:
+                print(outcome.trace, file=sys.stderr, flush=True)
+            return
+        action = outcome.info["action"]
+        if action == "inserted":
+            print(f"SUCCESS: Inserted row {outcome.index} - {outcome.label}", flush=True)
+        elif action == "updated":
+            changed = ", ".join(outcome.info["changed_columns"])
+            print(f"SUCCESS: Updated row {outcome.index} - {outcome.label} (device {outcome.info['device_id']}: {changed})", flush=True)
+        else:
+            print(f"Unchanged row {outcome.index} - {outcome.label} (device {outcome.info['device_id']})", flush=True)
+
+    def _dry_run(self, csv_path: str, by_name, by_address) -> int:
+        counts = {"add": 0, "update": 0, "unchanged": 0, "error": 0}
+        with open(csv_path, newline="", encoding="utf-8-sig") as f:
+            for i, row in enumerate(csv.DictReader(f), start=1):
+                label = self.row_label(row)
+                current, matched_by, error = self._match(row, by_name, by_address)
+                if error:
+                    counts["error"] += 1
+                    print(f"WARNING: Row {i} ({label}): {error}", file=sys.stderr, flush=True)
+                elif current is None:
+                    counts["add"] += 1
+                    print(f"PLAN: Row {i} ({label}): add new device", flush=True)
+                else:
+                    changes = self._update._plan_changes(current, self._as_update_row(row))
+                    if not changes:
+                        counts["unchanged"] += 1
+                        print(f"PLAN: Row {i} ({label}) device {current['nDeviceID']}: no changes", flush=True)
+                        continue
+                    counts["update"] += 1
+                    detail = "; ".join(f"{col}: {old!r} -> {new!r}" for col, (old, new) in sorted(changes.items()))
+                    print(f"PLAN: Row {i} ({label}) device {current['nDeviceID']} (matched by {matched_by}): {detail}", flush=True)
+
+        print("Dry run - nothing was written.", flush=True)
+        print(
+            f"To add: {counts['add']}; To update: {counts['update']}; Unchanged: {counts['unchanged']}; Errors: {counts['error']}",
+            flush=True,
+        )
+        return 0
+
+    def execute_from_csv_path(self, csv_path: str, options: BulkRunOptions | None = None, checkpoint=None) -> int:
+        options = (options or BulkRunOptions()).normalized()
+        with open(csv_path, newline="", encoding="utf-8-sig") as f:
+            if next(csv.DictReader(f), None) is None:
+                print(f"ERROR: CSV empty or headers mismatch: {csv_path}", file=sys.stderr)
+                if checkpoint is not None:
+                    checkpoint.close(False)
+                return 1
+
+        by_name, by_address = self._load_existing(csv_path)
+        print(f"Resolved {len(by_name)} existing device name(s) and {len(by_address)} address(es) in WUG", flush=True)
+        if options.dry_run:
+            return self._dry_run(csv_path, by_name, by_address)
+
+        with open(csv_path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            engine = BulkRowEngine(
+                connect=self._connect,
+                process_row=lambda cursor, row: self._process_row(cursor, row, by_name, by_address),
+                row_label=self.row_label,
+                shard_key=lambda row: self.shard_key(row, by_name, by_address),
+                report=self._report,
+                options=options,
+                checkpoint=checkpoint,
+            )
+            outcomes = engine.run(reader)
+
+        done = [o for o in outcomes if o.ok and not o.skipped]
+        counts = {action: sum(1 for o in done if o.info["action"] == action) for action in ("inserted", "updated", "unchanged")}
+        failures = [(o.index, o.label, o.message) for o in outcomes if not o.ok]
+        resumed = sum(1 for o in outcomes if o.ok and o.skipped)
+
+        print("Done.", flush=True)
+        print(
+            f"Inserted: {counts['inserted']}; Updated: {counts['updated']}; "
+            f"Unchanged: {counts['unchanged']}; Failures: {len(failures)}",
+            flush=True,
+        )
+        if resumed:
+            print(f"Already committed in a previous run: {resumed}", flush=True)
+        if failures:
+            print("Failures:", file=sys.stderr)
+            for f in failures:
+                print(f, file=sys.stderr, flush=True)
+        return 0
+
+
+def run_bulk_upsert_cli(argv: list[str]) -> int:
+    args = parse_bulk_cli_args(argv)
+    options = options_from_args(args)
+    uc = BulkUpsertUseCase(connection_string=get_connection_string())
+    return uc.execute_from_csv_path(args.csv_path, options, checkpoint_from_args(args, "upsert", options))
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from constants import QUERY_DEVICE_GROUPS, QUERY_DEVICE_TYPES
+from constants import QUERY_DEVICE_GROUPS, QUERY_DEVICE_TYPES, QUERY_INVENTORY_KEYS
 
 
 class DeviceLookupRepository:
@@ -23,3 +23,11 @@ class DeviceLookupRepository:
         conn.close()
         return data
 
+    def load_inventory_keys(self):
+        """(display name, network address, group name) for every device; used by bulk preflight."""
+        conn = self._db_factory.get_conn()
+        cur = conn.cursor()
+        cur.execute(QUERY_INVENTORY_KEYS)
+        data = [(r.sDisplayName, r.sNetworkAddress, r.sGroupName) for r in cur.fetchall()]
+        conn.close()
+        return data
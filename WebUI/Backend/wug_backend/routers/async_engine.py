@@ -0,0 +1,422 @@
+from __future__ import annotations
+
+import asyncio
+import re
+import time
+from typing import Awaitable, Callable
+
+try:
+    import asyncssh
+except ImportError:  # optional: only needed when a run selects the asyncssh engine
+    asyncssh = None
+
+from constants import (
+    ROUTER_ASYNC_CONNECT_TIMEOUT,
+    ROUTER_ASYNC_MAX_CONCURRENCY,
+    ROUTER_ASYNC_SSH_PORT,
+    ROUTER_CONCURRENCY_DEFAULT,
+    ROUTER_DEVICE_TIMEOUT_DEFAULT,
+)
+from wug_backend.routers.fanout import DeviceContext, DeviceRunResult, RunControl
+from wug_backend.routers.governor import ConnectGovernor
+from wug_backend.routers.prompts import DEVICE_PROMPT_PATTERN, StepMatcher, answer_for
+from wug_backend.routers.simple import RouterTarget, SshCredentials, default_ssh_credentials
+from wug_backend.routers.task_plan import PlanStep, TaskPlan, compile_task_plan
+
+# Device types the async engine drives (IOS-style CLI: enable, configure terminal, end).
+_PAGING_OFF = {
+    "cisco_ios": "terminal length 0",
+    "cisco_xe": "terminal length 0",
+    "cisco_xr": "terminal length 0",
+    "cisco_nxos": "terminal length 0",
+    "cisco_asa": "terminal pager 0",
+    "arista_eos": "terminal length 0",
+}
+
+_PROMPT = re.compile(DEVICE_PROMPT_PATTERN)
+_PASSWORD_PROMPT = re.compile(r"[Pp]assword:\s*$")
+
+
+class PromptNotDetected(Exception):
+    """A device did not print the expected prompt or pattern within the read timeout."""
+
+
+class _DeviceTimedOut(Exception):
+    """The per-device timeout of AsyncDeviceFanout ran out (never raised by device I/O itself)."""
+
+
+class AsyncsshChannel:
+    """Interactive shell on an asyncssh connection, as read/write/close."""
+
+    def __init__(self, conn, process) -> None:
+        self._conn = conn
+        self._process = process
+
+    async def read(self, n: int = 65536) -> str:
+        return await self._process.stdout.read(n)
+
+    def write(self, data: str) -> None:
+        self._process.stdin.write(data)
+
+    async def close(self) -> None:
+        self._conn.close()
+        await self._conn.wait_closed()
+
+
+def asyncssh_connector(port: int = ROUTER_ASYNC_SSH_PORT, connect_timeout: float = ROUTER_ASYNC_CONNECT_TIMEOUT):
+    """
+    Default connector. Point `port` at a local asyncssh server to exercise
+    the engine without real routers; any coroutine with the same signature
+    can stand in for it.
+    """
+
+    async def _connect(host: str, username: str, password: str, device_type: str) -> AsyncsshChannel:
+        if asyncssh is None:
+            raise RuntimeError("The asyncssh engine needs the asyncssh package (pip install asyncssh)")
+        conn = await asyncio.wait_for(
+            asyncssh.connect(
+                host,
+                port=port,
+                username=username,
+                password=password,
+                known_hosts=None,
+                client_keys=None,
+                keepalive_interval=30,
+            ),
+            timeout=connect_timeout,
+        )
+        try:
+            process = await conn.create_process(term_type="vt100", term_size=(511, 24), encoding="utf-8", errors="replace")
+        except Exception:
+            conn.close()
+            raise
+        return AsyncsshChannel(conn, process)
+
+    return _connect
+
+
+class AsyncCliSession:
+    """
+    The subset of netmiko's BaseConnection the task model uses, over an
+    async channel: prompt detection, enable, paging off, exec, config sets
+    and timing-based reads for interactive prompts.
+    """
+
+    def __init__(self, channel, device_type: str, secret: str = "", read_timeout: float = 60.0) -> None:
+        if device_type not in _PAGING_OFF:
+            raise ValueError(f"Device type {device_type!r} is not supported by the asyncssh engine; use netmiko")
+        self._channel = channel
+        self._device_type = device_type
+        self._secret = secret
+        self._read_timeout = read_timeout
+        self.prompt = ""
+
+    async def _read_until(self, pattern: re.Pattern, timeout: float | None = None) -> str:
+        buf = ""
+        deadline = time.monotonic() + (timeout or self._read_timeout)
+        while not pattern.search(buf):
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                chunk = await asyncio.wait_for(self._channel.read(), timeout=remaining)
+            except asyncio.TimeoutError:
+                raise PromptNotDetected(f"Pattern not detected: {pattern.pattern!r} in output: {buf[-200:]!r}") from None
+            if not chunk:
+                raise ConnectionError("SSH channel closed")
+            buf += chunk.replace("\r\n", "\n").replace("\r", "\n")
+        return buf
+
+    async def _read_until_prompt(self, timeout: float | None = None) -> str:
+        out = await self._read_until(_PROMPT, timeout)
+        self.prompt = out.rstrip().rsplit("\n", 1)[-1].strip()
+        return out
+
+    async def _read_until_quiet(self, quiet: float = 2.0, max_time: float | None = None) -> str:
+        buf = ""
+        deadline = time.monotonic() + (max_time or self._read_timeout)
+        while time.monotonic() < deadline:
+            try:
+                chunk = await asyncio.wait_for(self._channel.read(), timeout=quiet)
+            except asyncio.TimeoutError:
+                break
+            if not chunk:
+                break
+            buf += chunk.replace("\r\n", "\n").replace("\r", "\n")
+        return buf
+
+    async def open(self) -> None:
+        await self._read_until_prompt()
+        await self.send_command(_PAGING_OFF[self._device_type])
+
+    async def enable(self) -> None:
+        if self.prompt.endswith("#"):
+            return
+        self._channel.write("enable\n")
+        out = await self._read_until(re.compile(_PASSWORD_PROMPT.pattern + "|" + _PROMPT.pattern))
+        if _PASSWORD_PROMPT.search(out):
+            self._channel.write(self._secret + "\n")
+            await self._read_until_prompt()
+        else:
+            self.prompt = out.rstrip().rsplit("\n", 1)[-1].strip()
+        if not self.prompt.endswith("#"):
+            raise PermissionError("Failed to enter enable mode")
+
+    def find_prompt(self) -> str:
+        return self.prompt
+
+    async def send_command(self, command: str, read_timeout: float | None = None) -> str:
+        self._channel.write(command + "\n")
+        out = await self._read_until_prompt(read_timeout)
+        lines = out.split("\n")
+        # Drop the echoed command and the trailing prompt, like netmiko's strip_command/strip_prompt.
+        if lines and command.strip() and command.strip() in lines[0]:
+            lines = lines[1:]
+        if lines and lines[-1].strip() == self.prompt:
+            lines = lines[:-1]
+        return "\n".join(lines).strip("\n")
+
+    def write_channel(self, data: str) -> None:
+        self._channel.write(data)
+
+    async def read_until_pattern(self, pattern: re.Pattern, read_timeout: float | None = None) -> str:
+        return await self._read_until(pattern, read_timeout)
+
+    async def send_command_timing(self, command: str, quiet: float = 2.0) -> str:
+        self._channel.write(command if command.endswith("\n") else command + "\n")
+        return await self._read_until_quiet(quiet)
+
+    async def send_config_set(self, commands: list[str]) -> str:
+        transcript = ""
+        for line in ["configure terminal", *commands, "end"]:
+            self._channel.write(line + "\n")
+            transcript += await self._read_until_prompt()
+        return transcript
+
+    async def close(self) -> None:
+        try:
+            await self._channel.close()
+        except Exception:
+            pass
+
+
+class AsyncTaskRunner:
+    """Async counterpart of SimpleConfigPusher / InteractiveCommandRunner over AsyncCliSession."""
+
+    def __init__(self, connector: Callable[..., Awaitable] | None = None, credentials: SshCredentials | None = None) -> None:
+        self._connector = connector or asyncssh_connector()
+        self._credentials = credentials or default_ssh_credentials()
+
+    async def _session(self, router: RouterTarget, device_type: str, ctx: DeviceContext) -> AsyncCliSession:
+        ctx.log(f"\n=== Connecting to {router.ip} ({device_type}) ===")
+        creds = self._credentials
+        with ctx.phase("connect"):
+            channel = await self._connector(router.ip, creds.username, creds.password, device_type)
+            session = AsyncCliSession(channel, device_type, secret=creds.secret or creds.password)
+            try:
+                await session.open()
+            except BaseException:
+                await session.close()
+                raise
+        try:
+            with ctx.phase("enable"):
+                await session.enable()
+        except BaseException:
+            await session.close()
+            raise
+        return session
+
+    async def _close(self, session: AsyncCliSession, ctx: DeviceContext) -> None:
+        with ctx.phase("disconnect"):
+            await session.close()
+
+    async def run_interactive_command(
+        self, session: AsyncCliSession, command, steps, context=None, max_rounds=10, matcher=None
+    ) -> str:
+        context = context or {}
+        matcher = matcher or StepMatcher.compile(steps)
+        if matcher is None:
+            return await self._run_interactive_timing(session, command, steps, context, max_rounds)
+
+        session.write_channel(command + "\n")
+        output = await session.read_until_pattern(matcher.regex)
+        full_output = output
+        for _ in range(max_rounds):
+            step = matcher.step_for(output)
+            if step is None:
+                break
+            session.write_channel(answer_for(step, context) + "\n")
+            output = await session.read_until_pattern(matcher.regex)
+            full_output += output
+        return full_output
+
+    async def _run_interactive_timing(self, session: AsyncCliSession, command, steps, context, max_rounds) -> str:
+        output = await session.send_command_timing(command)
+        full_output = output
+        for _ in range(max_rounds):
+            matched = False
+            for step in steps:
+                prompt = (step.get("prompt") or "").replace(r"\r\n", "").replace(r"\n", "").strip()
+                if prompt in output:
+                    output = await session.send_command_timing(answer_for(step, context) + "\n")
+                    full_output += output
+                    matched = True
+                    break
+            if not matched:
+                break
+        return full_output
+
+    async def push_config(self, router: RouterTarget, commands: list[str], device_type: str, ctx: DeviceContext) -> str:
+        session = await self._session(router, device_type, ctx)
+        try:
+            with ctx.phase("config"):
+                return await session.send_config_set(commands)
+        finally:
+            await self._close(session, ctx)
+
+    async def execute_tasks(
+        self,
+        router: RouterTarget,
+        tasks: TaskPlan | list,
+        device_type: str,
+        timestamp_global: str,
+        ctx: DeviceContext,
+    ) -> str:
+        plan = tasks if isinstance(tasks, TaskPlan) else compile_task_plan(tasks)
+        ip = router.ip
+        session = await self._session(router, device_type, ctx)
+        log_output = ""
+        try:
+            hostname = session.find_prompt().strip("#>").strip()
+            ctx.log(f"Connected to {hostname} ({ip})")
+            base_context = {"hostname": hostname, "ip": ip, "timestamp": timestamp_global}
+
+            for step in plan.steps:
+                log_output += f"\n=== {step.title('TASK', 'TASKS')} ===\n"
+                ctx.log(f"Running {step.title()} on {hostname}")
+
+                with ctx.phase(step.label):
+                    log_output += await self._run_step(session, step, base_context)
+            return log_output
+        finally:
+            await self._close(session, ctx)
+
+    async def _run_step(self, session: AsyncCliSession, step: PlanStep, base_context: dict) -> str:
+        if step.type == "config":
+            return await session.send_config_set(list(step.commands)) + "\n"
+        if step.type == "exec":
+            return await session.send_command(step.command, read_timeout=60) + "\n"
+        if step.type == "interactive_exec":
+            context = {**base_context, **step.context}
+            return await self.run_interactive_command(
+                session, step.command, list(step.steps), context, matcher=step.matcher
+            ) + "\n"
+        return await session.send_command("write memory", read_timeout=120) + "\n"
+
+
+class AsyncDeviceFanout:
+    """
+    DeviceFanout for the asyncssh engine: every device is a coroutine on one
+    event loop, gated by a single semaphore, so thousands of sessions cost
+    sockets rather than threads. Results are handed to `on_result` as each
+    device finishes or hits `device_timeout`; when `control` stops the run,
+    the remaining devices are cancelled and reported as timed out. A
+    `governor` permit is awaited before each device starts, as in DeviceFanout.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = ROUTER_CONCURRENCY_DEFAULT,
+        device_timeout: float = ROUTER_DEVICE_TIMEOUT_DEFAULT,
+    ) -> None:
+        self._concurrency = min(max(1, int(concurrency)), ROUTER_ASYNC_MAX_CONCURRENCY)
+        self._device_timeout = float(device_timeout or 0)
+
+    async def _within_timeout(self, coro):
+        """
+        Await a device's work within the device timeout. Only that deadline
+        raises _DeviceTimedOut; a TimeoutError from inside the work (connect,
+        a read) is the device's own error and propagates as it is.
+        """
+        if not self._device_timeout:
+            return await coro
+        task = asyncio.ensure_future(coro)
+        try:
+            done, _ = await asyncio.wait({task}, timeout=self._device_timeout)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        if not done:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+            raise _DeviceTimedOut()
+        return task.result()
+
+    async def _one(
+        self, semaphore, target: RouterTarget, device_type: str, work, control, governor
+    ) -> DeviceRunResult:
+        ctx = DeviceContext(target)
+        started = None
+        try:
+            async with semaphore:
+                permit = await governor.acquire_async(target) if governor is not None else None
+                if permit is not None:
+                    ctx.record("queue_wait", permit.waited)
+                started = time.monotonic()
+                try:
+                    output = await self._within_timeout(work(target, device_type, ctx))
+                    ok, error, error_class, timed_out = True, "", "", False
+                except _DeviceTimedOut:
+                    output, ok, timed_out = "", False, True
+                    error, error_class = f"timed out after {self._device_timeout:g}s", "TimeoutError"
+                except Exception as e:
+                    output, ok, error, error_class, timed_out = "", False, str(e), type(e).__name__, False
+                finally:
+                    if permit is not None:
+                        await governor.release_async(permit)
+        except asyncio.CancelledError:
+            # Only _watch cancels devices: the run was stopped by its RunControl.
+            output, ok, timed_out = "", False, True
+            error = control.reason if started is not None else f"not started: {control.reason}"
+            error_class = control.error_class
+        seconds = round(time.monotonic() - started, 3) if started is not None else 0.0
+        text = "\n".join(part for part in (ctx.text(), output or "") if part)
+        return DeviceRunResult(
+            target.ip, device_type, ok, text, error, timed_out, seconds, error_class=error_class, timings=ctx.timings()
+        )
+
+    @staticmethod
+    async def _watch(control: RunControl, pending: list) -> None:
+        while not all(t.done() for t in pending):
+            if control.stopped():
+                for t in pending:
+                    t.cancel()
+                return
+            await asyncio.sleep(0.2)
+
+    async def run(
+        self,
+        targets: list[RouterTarget],
+        work: Callable[[RouterTarget, str, DeviceContext], Awaitable[str]],
+        device_type_default: str,
+        on_result: Callable[[DeviceRunResult], None],
+        control: RunControl | None = None,
+        governor: ConnectGovernor | None = None,
+    ) -> list[DeviceRunResult]:
+        semaphore = asyncio.Semaphore(self._concurrency)
+        pending = []
+        for target in targets:
+            device_type = (target.device_type or device_type_default).strip() or device_type_default
+            pending.append(asyncio.ensure_future(self._one(semaphore, target, device_type, work, control, governor)))
+        watcher = asyncio.ensure_future(self._watch(control, pending)) if control is not None else None
+        results = []
+        for next_done in asyncio.as_completed(pending):
+            result = await next_done
+            on_result(result)
+            results.append(result)
+        if watcher is not None:
+            watcher.cancel()
+        return results
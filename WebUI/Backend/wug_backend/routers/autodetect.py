@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Callable
+
+from netmiko import SSHDetect
+
+from constants import ROUTER_AUTODETECT_CACHE_FILE, ROUTER_AUTODETECT_CACHE_TTL, ROUTER_AUTODETECT_CONCURRENCY
+from wug_backend.routers.governor import shared_governor
+from wug_backend.routers.simple import RouterTarget, SshCredentials
+
+# A routers-list type that always asks for detection, as in netmiko.
+AUTODETECT = "autodetect"
+
+
+class DeviceTypeCache:
+    """
+    host -> detected netmiko device_type in a small JSON file, valid for
+    `ttl` seconds. Written with an atomic replace so runner processes and
+    backups can share it.
+    """
+
+    def __init__(
+        self, path: Path | None = ROUTER_AUTODETECT_CACHE_FILE, ttl: float = ROUTER_AUTODETECT_CACHE_TTL
+    ) -> None:
+        self._path = Path(path) if path and ttl > 0 else None
+        self._ttl = ttl
+
+    def _entries(self) -> dict[str, dict]:
+        if self._path is None or not self._path.exists():
+            return {}
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        now = time.time()
+        return {
+            host: v
+            for host, v in entries.items()
+            if isinstance(v, dict) and v.get("device_type") and now - v.get("at", 0) <= self._ttl
+        }
+
+    def load(self) -> dict[str, str]:
+        return {host: v["device_type"] for host, v in self._entries().items()}
+
+    def get(self, host: str) -> str:
+        return self.load().get(host, "")
+
+    def save(self, detected: dict[str, str]) -> None:
+        if self._path is None or not detected:
+            return
+        now = time.time()
+        entries = self._entries()
+        entries.update((host, {"device_type": t, "at": now}) for host, t in detected.items())
+        tmp = self._path.with_name(f"{self._path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+            os.replace(tmp, self._path)
+        except OSError:
+            pass
+
+
+@dataclass(frozen=True)
+class DetectResult:
+    host: str
+    device_type: str
+    seconds: float
+    error: str = ""
+    cached: bool = False
+
+
+def ssh_detect(host: str, credentials: SshCredentials) -> str:
+    """netmiko's best guess for `host`, "" when nothing matched."""
+    guesser = SSHDetect(
+        device_type=AUTODETECT,
+        host=host,
+        username=credentials.username,
+        password=credentials.password,
+        secret=credentials.secret or credentials.password,
+    )
+    try:
+        return guesser.autodetect() or ""
+    finally:
+        try:
+            guesser.connection.disconnect()
+        except Exception:
+            pass
+
+
+class DeviceTypeDetector:
+    """
+    Fills in the device_type of routers listed without one (or as
+    "autodetect"): cached hosts are resolved from DeviceTypeCache, the rest
+    are probed concurrently with SSHDetect (behind the connect governor)
+    and the results cached, so detection runs once per host per TTL.
+    """
+
+    def __init__(
+        self,
+        credentials: SshCredentials,
+        cache: DeviceTypeCache | None = None,
+        concurrency: int = ROUTER_AUTODETECT_CONCURRENCY,
+        detect: Callable[[str, SshCredentials], str] = ssh_detect,
+        stop: Callable[[], bool] | None = None,
+    ) -> None:
+        self._credentials = credentials
+        self._cache = cache or DeviceTypeCache()
+        self._concurrency = max(1, int(concurrency))
+        self._detect = detect
+        # The run's stop condition, so a cancelled run does not keep waiting for governor permits.
+        self._stop = stop
+
+    @staticmethod
+    def needs_detection(target: RouterTarget) -> bool:
+        return target.device_type in ("", AUTODETECT)
+
+    def _probe(self, target: RouterTarget) -> DetectResult:
+        started = time.monotonic()
+        governor = shared_governor()
+        try:
+            if governor is None:
+                device_type = self._detect(target.ip, self._credentials)
+            else:
+                with governor.slot(target, stop=self._stop):
+                    device_type = self._detect(target.ip, self._credentials)
+            error = "" if device_type else "no device type matched"
+        except Exception as e:
+            device_type, error = "", str(e)
+        return DetectResult(target.ip, device_type, round(time.monotonic() - started, 3), error)
+
+    def detect(self, targets: list[RouterTarget]) -> dict[str, DetectResult]:
+        """host -> DetectResult for every distinct host; only uncached hosts are probed."""
+        cached = self._cache.load()
+        by_host: dict[str, RouterTarget] = {}
+        for t in targets:
+            by_host.setdefault(t.ip, t)
+        results = {host: DetectResult(host, cached[host], 0.0, cached=True) for host in by_host if host in cached}
+        to_probe = [t for host, t in by_host.items() if host not in results]
+        if to_probe:
+            with ThreadPoolExecutor(max_workers=min(self._concurrency, len(to_probe))) as pool:
+                fresh = list(pool.map(self._probe, to_probe))
+            results.update((r.host, r) for r in fresh)
+            self._cache.save({r.host: r.device_type for r in fresh if r.device_type})
+        return results
+
+    def resolve(self, targets: list[RouterTarget]) -> tuple[list[RouterTarget], dict[str, DetectResult]]:
+        """
+        Targets with detected types filled in and the per-host outcomes. A
+        host that could not be detected gets "" and so the run's default type.
+        """
+        results = self.detect([t for t in targets if self.needs_detection(t)])
+        resolved = [replace(t, device_type=results[t.ip].device_type) if self.needs_detection(t) else t for t in targets]
+        return resolved, results
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from constants import (
+    ROUTER_EXEC_CACHE_DIR,
+    ROUTER_EXEC_CACHE_MAX_AGE,
+    ROUTER_EXEC_CACHE_NEVER,
+    ROUTER_EXEC_CACHE_READ_ONLY,
+)
+from wug_backend.routers.fanout import DeviceRunResult
+from wug_backend.routers.simple import SshCredentials
+from wug_backend.routers.task_plan import PlanStep, TaskPlan
+
+# Output filters that write somewhere, which make even a show command a change.
+_WRITING_FILTERS = ("redirect", "tee", "append")
+
+
+def is_read_only(command: str, verbs: str = ROUTER_EXEC_CACHE_READ_ONLY) -> bool:
+    """True for e.g. "show ip bgp summary"; False for anything else or a show piped into redirect/tee/append."""
+    words = command.lower().split()
+    if not words or words[0] not in {v.strip().lower() for v in verbs.split(",") if v.strip()}:
+        return False
+    filters = [part.split()[0] for part in command.lower().split("|")[1:] if part.split()]
+    return not any(f.startswith(_WRITING_FILTERS) for f in filters)
+
+
+def is_never_cached(command: str, never: str = ROUTER_EXEC_CACHE_NEVER) -> bool:
+    """True for e.g. "show running-config", "sh run" or "sh tech": outputs that may hold secrets."""
+    words = command.lower().split()
+    if len(words) < 2:
+        return False
+    subject = words[1]
+    return any(
+        name.startswith(subject) if len(subject) >= 2 else name == subject
+        for name in (n.strip().lower() for n in never.split(","))
+        if name
+    )
+
+
+def cacheable(plan: TaskPlan) -> bool:
+    """A plan can be served from the cache only if every step is a read-only exec command that may be kept."""
+    return bool(plan.steps) and all(
+        s.type == "exec" and is_read_only(s.command) and not is_never_cached(s.command) for s in plan.steps
+    )
+
+
+def credential_key(credentials: SshCredentials) -> str:
+    """Who a cached output was captured as: a digest of the SSH username, so the name is not stored."""
+    return hashlib.sha256(credentials.username.encode("utf-8")).hexdigest()[:16]
+
+
+def _header(step: PlanStep) -> str:
+    # As written by execute_tasks (netmiko and asyncssh engines) before each step's output.
+    return f"\n=== {step.title('TASK', 'TASKS')} ===\n"
+
+
+def step_outputs(plan: TaskPlan, device_output: str) -> list[str] | None:
+    """Each step's own output out of a device's run output, None if a step header is missing."""
+    positions = []
+    start = 0
+    for step in plan.steps:
+        at = device_output.find(_header(step), start)
+        if at < 0:
+            return None
+        positions.append((at, at + len(_header(step))))
+        start = positions[-1][1]
+    ends = [at for at, _ in positions[1:]] + [len(device_output)]
+    return [device_output[body:end] for (_, body), end in zip(positions, ends)]
+
+
+@dataclass(frozen=True)
+class CachedOutput:
+    output: str
+    captured_at: float
+
+
+class ExecResultCache:
+    """
+    Output of read-only exec commands per (host, credential, command), one
+    small JSON file each under `directory`, written with an atomic replace
+    so runner processes, workers and the API share it. `credential` (see
+    credential_key) scopes entries to the account that captured them, so a
+    run never sees output its own credentials could not have produced.
+    Files and directory are created owner-only. Entries older than
+    `max_age` (capped at the configured maximum) are misses; prune()
+    removes the ones no caller may ask for any more.
+    """
+
+    def __init__(
+        self,
+        credential: str,
+        directory: Path = ROUTER_EXEC_CACHE_DIR,
+        max_age_cap: float = ROUTER_EXEC_CACHE_MAX_AGE,
+    ) -> None:
+        self._credential = credential
+        self._dir = Path(directory)
+        self._cap = max(0.0, float(max_age_cap))
+
+    def _path(self, host: str, command: str) -> Path:
+        key = hashlib.sha256(f"{host}\n{self._credential}\n{command}".encode("utf-8")).hexdigest()[:32]
+        return self._dir / f"{key}.json"
+
+    def get(self, host: str, command: str, max_age: float) -> CachedOutput | None:
+        max_age = min(max_age, self._cap)
+        if max_age <= 0:
+            return None
+        try:
+            with open(self._path(host, command), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (entry.get("host"), entry.get("credential"), entry.get("command")) != (host, self._credential, command):
+            return None
+        if time.time() - entry.get("captured_at", 0) > max_age:
+            return None
+        return CachedOutput(entry.get("output", ""), entry["captured_at"])
+
+    def put(self, host: str, command: str, output: str, captured_at: float | None = None) -> None:
+        if not self._cap or is_never_cached(command):
+            return
+        path = self._path(host, command)
+        entry = {
+            "host": host,
+            "credential": self._credential,
+            "command": command,
+            "output": output,
+            "captured_at": captured_at or time.time(),
+        }
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            self._dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+            with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def prune(self) -> int:
+        """Remove entries older than the cap; returns how many were removed."""
+        if not self._dir.exists():
+            return 0
+        removed = 0
+        cutoff = time.time() - self._cap
+        for path in self._dir.glob("*.json"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    # ---------- whole devices ----------
+    def serve(self, plan: TaskPlan, host: str, device_type: str, max_age: float) -> DeviceRunResult | None:
+        """A device result built from the cache if every step of `plan` is cached for `host`, else None."""
+        hits = []
+        for step in plan.steps:
+            hit = self.get(host, step.command, max_age)
+            if hit is None:
+                return None
+            hits.append(hit)
+        captured_at = datetime.fromtimestamp(min(h.captured_at for h in hits)).isoformat(timespec="seconds")
+        output = f"Served from cache (captured {captured_at})" + "".join(
+            _header(step) + hit.output for step, hit in zip(plan.steps, hits)
+        )
+        return DeviceRunResult(ip=host, device_type=device_type, ok=True, output=output, cached_at=captured_at)
+
+    def store(self, plan: TaskPlan, result: DeviceRunResult) -> None:
+        """Keep each step's output of a successful live run."""
+        if not result.ok or result.cached_at:
+            return
+        outputs = step_outputs(plan, result.output)
+        if outputs is None:
+            return
+        captured_at = time.time() - result.seconds
+        for step, output in zip(plan.steps, outputs):
+            self.put(result.ip, step.command, output, captured_at)
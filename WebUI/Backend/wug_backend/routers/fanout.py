@@ -0,0 +1,408 @@
+from __future__ import annotations
+
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Iterator
+
+from constants import (
+    ENV_WUG_DEVICE_TIMEOUT,
+    ENV_WUG_EXEC_CACHE_MAX_AGE,
+    ENV_WUG_EXEC_CACHE_REFRESH,
+    ENV_WUG_ROUTER_AUTODETECT,
+    ENV_WUG_ROUTER_CONCURRENCY,
+    ENV_WUG_ROUTER_EVENTS,
+    ENV_WUG_ROUTER_CANCEL_FILE,
+    ENV_WUG_ROUTER_PREFLIGHT,
+    ENV_WUG_RUN_BUDGET,
+    ENV_WUG_SSH_ENGINE,
+    ROUTER_ASYNC_MAX_CONCURRENCY,
+    ROUTER_AUTODETECT_ENABLED,
+    ROUTER_CONCURRENCY_DEFAULT,
+    ROUTER_DEVICE_TIMEOUT_DEFAULT,
+    ROUTER_MAX_CONCURRENCY,
+    ROUTER_PREFLIGHT_ENABLED,
+    ROUTER_RUN_BUDGET_DEFAULT,
+    ROUTER_SSH_ENGINES,
+)
+from wug_backend.routers.governor import ConnectGovernor
+from wug_backend.routers.simple import RouterTarget
+
+# Streaming runs: one line per finished device, picked out of stdout by RouterRunManager.
+DEVICE_EVENT_PREFIX = "@@device "
+
+DEVICE_STATUS_OK = "ok"
+DEVICE_STATUS_FAILED = "failed"
+DEVICE_STATUS_TIMED_OUT = "timed_out"
+DEVICE_STATUS_UNREACHABLE = "unreachable"
+
+
+@dataclass
+class DeviceRunResult:
+    """
+    One router's outcome. `timings` holds seconds per phase: queue_wait
+    (governor), connect, enable, task_1..task_N (or, for a push, config
+    after an SCP transfer of large files) and disconnect; phases a device
+    never reached are absent. `error_class` is the exception type name
+    (e.g. NetmikoAuthenticationException), "" on success. `rows` holds
+    the records parsed from a show query's output (see show_query).
+    `cached_at` is set when the output was served from the exec result
+    cache instead of the device: the time it was captured.
+    """
+
+    ip: str
+    device_type: str
+    ok: bool
+    output: str
+    error: str = ""
+    timed_out: bool = False
+    seconds: float = 0.0
+    status: str = ""
+    error_class: str = ""
+    timings: dict[str, float] = field(default_factory=dict)
+    rows: list[dict] = field(default_factory=list)
+    cached_at: str = ""
+
+    def __post_init__(self) -> None:
+        if not self.status:
+            if self.timed_out:
+                self.status = DEVICE_STATUS_TIMED_OUT
+            else:
+                self.status = DEVICE_STATUS_OK if self.ok else DEVICE_STATUS_FAILED
+
+
+class DeviceContext:
+    """Per-device output buffer plus the open connection, so a timed-out device can be cut loose."""
+
+    def __init__(self, target: RouterTarget) -> None:
+        self.target = target
+        self.timed_out = False
+        self._lines: list[str] = []
+        self._closers: list[Callable[[], None]] = []
+        self._timings: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time one step of the device run into its result's `timings` (repeats add up)."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._timings[name] = round(self._timings.get(name, 0.0) + elapsed, 3)
+
+    def record(self, name: str, seconds: float) -> None:
+        """Add a phase measured elsewhere, e.g. the queue_wait for a governor permit."""
+        with self._lock:
+            self._timings[name] = round(self._timings.get(name, 0.0) + seconds, 3)
+
+    def timings(self) -> dict[str, float]:
+        with self._lock:
+            return dict(self._timings)
+
+    def log(self, message: str = "") -> None:
+        with self._lock:
+            self._lines.append(str(message))
+
+    def watch(self, conn) -> None:
+        """Register a netmiko connection; it is disconnected if the device overruns its timeout."""
+        with self._lock:
+            self._closers.append(conn.disconnect)
+            aborted = self.timed_out
+        if aborted:
+            conn.disconnect()
+
+    def abort(self) -> None:
+        with self._lock:
+            self.timed_out = True
+            closers = list(self._closers)
+        for close in closers:
+            try:
+                close()
+            except Exception:
+                pass
+
+    def text(self) -> str:
+        with self._lock:
+            return "\n".join(self._lines)
+
+
+class RunControl:
+    """
+    Run-level stop conditions the fan-outs poll: a wall-clock budget for the
+    whole run and a cancel marker file. A file works the same whether the
+    run is in the API process, a pooled worker or a runner subprocess.
+    """
+
+    def __init__(self, budget: float = 0, cancel_file: str | None = None) -> None:
+        self._budget = float(budget or 0)
+        self._deadline = time.monotonic() + self._budget if self._budget else None
+        self._cancel_file = cancel_file
+        self.reason = ""
+        self.error_class = ""
+
+    def stopped(self) -> bool:
+        if self.reason:
+            return True
+        if self._cancel_file and os.path.exists(self._cancel_file):
+            self.reason, self.error_class = "run cancelled", "RunCancelled"
+        elif self._deadline is not None and time.monotonic() >= self._deadline:
+            self.reason, self.error_class = f"run budget of {self._budget:g}s exhausted", "RunBudgetExceeded"
+        return bool(self.reason)
+
+
+class _Slot:
+    def __init__(self) -> None:
+        self.retired = False
+
+
+class _Job:
+    def __init__(self, target: RouterTarget, device_type: str) -> None:
+        self.target = target
+        self.device_type = device_type
+        self.ctx = DeviceContext(target)
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.slot: _Slot | None = None
+
+
+def ssh_engine_from_env() -> str:
+    engine = (os.environ.get(ENV_WUG_SSH_ENGINE) or ROUTER_SSH_ENGINES[0]).strip().lower()
+    return engine if engine in ROUTER_SSH_ENGINES else ROUTER_SSH_ENGINES[0]
+
+
+def max_concurrency_for(engine: str) -> int:
+    return ROUTER_ASYNC_MAX_CONCURRENCY if engine == "asyncssh" else ROUTER_MAX_CONCURRENCY
+
+
+def fanout_settings_from_env(max_concurrency: int = ROUTER_MAX_CONCURRENCY) -> tuple[int, float]:
+    """(concurrency, device_timeout) for a runner process, as passed by RouterCommandService."""
+    try:
+        concurrency = int(os.environ.get(ENV_WUG_ROUTER_CONCURRENCY) or ROUTER_CONCURRENCY_DEFAULT)
+    except ValueError:
+        concurrency = ROUTER_CONCURRENCY_DEFAULT
+    try:
+        device_timeout = float(os.environ.get(ENV_WUG_DEVICE_TIMEOUT) or ROUTER_DEVICE_TIMEOUT_DEFAULT)
+    except ValueError:
+        device_timeout = ROUTER_DEVICE_TIMEOUT_DEFAULT
+    return min(max(1, concurrency), max_concurrency), max(0.0, device_timeout)
+
+
+def print_device_result(result: DeviceRunResult, done_line: str = "", out=None, err=None) -> None:
+    """Print one device's block in a single write, so parallel devices never interleave in the log."""
+    out = out or sys.stdout
+    err = err or sys.stderr
+    block = result.output
+    if not block.endswith("\n"):
+        block += "\n"
+    if result.ok:
+        if done_line:
+            block += done_line + "\n"
+    else:
+        err_msg = f"ERROR on {result.ip}: {result.error}"
+        print(err_msg, file=err, flush=True)
+        block += err_msg + "\n"
+    out.write(block)
+    out.flush()
+
+
+def print_device_event(result: DeviceRunResult, out=None) -> None:
+    """Streaming counterpart of print_device_result: the whole device result as one JSON line."""
+    out = out or sys.stdout
+    out.write(DEVICE_EVENT_PREFIX + json.dumps(asdict(result)) + "\n")
+    out.flush()
+
+
+def device_events_from_env() -> bool:
+    return os.environ.get(ENV_WUG_ROUTER_EVENTS) == "1"
+
+
+def preflight_from_env() -> bool:
+    value = os.environ.get(ENV_WUG_ROUTER_PREFLIGHT)
+    return ROUTER_PREFLIGHT_ENABLED if value is None else value == "1"
+
+
+def autodetect_from_env() -> bool:
+    value = os.environ.get(ENV_WUG_ROUTER_AUTODETECT)
+    return ROUTER_AUTODETECT_ENABLED if value is None else value == "1"
+
+
+def exec_cache_from_env() -> tuple[float, bool]:
+    """(max_age, force_refresh) of the exec result cache for a runner process; max_age 0 = not used."""
+    try:
+        max_age = max(0.0, float(os.environ.get(ENV_WUG_EXEC_CACHE_MAX_AGE) or 0))
+    except ValueError:
+        max_age = 0.0
+    return max_age, os.environ.get(ENV_WUG_EXEC_CACHE_REFRESH) == "1"
+
+
+def run_limits_from_env() -> tuple[float, str | None]:
+    """(run_budget, cancel_file) for a runner process, as set by the API."""
+    try:
+        budget = max(0.0, float(os.environ.get(ENV_WUG_RUN_BUDGET, ROUTER_RUN_BUDGET_DEFAULT)))
+    except ValueError:
+        budget = ROUTER_RUN_BUDGET_DEFAULT
+    return budget, os.environ.get(ENV_WUG_ROUTER_CANCEL_FILE) or None
+
+
+class DeviceFanout:
+    """
+    Runs `work(target, ctx)` for many routers on a bounded set of daemon
+    worker threads and yields one DeviceRunResult per router as each one
+    finishes. Everything a device logs through `ctx.log` comes back in its
+    own result, so callers can print per-device blocks instead of
+    interleaved lines.
+
+    A device that runs past `device_timeout` seconds is reported as timed
+    out straight away and its connection (see `ctx.watch`) is closed. Its
+    worker is retired and replaced, so a hung session never shrinks the pool.
+
+    When `control` stops the run (budget exhausted or cancelled), devices in
+    flight are aborted the same way and, like devices not started yet, are
+    reported as timed out; results already yielded are unaffected.
+
+    With a `governor`, a device starts (and its timeout starts counting)
+    only once it holds a permit; the wait is recorded as its queue_wait.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = ROUTER_CONCURRENCY_DEFAULT,
+        device_timeout: float = ROUTER_DEVICE_TIMEOUT_DEFAULT,
+        poll_interval: float = 0.2,
+    ) -> None:
+        self._concurrency = min(max(1, int(concurrency)), ROUTER_MAX_CONCURRENCY)
+        self._device_timeout = float(device_timeout or 0)
+        self._poll_interval = poll_interval
+
+    def run(
+        self,
+        targets: list[RouterTarget],
+        work: Callable[[RouterTarget, DeviceContext], str],
+        device_type_default: str = "cisco_ios",
+        control: RunControl | None = None,
+        governor: ConnectGovernor | None = None,
+    ) -> Iterator[DeviceRunResult]:
+        jobs: queue.Queue[_Job] = queue.Queue()
+        done: queue.Queue[tuple[_Job, bool, str, str, str]] = queue.Queue()
+        running: set[_Job] = set()
+        running_lock = threading.Lock()
+
+        all_jobs = []
+        for target in targets:
+            device_type = (target.device_type or device_type_default).strip() or device_type_default
+            all_jobs.append(_Job(target, device_type))
+            jobs.put(all_jobs[-1])
+
+        def _worker(slot: _Slot) -> None:
+            while not slot.retired and not (control is not None and control.reason):
+                try:
+                    job = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                permit = None
+                if governor is not None:
+                    permit = governor.acquire(job.target, stop=lambda: control is not None and bool(control.reason))
+                    if permit is None:
+                        return
+                    job.ctx.record("queue_wait", permit.waited)
+                job.slot = slot
+                job.started_at = time.monotonic()
+                with running_lock:
+                    running.add(job)
+                try:
+                    output = work(job.target, job.ctx)
+                    outcome = (job, True, output or "", "", "")
+                except Exception as e:
+                    outcome = (job, False, "", str(e), type(e).__name__)
+                finally:
+                    if permit is not None:
+                        governor.release(permit)
+                job.finished_at = time.monotonic()
+                with running_lock:
+                    running.discard(job)
+                done.put(outcome)
+
+        def _start_worker() -> None:
+            threading.Thread(target=_worker, args=(_Slot(),), name="router-fanout", daemon=True).start()
+
+        for _ in range(min(self._concurrency, len(targets))):
+            _start_worker()
+
+        reported: set[_Job] = set()
+        remaining = len(targets)
+        while remaining:
+            try:
+                job, ok, output, error, error_class = done.get(timeout=self._poll_interval)
+            except queue.Empty:
+                job = None
+            if job is not None and job not in reported:
+                reported.add(job)
+                remaining -= 1
+                yield self._result(job, ok, output, error, error_class=error_class)
+
+            if control is not None and control.stopped():
+                # Devices that finished just before the stop keep their real result.
+                while True:
+                    try:
+                        job, ok, output, error, error_class = done.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job not in reported:
+                        reported.add(job)
+                        yield self._result(job, ok, output, error, error_class=error_class)
+                for job in all_jobs:
+                    if job in reported:
+                        continue
+                    reported.add(job)
+                    if job.slot is not None:
+                        job.ctx.abort()
+                        job.slot.retired = True
+                        error = control.reason
+                    else:
+                        error = f"not started: {control.reason}"
+                    yield self._result(job, False, "", error, control.error_class, timed_out=True)
+                return
+
+            if not self._device_timeout:
+                continue
+            now = time.monotonic()
+            with running_lock:
+                overdue = [
+                    j for j in running
+                    if j not in reported and j.started_at is not None and now - j.started_at > self._device_timeout
+                ]
+            for job in overdue:
+                reported.add(job)
+                remaining -= 1
+                job.ctx.abort()
+                job.slot.retired = True
+                if not jobs.empty():
+                    _start_worker()
+                yield self._result(
+                    job, False, "", f"timed out after {self._device_timeout:g}s", "TimeoutError", timed_out=True
+                )
+
+    def _result(
+        self, job: _Job, ok: bool, output: str, error: str, error_class: str = "", timed_out: bool = False
+    ) -> DeviceRunResult:
+        log = job.ctx.text()
+        text = "\n".join(part for part in (log, output) if part)
+        return DeviceRunResult(
+            ip=job.target.ip,
+            device_type=job.device_type,
+            ok=ok,
+            output=text,
+            error=error,
+            timed_out=timed_out,
+            seconds=round((job.finished_at or time.monotonic()) - (job.started_at or time.monotonic()), 3),
+            error_class=error_class,
+            timings=job.ctx.timings(),
+        )
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import uuid
+from typing import Callable, ContextManager
+
+from netmiko import FileTransfer
+
+from constants import ROUTER_FILE_PUSH_APPLY_TIMEOUT, ROUTER_FILE_PUSH_FILE_SYSTEM, ROUTER_FILE_PUSH_MIN_LINES
+from wug_backend.routers.prompts import StepMatcher
+
+# Platforms whose config can be applied from a file on the device with one command, and how to
+# remove the file afterwards. `{fs}` is the file system netmiko copied to, `{name}` the file name.
+COPY_TO_RUNNING = {
+    "cisco_ios": "copy {fs}{name} running-config",
+    "cisco_xe": "copy {fs}{name} running-config",
+    "cisco_nxos": "copy {fs}{name} running-config",
+    # EOS is copied to over SCP as /mnt/flash but addressed as flash: in the CLI.
+    "arista_eos": "copy flash:{name} running-config",
+}
+DELETE_FILE = {
+    "cisco_ios": "delete /force {fs}{name}",
+    "cisco_xe": "delete /force {fs}{name}",
+    "cisco_nxos": "delete {fs}{name} no-prompt",
+    "arista_eos": "delete flash:{name}",
+}
+
+_COPY_DIALOG = StepMatcher(
+    [{"answer": ""}, {"answer": ""}],
+    [r"Destination filename \[[^\]\n]*\]\?", r"\[confirm\]"],
+)
+
+
+def _platform(device_type: str) -> str:
+    return device_type[: -len("_ssh")] if device_type.endswith("_ssh") else device_type
+
+
+def count_config_lines(config_file: str) -> int:
+    with open(config_file, "r", encoding="utf-8") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def wants_file_push(device_type: str, config_file: str, min_lines: int = ROUTER_FILE_PUSH_MIN_LINES) -> bool:
+    """True when the config is large enough for the fast path and the platform can apply a file."""
+    if not min_lines or _platform(device_type) not in COPY_TO_RUNNING:
+        return False
+    return count_config_lines(config_file) >= min_lines
+
+
+class FilePushUnavailable(Exception):
+    """The file could not be placed on the device (no SCP server, no space, ...); line mode still can."""
+
+
+def push_config_file(
+    conn,
+    config_file: str,
+    log: Callable[[str], None],
+    phase: Callable[[str], ContextManager],
+    file_system: str = ROUTER_FILE_PUSH_FILE_SYSTEM,
+    apply_timeout: float = ROUTER_FILE_PUSH_APPLY_TIMEOUT,
+) -> str:
+    """
+    Copy `config_file` to the device over SCP and apply it with a single
+    copy to running-config, so a long config costs one transfer instead of
+    waiting for the echo of every line. Raises FilePushUnavailable if the
+    transfer fails, before anything is applied.
+    """
+    platform = _platform(conn.device_type)
+    name = f"wug-{uuid.uuid4().hex[:12]}.cfg"
+    with phase("transfer"):
+        try:
+            with FileTransfer(
+                conn, source_file=config_file, dest_file=name, file_system=file_system or None, direction="put"
+            ) as scp:
+                if not scp.verify_space_available():
+                    raise FilePushUnavailable(f"not enough space on {scp.file_system}")
+                scp.transfer_file()
+                if not scp.verify_file():
+                    raise FilePushUnavailable("transferred file failed verification")
+                fs = scp.file_system
+        except FilePushUnavailable:
+            raise
+        except Exception as e:
+            raise FilePushUnavailable(str(e)) from e
+    log(f"Copied config to the device as {name}")
+
+    try:
+        with phase("config"):
+            conn.write_channel(COPY_TO_RUNNING[platform].format(fs=fs, name=name) + conn.RETURN)
+            output = conn.read_until_pattern(pattern=_COPY_DIALOG.pattern, read_timeout=apply_timeout)
+            full_output = output
+            for _ in range(len(_COPY_DIALOG.steps)):
+                if _COPY_DIALOG.step_for(output) is None:
+                    break
+                conn.write_channel(conn.RETURN)
+                output = conn.read_until_pattern(pattern=_COPY_DIALOG.pattern, read_timeout=apply_timeout)
+                full_output += output
+        return full_output
+    finally:
+        try:
+            conn.send_command(DELETE_FILE[platform].format(fs=fs, name=name))
+        except Exception as e:
+            log(f"Could not delete {fs}{name}: {e}")
@@ -0,0 +1,333 @@
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import json
+import os
+import threading
+import time
+import uuid
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from constants import (
+    ROUTER_GOVERNOR_AAA_LIMIT,
+    ROUTER_GOVERNOR_AAA_LIMITS,
+    ROUTER_GOVERNOR_CONNECT_BURST,
+    ROUTER_GOVERNOR_CONNECT_RATE,
+    ROUTER_GOVERNOR_GLOBAL_LIMIT,
+    ROUTER_GOVERNOR_LEASE_TTL,
+    ROUTER_GOVERNOR_SITE_LIMIT,
+    ROUTER_GOVERNOR_SITE_LIMITS,
+    ROUTER_GOVERNOR_SITE_PREFIX,
+    ROUTER_GOVERNOR_STATE_FILE,
+)
+from wug_backend.routers.simple import RouterTarget
+from wug_backend.utils.process_utils import file_lock, process_alive
+
+# Longest a waiter sleeps before looking again (run stopped, token refilled, a release elsewhere).
+_POLL_SECONDS = 0.2
+
+
+def parse_limits(text: str) -> dict[str, int]:
+    """"nyc=5, 10.20.0.0/16=2" -> {"nyc": 5, "10.20.0.0/16": 2}; malformed entries are ignored."""
+    limits = {}
+    for item in (text or "").split(","):
+        key, sep, value = item.partition("=")
+        if sep and key.strip() and value.strip().isdigit():
+            limits[key.strip()] = int(value)
+    return limits
+
+
+class GovernorWaitStopped(RuntimeError):
+    """Raised by ConnectGovernor.slot() when its `stop()` turns true before a permit is granted."""
+
+
+@dataclass(frozen=True)
+class GovernorPermit:
+    keys: tuple[str, ...]
+    waited: float
+    lease: str = ""
+
+
+class ConnectGovernor:
+    """
+    Caps how many device sessions run at once, globally, per site and per
+    AAA server group, and how fast new ones are opened (token bucket of
+    `connect_rate` per second, bursts up to `connect_burst`). Every limit
+    is optional (0 = none).
+
+    A target's site is its `site=` tag, else the /`site_prefix` network of
+    its IP; its AAA group is its `aaa=` tag. `site_limits`/`aaa_limits`
+    override the default limit for particular sites (name or network) and
+    groups. Time spent waiting for a permit is returned with it so callers
+    can report it per device.
+
+    Permits are leases in `state_file`, read and written under a file lock,
+    so the limits hold across the API process, pooled workers and runner
+    subprocesses. A lease whose process has exited, or that is older than
+    `lease_ttl` seconds, no longer counts. Async waiters for the same limits
+    queue behind one poller per event loop, and touch the file off the loop.
+    """
+
+    def __init__(
+        self,
+        global_limit: int = 0,
+        site_limit: int = 0,
+        aaa_limit: int = 0,
+        connect_rate: float = 0,
+        connect_burst: int = 1,
+        site_prefix: int = 24,
+        site_limits: dict[str, int] | None = None,
+        aaa_limits: dict[str, int] | None = None,
+        state_file: Path = ROUTER_GOVERNOR_STATE_FILE,
+        lease_ttl: float = ROUTER_GOVERNOR_LEASE_TTL,
+    ) -> None:
+        self._global_limit = max(0, int(global_limit))
+        self._site_limit = max(0, int(site_limit))
+        self._aaa_limit = max(0, int(aaa_limit))
+        self._rate = max(0.0, float(connect_rate))
+        self._burst = max(1, int(connect_burst))
+        self._site_prefix = site_prefix
+        self._site_limits = dict(site_limits or {})
+        self._aaa_limits = dict(aaa_limits or {})
+        self._site_networks = []
+        for key in self._site_limits:
+            try:
+                self._site_networks.append((ipaddress.ip_network(key, strict=False), key))
+            except ValueError:
+                pass
+        self._state_file = Path(state_file)
+        self._lock_file = self._state_file.with_name(f"{self._state_file.name}.lock")
+        self._lease_ttl = max(1.0, float(lease_ttl))
+        # Wakes this process's waiters on its own releases; releases elsewhere are seen by polling.
+        self._cond = threading.Condition()
+        self._held: set[str] = set()
+        self._async_gates: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def from_settings(cls) -> ConnectGovernor | None:
+        """The governor configured in constants, or None when every limit is off."""
+        governor = cls(
+            global_limit=ROUTER_GOVERNOR_GLOBAL_LIMIT,
+            site_limit=ROUTER_GOVERNOR_SITE_LIMIT,
+            aaa_limit=ROUTER_GOVERNOR_AAA_LIMIT,
+            connect_rate=ROUTER_GOVERNOR_CONNECT_RATE,
+            connect_burst=ROUTER_GOVERNOR_CONNECT_BURST,
+            site_prefix=ROUTER_GOVERNOR_SITE_PREFIX,
+            site_limits=parse_limits(ROUTER_GOVERNOR_SITE_LIMITS),
+            aaa_limits=parse_limits(ROUTER_GOVERNOR_AAA_LIMITS),
+        )
+        return governor if governor.enabled else None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(
+            self._global_limit or self._site_limit or self._aaa_limit or self._rate
+            or self._site_limits or self._aaa_limits
+        )
+
+    # ---------- keys ----------
+    def site_for(self, target: RouterTarget) -> str:
+        tagged = target.tag("site")
+        if tagged:
+            return tagged
+        try:
+            address = ipaddress.ip_address(target.ip)
+        except ValueError:
+            return ""
+        for network, key in self._site_networks:
+            if address in network:
+                return key
+        prefix = min(self._site_prefix, address.max_prefixlen)
+        return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+    def _limits(self, target: RouterTarget) -> list[tuple[str, int]]:
+        limits = []
+        if self._global_limit:
+            limits.append(("global", self._global_limit))
+        site = self.site_for(target)
+        site_limit = self._site_limits.get(site, self._site_limit)
+        if site and site_limit:
+            limits.append((f"site:{site}", site_limit))
+        aaa = target.tag("aaa")
+        aaa_limit = self._aaa_limits.get(aaa, self._aaa_limit)
+        if aaa and aaa_limit:
+            limits.append((f"aaa:{aaa}", aaa_limit))
+        return limits
+
+    # ---------- shared state ----------
+    def _read_state(self) -> dict:
+        try:
+            with open(self._state_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        if not isinstance(state, dict) or not isinstance(state.get("leases"), dict):
+            state = {"leases": {}}
+        state.setdefault("tokens", float(self._burst))
+        state.setdefault("refilled", time.time())
+        return state
+
+    def _write_state(self, state: dict) -> None:
+        tmp = self._state_file.with_name(f"{self._state_file.name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, self._state_file)
+
+    @contextmanager
+    def _state(self):
+        """The shared state under the file lock, with dead or expired leases dropped; written back after."""
+        with self._cond, file_lock(self._lock_file):
+            state = self._read_state()
+            now = time.time()
+            leases = state["leases"]
+            for lease_id, lease in list(leases.items()):
+                if lease_id in self._held:
+                    lease["at"] = now
+                elif now - lease.get("at", 0) > self._lease_ttl or not process_alive(lease.get("pid", 0)):
+                    del leases[lease_id]
+            yield state
+            self._write_state(state)
+
+    @staticmethod
+    def _active(state: dict) -> Counter[str]:
+        return Counter(key for lease in state["leases"].values() for key in lease.get("keys", ()))
+
+    # ---------- permits ----------
+    def _try_take(self, limits: list[tuple[str, int]]) -> tuple[float | None, str]:
+        """0.0 and a lease id once taken, else seconds until a connect token is due (None: wait for a release)."""
+        with self._state() as state:
+            active = self._active(state)
+            if any(active[key] >= limit for key, limit in limits):
+                return None, ""
+            if self._rate:
+                now = time.time()
+                tokens = state["tokens"] + max(0.0, now - state["refilled"]) * self._rate
+                state["tokens"], state["refilled"] = min(float(self._burst), tokens), now
+                if state["tokens"] < 1:
+                    return (1 - state["tokens"]) / self._rate, ""
+                state["tokens"] -= 1
+            lease_id = uuid.uuid4().hex
+            state["leases"][lease_id] = {"keys": [key for key, _ in limits], "pid": os.getpid(), "at": time.time()}
+            self._held.add(lease_id)
+            return 0.0, lease_id
+
+    def acquire(self, target: RouterTarget, stop: Callable[[], bool] | None = None) -> GovernorPermit | None:
+        """Block until the target may connect; None if `stop()` turns true while waiting."""
+        limits = self._limits(target)
+        started = time.monotonic()
+        while True:
+            wait, lease = self._try_take(limits)
+            if wait == 0.0:
+                break
+            if stop is not None and stop():
+                return None
+            with self._cond:
+                self._cond.wait(timeout=min(wait or _POLL_SECONDS, _POLL_SECONDS))
+        return GovernorPermit(tuple(key for key, _ in limits), round(time.monotonic() - started, 3), lease)
+
+    def _async_gate(self, limits: list[tuple[str, int]]) -> tuple[asyncio.Lock, asyncio.Event]:
+        # One gate per event loop and set of limit keys: the waiter holding its lock polls the shared
+        # state, the rest of this loop's waiters for the same keys queue behind it. Its event is set
+        # by this process's releases so that waiter looks again at once.
+        gates = self._async_gates.setdefault(asyncio.get_running_loop(), {})
+        return gates.setdefault(tuple(key for key, _ in limits), (asyncio.Lock(), asyncio.Event()))
+
+    def _wake_async_waiters(self) -> None:
+        for loop, gates in list(self._async_gates.items()):
+            for _, released in list(gates.values()):
+                try:
+                    loop.call_soon_threadsafe(released.set)
+                except RuntimeError:  # loop already closed
+                    break
+
+    async def _try_take_async(self, limits: list[tuple[str, int]]) -> tuple[float | None, str]:
+        # The file lock and JSON read/write run in a thread so the event loop keeps serving sessions.
+        future = asyncio.ensure_future(asyncio.to_thread(self._try_take, limits))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The take still finishes in its thread; give back a lease nobody will use.
+            future.add_done_callback(self._release_abandoned)
+            raise
+
+    def _release_abandoned(self, future: asyncio.Future) -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        _, lease = future.result()
+        if lease:
+            asyncio.get_running_loop().run_in_executor(None, self.release, GovernorPermit((), 0.0, lease))
+
+    async def acquire_async(
+        self, target: RouterTarget, stop: Callable[[], bool] | None = None
+    ) -> GovernorPermit | None:
+        """acquire() for the asyncssh engine: waits on the event loop instead of blocking it."""
+        limits = self._limits(target)
+        started = time.monotonic()
+        lock, released = self._async_gate(limits)
+        async with lock:
+            while True:
+                released.clear()
+                wait, lease = await self._try_take_async(limits)
+                if wait == 0.0:
+                    break
+                if stop is not None and stop():
+                    return None
+                try:
+                    await asyncio.wait_for(released.wait(), timeout=min(wait or _POLL_SECONDS, _POLL_SECONDS))
+                except asyncio.TimeoutError:
+                    pass
+        return GovernorPermit(tuple(key for key, _ in limits), round(time.monotonic() - started, 3), lease)
+
+    def release(self, permit: GovernorPermit) -> None:
+        with self._state() as state:
+            state["leases"].pop(permit.lease, None)
+            self._held.discard(permit.lease)
+            self._cond.notify_all()
+        self._wake_async_waiters()
+
+    async def release_async(self, permit: GovernorPermit) -> None:
+        """release() off the event loop; finishes even if the awaiting task is cancelled."""
+        await asyncio.shield(asyncio.to_thread(self.release, permit))
+
+    @contextmanager
+    def slot(self, target: RouterTarget, stop: Callable[[], bool] | None = None):
+        """
+        acquire/release around a block; yields the permit (its `waited`
+        seconds). Raises GovernorWaitStopped if `stop()` turns true first.
+        """
+        permit = self.acquire(target, stop=stop)
+        if permit is None:
+            raise GovernorWaitStopped("Stopped while waiting for a connection slot")
+        try:
+            yield permit
+        finally:
+            self.release(permit)
+
+    def stats(self) -> dict:
+        with self._state() as state:
+            return {
+                "active": dict(self._active(state)),
+                "tokens": round(state["tokens"], 2),
+                "processes": len({lease.get("pid") for lease in state["leases"].values()}),
+            }
+
+
+_shared: ConnectGovernor | None = None
+_shared_loaded = False
+_shared_lock = threading.Lock()
+
+
+def shared_governor() -> ConnectGovernor | None:
+    """The governor for this process; its permits are shared with every other process through the state file."""
+    global _shared, _shared_loaded
+    with _shared_lock:
+        if not _shared_loaded:
+            _shared = ConnectGovernor.from_settings()
+            _shared_loaded = True
+        return _shared
@@ -1,11 +1,20 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from typing import Callable
 
 from netmiko import ConnectHandler
 
-from constants import SSH_ENABLE_PASSWORD, SSH_PASSWORD, SSH_USERNAME
-from wug_backend.routers.simple import RouterListParser, RouterTarget
+from wug_backend.routers.prompts import StepMatcher, answer_for
+from wug_backend.routers.task_plan import PlanStep, TaskPlan, compile_task_plan
+from wug_backend.routers.simple import (
+    PhaseTimer,
+    RouterListParser,
+    RouterTarget,
+    SshCredentials,
+    default_ssh_credentials,
+    untimed,
+)
 
 
 @dataclass(frozen=True)
@@ -15,22 +24,43 @@ class InteractiveStep:
 
 
 class InteractiveCommandRunner:
-    def run_interactive_command(self, conn, command, steps, context=None, max_rounds=10):
+    def run_interactive_command(self, conn, command, steps, context=None, max_rounds=10, read_timeout=60, matcher=None):
+        """
+        Answer a prompt dialog (e.g. copy): read until any step prompt or the
+        device prompt appears, answer straight away, stop at the device prompt.
+        """
         if context is None:
             context = {}
 
+        matcher = matcher or StepMatcher.compile(steps)
+        if matcher is None:
+            return self._run_interactive_timing(conn, command, steps, context, max_rounds)
+
+        conn.write_channel(command + conn.RETURN)
+        output = conn.read_until_pattern(pattern=matcher.pattern, read_timeout=read_timeout)
+        full_output = output
+
+        for _ in range(max_rounds):
+            step = matcher.step_for(output)
+            if step is None:
+                break
+            conn.write_channel(answer_for(step, context) + conn.RETURN)
+            output = conn.read_until_pattern(pattern=matcher.pattern, read_timeout=read_timeout)
+            full_output += output
+
+        return full_output
+
+    def _run_interactive_timing(self, conn, command, steps, context, max_rounds):
         output = conn.send_command_timing(command, strip_prompt=False, strip_command=False)
         full_output = output
 
         for _ in range(max_rounds):
             matched = False
             for step in steps:
-                prompt = step["prompt"].replace(r"\r\n", "").replace(r"\n", "").strip()
-                raw_answer = step.get("answer", "")
+                prompt = (step.get("prompt") or "").replace(r"\r\n", "").replace(r"\n", "").strip()
 
                 if prompt in output:
-                    answer = raw_answer.format(**context) if raw_answer else ""
-                    output = conn.send_command_timing(answer + "\n", strip_prompt=False, strip_command=False)
+                    output = conn.send_command_timing(answer_for(step, context) + "\n", strip_prompt=False, strip_command=False)
                     full_output += output
                     matched = True
                     break
@@ -40,83 +70,78 @@ class InteractiveCommandRunner:
 
         return full_output
 
-    def execute_tasks(self, router: RouterTarget, tasks: list, device_type_default: str, timestamp_global: str) -> str:
+    def execute_tasks(
+        self,
+        router: RouterTarget,
+        tasks: TaskPlan | list,
+        device_type_default: str,
+        timestamp_global: str,
+        log: Callable[[str], None] = print,
+        on_connect: Callable | None = None,
+        session=None,
+        credentials: SshCredentials | None = None,
+        phase: PhaseTimer = untimed,
+    ) -> str:
+        """Run a compiled task plan (or a raw task list, compiled here) on one router."""
+        plan = tasks if isinstance(tasks, TaskPlan) else compile_task_plan(tasks)
+        credentials = credentials or default_ssh_credentials()
         ip = router.ip
         device_type = (router.device_type or device_type_default).strip() or device_type_default
-        print(f"\n=== Connecting to {ip} ({device_type}) ===")
+        log(f"\n=== Connecting to {ip} ({device_type}) ===")
 
         device = {
             "device_type": device_type,
             "ip": ip,
-            "username": SSH_USERNAME,
-            "password": SSH_PASSWORD,
-            "secret": SSH_ENABLE_PASSWORD,
+            "username": credentials.username,
+            "password": credentials.password,
+            "secret": credentials.secret or credentials.password,
         }
 
         log_output = ""
-        conn = ConnectHandler(**device)
+        # A pooled session is borrowed, not owned: it is left open for the pool.
+        if session is None:
+            with phase("connect"):
+                conn = ConnectHandler(**device)
+        else:
+            conn = session
         try:
-            conn.enable()
+            if on_connect:
+                on_connect(conn)
+            with phase("enable"):
+                conn.enable()
             prompt = conn.find_prompt()
             hostname = prompt.strip("#>").strip()
-            print(f"Connected to {hostname} ({ip})")
+            log(f"Connected to {hostname} ({ip})")
 
             base_context = {"hostname": hostname, "ip": ip, "timestamp": timestamp_global}
 
-            for idx, task in enumerate(tasks, start=1):
-                ttype = task.get("type")
-                name = task.get("name", f"task_{idx}")
-
-                log_output += f"\n=== TASK {idx}: {name} (type={ttype}) ===\n"
-                print(f"Running task {idx}: {name} (type={ttype}) on {hostname}")
-
-                if ttype == "config":
-                    commands = task.get("commands", [])
-                    if isinstance(commands, str):
-                        commands = [commands]
-                    if not commands:
-                        log_output += "No commands defined.\n"
-                        continue
-                    out = conn.send_config_set(commands)
-                    log_output += out + "\n"
-
-                elif ttype == "exec":
-                    command = task.get("command")
-                    if not command:
-                        log_output += "No command defined.\n"
-                        continue
-                    out = conn.send_command(command, expect_string=r"#", read_timeout=60)
-                    log_output += out + "\n"
-
-                elif ttype == "interactive_exec":
-                    command = task.get("command")
-                    steps = task.get("steps", [])
-                    extra_context = task.get("context", {})
-
-                    if not command or not steps:
-                        log_output += "No command or steps defined.\n"
-                        continue
-
-                    context = base_context.copy()
-                    context.update(extra_context)
-                    out = self.run_interactive_command(conn, command=command, steps=steps, context=context)
-                    log_output += out + "\n"
-
-                elif ttype == "write_memory":
-                    out = conn.send_command("write memory")
-                    log_output += out + "\n"
-                else:
-                    msg = f"ERROR: Unknown task type: {ttype}"
-                    import sys
-
-                    print(msg, file=sys.stderr)
-                    log_output += msg + "\n"
-
-            conn.disconnect()
+            for step in plan.steps:
+                log_output += f"\n=== {step.title('TASK', 'TASKS')} ===\n"
+                log(f"Running {step.title()} on {hostname}")
+
+                with phase(step.label):
+                    log_output += self._run_step(conn, step, base_context)
+
             return log_output
         finally:
-            try:
-                conn.disconnect()
-            except Exception:
-                pass
-
+            if session is None:
+                with phase("disconnect"):
+                    try:
+                        conn.disconnect()
+                    except Exception:
+                        pass
+
+    def _run_step(self, conn, step: PlanStep, base_context: dict) -> str:
+        if step.type == "config":
+            return conn.send_config_set(list(step.commands)) + "\n"
+
+        if step.type == "exec":
+            return conn.send_command(step.command, expect_string=r"#", read_timeout=60) + "\n"
+
+        if step.type == "interactive_exec":
+            context = {**base_context, **step.context}
+            return self.run_interactive_command(
+                conn, command=step.command, steps=list(step.steps), context=context, matcher=step.matcher
+            ) + "\n"
+
+        return conn.send_command("write memory") + "\n"
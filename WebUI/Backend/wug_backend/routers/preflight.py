@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import json
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from constants import (
+    ROUTER_PREFLIGHT_CACHE_FILE,
+    ROUTER_PREFLIGHT_CACHE_TTL,
+    ROUTER_PREFLIGHT_CONCURRENCY,
+    ROUTER_PREFLIGHT_NEGATIVE_TTL,
+    ROUTER_PREFLIGHT_PORT,
+    ROUTER_PREFLIGHT_TELNET_PORT,
+    ROUTER_PREFLIGHT_TIMEOUT,
+)
+
+
+@dataclass(frozen=True)
+class ProbeResult:
+    host: str
+    reachable: bool
+    seconds: float
+    error: str = ""
+    cached: bool = False
+
+
+def probe_port(host: str, port: int, timeout: float) -> ProbeResult:
+    started = time.monotonic()
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            pass
+        return ProbeResult(host, True, round(time.monotonic() - started, 3))
+    except OSError as e:
+        error = "timed out" if isinstance(e, socket.timeout) else (e.strerror or str(e))
+        return ProbeResult(host, False, round(time.monotonic() - started, 3), f"port {port} unreachable: {error}")
+
+
+class TcpPreflight:
+    """
+    Probes the management port of every target at once (SSH, or telnet for
+    *_telnet device types) with a short connect timeout, so dead hosts are
+    known (and skipped) before any session is attempted instead of each one
+    costing a full netmiko connect timeout.
+
+    Outcomes are cached in a small JSON file, keyed by host:port, so
+    back-to-back runs from any runner process reuse them: reachable hosts
+    for `cache_ttl` seconds, unreachable ones only for `negative_ttl`, so a
+    host that comes back is not skipped for long.
+    """
+
+    def __init__(
+        self,
+        port: int = ROUTER_PREFLIGHT_PORT,
+        timeout: float = ROUTER_PREFLIGHT_TIMEOUT,
+        concurrency: int = ROUTER_PREFLIGHT_CONCURRENCY,
+        cache_ttl: float = ROUTER_PREFLIGHT_CACHE_TTL,
+        cache_file: Path | None = ROUTER_PREFLIGHT_CACHE_FILE,
+        telnet_port: int = ROUTER_PREFLIGHT_TELNET_PORT,
+        negative_ttl: float = ROUTER_PREFLIGHT_NEGATIVE_TTL,
+    ) -> None:
+        self._port = port
+        self._telnet_port = telnet_port
+        self._timeout = timeout
+        self._concurrency = max(1, int(concurrency))
+        self._cache_ttl = cache_ttl
+        self._negative_ttl = min(negative_ttl, cache_ttl)
+        self._cache_file = Path(cache_file) if cache_file and cache_ttl > 0 else None
+
+    def port_for(self, device_type: str) -> int:
+        return self._telnet_port if device_type.endswith("_telnet") else self._port
+
+    # ---------- cache ----------
+    @staticmethod
+    def _key(host: str, port: int) -> str:
+        return f"{host}:{port}"
+
+    def _load_cache(self) -> dict:
+        if self._cache_file is None or not self._cache_file.exists():
+            return {}
+        try:
+            with open(self._cache_file, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        now = time.time()
+        return {
+            k: v
+            for k, v in entries.items()
+            if isinstance(v, dict)
+            and now - v.get("at", 0) <= (self._cache_ttl if v.get("reachable") else self._negative_ttl)
+        }
+
+    def _save_cache(self, cache: dict, fresh: list[tuple[int, ProbeResult]]) -> None:
+        if self._cache_file is None or not fresh:
+            return
+        now = time.time()
+        for port, r in fresh:
+            cache[self._key(r.host, port)] = {"reachable": r.reachable, "error": r.error, "at": now}
+        tmp = self._cache_file.with_name(f"{self._cache_file.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(cache, f)
+            os.replace(tmp, self._cache_file)
+        except OSError:
+            pass
+
+    # ---------- probing ----------
+    def check(self, hosts: list[str], ports: dict[str, int] | None = None) -> dict[str, ProbeResult]:
+        """host -> ProbeResult for every distinct host, probed on `ports[host]` (default: the SSH port)."""
+        ports = ports or {}
+        cache = self._load_cache()
+        results: dict[str, ProbeResult] = {}
+        to_probe = []
+        for host in dict.fromkeys(hosts):
+            port = ports.get(host, self._port)
+            entry = cache.get(self._key(host, port))
+            if entry is not None:
+                results[host] = ProbeResult(host, bool(entry["reachable"]), 0.0, entry.get("error", ""), cached=True)
+            else:
+                to_probe.append((host, port))
+
+        fresh: list[tuple[int, ProbeResult]] = []
+        if to_probe:
+            with ThreadPoolExecutor(max_workers=min(self._concurrency, len(to_probe))) as pool:
+                probed = list(pool.map(lambda hp: probe_port(hp[0], hp[1], self._timeout), to_probe))
+            fresh = [(port, r) for (_, port), r in zip(to_probe, probed)]
+            results.update((r.host, r) for r in probed)
+        self._save_cache(cache, fresh)
+        return results
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import re
+
+# A device CLI prompt at the end of the output: hostname, optional (config...) mode, then # or >.
+DEVICE_PROMPT_PATTERN = r"(?:^|\n)[^\s#>]+(?:\([^)\n]*\))?[#>]\s*$"
+
+
+def _step_prompt(step: dict) -> str:
+    """Regex for one step: its `pattern` as written, or its `prompt` text matched literally."""
+    if step.get("pattern"):
+        return step["pattern"]
+    prompt = (step.get("prompt") or "").replace(r"\r\n", "").replace(r"\n", "").strip()
+    return re.escape(prompt) if prompt else ""
+
+
+class StepMatcher:
+    """
+    Every prompt of an interactive_exec task plus the device prompt, as one
+    regex. The caller reads until the first of them shows up and answers at
+    once, instead of waiting out a quiet period after each command.
+
+    Step `pattern` values are regexes and must not use capturing groups
+    (netmiko's read_until_pattern splits on the match); plain `prompt`
+    values are matched literally, as before.
+    """
+
+    def __init__(self, steps: list[dict], prompts: list[str]) -> None:
+        self.steps = steps
+        self.pattern = "|".join(f"(?:{p})" for p in [*prompts, DEVICE_PROMPT_PATTERN])
+        self.regex = re.compile(self.pattern)
+        named = [f"(?P<s{i}>{p})" for i, p in enumerate(prompts)]
+        self._named = re.compile("|".join([*named, f"(?P<device>{DEVICE_PROMPT_PATTERN})"]))
+
+    @classmethod
+    def compile(cls, steps: list[dict]) -> StepMatcher | None:
+        """None when a step has neither prompt nor pattern: such tasks keep the timing-based dialog."""
+        prompts = [_step_prompt(step) for step in steps]
+        if not prompts or not all(prompts):
+            return None
+        return cls(steps, prompts)
+
+    def step_for(self, output: str) -> dict | None:
+        """The step whose prompt ended `output`, or None once the device prompt is back."""
+        last = None
+        for last in self._named.finditer(output):
+            pass
+        if last is None or last.lastgroup == "device":
+            return None
+        return self.steps[int(last.lastgroup[1:])]
+
+
+def answer_for(step: dict, context: dict) -> str:
+    raw_answer = step.get("answer", "")
+    return raw_answer.format(**context) if raw_answer else ""
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import json
+import math
+from collections import Counter
+from dataclasses import asdict
+from pathlib import Path
+from typing import Iterable
+
+from wug_backend.routers.fanout import (
+    DEVICE_STATUS_FAILED,
+    DEVICE_STATUS_OK,
+    DEVICE_STATUS_TIMED_OUT,
+    DEVICE_STATUS_UNREACHABLE,
+    DeviceRunResult,
+)
+
+STATUSES = (DEVICE_STATUS_OK, DEVICE_STATUS_FAILED, DEVICE_STATUS_TIMED_OUT, DEVICE_STATUS_UNREACHABLE)
+
+SLOWEST_DEVICES = 10
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return values[rank - 1]
+
+
+def _as_dict(result: DeviceRunResult | dict) -> dict:
+    return asdict(result) if isinstance(result, DeviceRunResult) else result
+
+
+def summarize_results(results: Iterable[DeviceRunResult | dict]) -> dict:
+    """
+    Run summary from per-device results: counts by status and error class,
+    p50/p95/max seconds per phase (plus "total"), and the slowest devices.
+    Accepts DeviceRunResult objects or their dict form (device events).
+    """
+    devices = [_as_dict(r) for r in results]
+    statuses = Counter(d.get("status") or DEVICE_STATUS_FAILED for d in devices)
+    error_classes = Counter(d["error_class"] for d in devices if d.get("error_class"))
+
+    samples: dict[str, list[float]] = {}
+    for d in devices:
+        for name, seconds in (d.get("timings") or {}).items():
+            samples.setdefault(name, []).append(float(seconds))
+    if devices:
+        samples["total"] = [float(d.get("seconds") or 0.0) for d in devices]
+
+    phases = {}
+    for name, values in samples.items():
+        values.sort()
+        phases[name] = {
+            "count": len(values),
+            "p50": _percentile(values, 50),
+            "p95": _percentile(values, 95),
+            "max": values[-1],
+        }
+
+    slowest = sorted(devices, key=lambda d: d.get("seconds") or 0.0, reverse=True)[:SLOWEST_DEVICES]
+    return {
+        "devices": len(devices),
+        "status": {s: statuses.get(s, 0) for s in STATUSES},
+        "error_classes": dict(error_classes.most_common()),
+        "phases": phases,
+        "slowest": [{"ip": d["ip"], "seconds": d.get("seconds"), "status": d.get("status")} for d in slowest],
+    }
+
+
+def format_phase_summary(summary: dict) -> str:
+    """One log line: p50/p95 per phase, e.g. "connect 0.8s/2.1s"."""
+    parts = [f"{name} {p['p50']:g}s/{p['p95']:g}s" for name, p in summary["phases"].items()]
+    return "Phase timings p50/p95: " + ", ".join(parts) if parts else ""
+
+
+def write_results_jsonl(path: str | Path, results: Iterable[DeviceRunResult | dict], summary: dict) -> None:
+    """One `device` line per router, then a final `summary` line."""
+    with open(path, "w", encoding="utf-8") as f:
+        for result in results:
+            f.write(json.dumps({"type": "device", **_as_dict(result)}) + "\n")
+        f.write(json.dumps({"type": "summary", **summary}) + "\n")
+
+
+def read_results_jsonl(path: str | Path) -> tuple[list[dict], dict | None]:
+    """(devices, summary) from a file written by write_results_jsonl."""
+    devices, summary = [], None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            kind = record.pop("type", "device")
+            if kind == "summary":
+                summary = record
+            else:
+                devices.append(record)
+    return devices, summary
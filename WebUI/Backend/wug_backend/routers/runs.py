@@ -0,0 +1,437 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+import time
+from dataclasses import asdict
+from datetime import datetime
+from typing import Callable, ContextManager, TextIO
+
+from constants import (
+    ROUTER_AUTODETECT_ENABLED,
+    ROUTER_CONCURRENCY_DEFAULT,
+    ROUTER_DEVICE_TIMEOUT_DEFAULT,
+    ROUTER_PREFLIGHT_ENABLED,
+    ROUTER_RUN_BUDGET_DEFAULT,
+    ROUTER_SSH_ENGINES,
+)
+from wug_backend.routers.async_engine import AsyncDeviceFanout, AsyncTaskRunner
+from wug_backend.routers.autodetect import DeviceTypeDetector
+from wug_backend.routers.exec_cache import ExecResultCache, cacheable, credential_key
+from wug_backend.routers.fanout import (
+    DEVICE_STATUS_UNREACHABLE,
+    DeviceFanout,
+    DeviceRunResult,
+    RunControl,
+    print_device_result,
+)
+from wug_backend.routers.governor import shared_governor
+from wug_backend.routers.interactive import InteractiveCommandRunner
+from wug_backend.routers.preflight import TcpPreflight
+from wug_backend.routers.run_results import format_phase_summary, summarize_results, write_results_jsonl
+from wug_backend.routers.show_query import QueryParsePool, ShowQuery, aggregate_table
+from wug_backend.routers.simple import (
+    RouterListParser,
+    RouterTarget,
+    SimpleConfigPusher,
+    SshCredentials,
+    default_ssh_credentials,
+)
+from wug_backend.routers.task_plan import TaskPlan, TaskPlanError, compile_task_plan
+
+# lease(target, device_type) -> context manager yielding an open netmiko connection (see SshSessionPool.lease)
+SessionLease = Callable[[RouterTarget, str], ContextManager]
+
+
+def _finish(
+    routers: list[RouterTarget],
+    results: list[DeviceRunResult],
+    out: TextIO,
+    results_file: str | None,
+    control: RunControl,
+) -> int:
+    failed = sum(1 for r in results if not r.ok)
+    if control.reason:
+        print(f"Stopped early: {control.reason}", file=out)
+    print(f"Finished {len(routers)} router(s): {len(routers) - failed} ok, {failed} failed", file=out)
+    served = sum(1 for r in results if r.cached_at)
+    if served:
+        print(f"Result cache: {served} router(s) served from cache", file=out)
+    summary = summarize_results(results)
+    timings = format_phase_summary(summary)
+    if timings:
+        print(timings, file=out)
+    out.flush()
+    if results_file:
+        write_results_jsonl(results_file, results, summary)
+    return 0
+
+
+def _preflight(
+    routers: list[RouterTarget], device_type_default: str, out: TextIO, report: Callable[[DeviceRunResult], None]
+) -> tuple[list[RouterTarget], list[DeviceRunResult]]:
+    """Probe every router's SSH (or telnet) port at once; unreachable ones are reported now and left out of the fan-out."""
+    started = time.monotonic()
+    preflight = TcpPreflight()
+    device_types = {r.ip: (r.device_type or device_type_default).strip() or device_type_default for r in routers}
+    probes = preflight.check([r.ip for r in routers], {ip: preflight.port_for(t) for ip, t in device_types.items()})
+    reachable, skipped = [], []
+    for r in routers:
+        probe = probes[r.ip]
+        if probe.reachable:
+            reachable.append(r)
+            continue
+        result = DeviceRunResult(
+            ip=r.ip,
+            device_type=(r.device_type or device_type_default).strip() or device_type_default,
+            ok=False,
+            output="",
+            error=probe.error,
+            seconds=probe.seconds,
+            status=DEVICE_STATUS_UNREACHABLE,
+            error_class="Unreachable",
+            timings={"preflight": probe.seconds},
+        )
+        report(result)
+        skipped.append(result)
+    elapsed = time.monotonic() - started
+    print(f"Preflight: {len(reachable)} reachable, {len(skipped)} unreachable ({elapsed:.1f}s)", file=out, flush=True)
+    return reachable, skipped
+
+
+def _serve_cached(
+    routers: list[RouterTarget],
+    plan: TaskPlan,
+    device_type_default: str,
+    max_age: float,
+    cache: ExecResultCache,
+    report: Callable[[DeviceRunResult], None],
+) -> tuple[list[RouterTarget], list[DeviceRunResult]]:
+    """Routers with every command cached within `max_age` are answered now and left out of the fan-out."""
+    live, served = [], []
+    for r in routers:
+        device_type = (r.device_type or device_type_default).strip() or device_type_default
+        result = cache.serve(plan, r.ip, device_type, max_age)
+        if result is None:
+            live.append(r)
+            continue
+        report(result)
+        served.append(result)
+    return live, served
+
+
+def _autodetect(
+    targets: list[RouterTarget], credentials: SshCredentials | None, out: TextIO, err: TextIO, control: RunControl
+) -> list[RouterTarget]:
+    """
+    Fill in the type of routers listed without one from the device-type cache or SSHDetect,
+    logging in as `credentials` (the runner's environment when None, as in a runner subprocess).
+    """
+    detector = DeviceTypeDetector(credentials or default_ssh_credentials(), stop=control.stopped)
+    if not any(detector.needs_detection(t) for t in targets):
+        return targets
+    started = time.monotonic()
+    targets, results = detector.resolve(targets)
+    for r in results.values():
+        if r.error:
+            print(f"Autodetect failed for {r.host}: {r.error}; using the default type", file=err)
+    cached = sum(1 for r in results.values() if r.cached)
+    detected = sum(1 for r in results.values() if r.device_type and not r.cached)
+    elapsed = time.monotonic() - started
+    print(
+        f"Autodetect: {cached} cached, {detected} detected, {len(results) - cached - detected} undetected ({elapsed:.1f}s)",
+        file=out,
+        flush=True,
+    )
+    return targets
+
+
+def _netmiko_fanout(
+    routers, work, device_type_default, concurrency, device_timeout, report, lease, control
+) -> list[DeviceRunResult]:
+    def _work(r, ctx):
+        if lease is None:
+            return work(r, ctx, None)
+        device_type = (r.device_type or device_type_default).strip() or device_type_default
+        with lease(r, device_type) as conn:
+            return work(r, ctx, conn)
+
+    results = []
+    fanout = DeviceFanout(concurrency=concurrency, device_timeout=device_timeout)
+    for result in fanout.run(routers, _work, device_type_default, control=control, governor=shared_governor()):
+        report(result)
+        results.append(result)
+    return results
+
+
+def run_router_tasks(
+    router_list_text: str,
+    tasks_text: str,
+    device_type_default: str = "cisco_ios",
+    engine: str = ROUTER_SSH_ENGINES[0],
+    concurrency: int = ROUTER_CONCURRENCY_DEFAULT,
+    device_timeout: float = ROUTER_DEVICE_TIMEOUT_DEFAULT,
+    out: TextIO | None = None,
+    err: TextIO | None = None,
+    lease: SessionLease | None = None,
+    report: Callable[[DeviceRunResult], None] | None = None,
+    credentials: SshCredentials | None = None,
+    results_file: str | None = None,
+    preflight: bool = ROUTER_PREFLIGHT_ENABLED,
+    run_budget: float = ROUTER_RUN_BUDGET_DEFAULT,
+    cancel_file: str | None = None,
+    autodetect: bool = ROUTER_AUTODETECT_ENABLED,
+    max_age: float = 0,
+    force_refresh: bool = False,
+) -> int:
+    """
+    Body of the router_interactive runner; also run in-process when a session pool is in use.
+    `results_file` receives the structured per-device results as JSON lines (see run_results).
+    The run stops after `run_budget` seconds (0 = no limit) or once `cancel_file` exists;
+    devices still in flight are then reported as timed out. With `autodetect`, routers listed
+    without a type get the one detected for them (see autodetect) instead of `device_type_default`.
+    With `max_age` > 0 and only read-only exec tasks, routers whose outputs are in the exec
+    result cache (see exec_cache) and younger than `max_age` seconds are served from it;
+    `force_refresh` skips the lookup but still caches what the run captures.
+    """
+    out = out or sys.stdout
+    err = err or sys.stderr
+
+    if not router_list_text:
+        print("ERROR: No routers data provided", file=err)
+        return 1
+
+    parser = RouterListParser()
+    # With autodetect, untyped lines keep an empty type until detection fills it in.
+    routers = parser.parse_from_text(router_list_text, "" if autodetect else device_type_default)
+    if not routers:
+        print("ERROR: No router IPs found", file=err)
+        return 1
+
+    print(f"Found {len(routers)} router(s)", file=out)
+
+    if not tasks_text:
+        print("ERROR: No tasks data provided", file=err)
+        return 1
+
+    try:
+        tasks = json.loads(tasks_text)
+    except Exception as e:
+        print(f"ERROR: Could not parse tasks JSON: {e}", file=err)
+        return 1
+
+    # Compiled once, validated before any device is contacted, shared by every router.
+    try:
+        plan = compile_task_plan(tasks)
+    except TaskPlanError as e:
+        for problem in e.problems:
+            print(f"ERROR: {problem}", file=err)
+        return 1
+
+    print(f"Loaded {len(tasks)} task(s) as {len(plan.steps)} step(s)", file=out)
+
+    timestamp_global = datetime.now().strftime("%Y%m%d-%H%M%S")
+
+    cache = None
+    if max_age > 0 and cacheable(plan):
+        cache = ExecResultCache(credential_key(credentials or default_ssh_credentials()))
+    elif max_age > 0:
+        print("Result cache: not used, the tasks are not all cacheable read-only exec commands", file=out)
+
+    def _report(result):
+        if cache is not None:
+            cache.store(plan, result)
+        if report is not None:
+            return report(result)
+        print_device_result(result, done_line=f"Done with {result.ip} ({result.ip})", out=out, err=err)
+
+    control = RunControl(run_budget, cancel_file)
+    targets, served = routers, []
+    if cache is not None and not force_refresh:
+        targets, served = _serve_cached(routers, plan, device_type_default, max_age, cache, _report)
+    skipped = []
+    if preflight and targets:
+        targets, skipped = _preflight(targets, device_type_default, out, _report)
+    targets = _autodetect(targets, credentials, out, err, control)
+
+    if engine == "asyncssh":
+        async_runner = AsyncTaskRunner(credentials=credentials)
+        fanout = AsyncDeviceFanout(concurrency=concurrency, device_timeout=device_timeout)
+        results = asyncio.run(
+            fanout.run(
+                targets,
+                lambda r, device_type, ctx: async_runner.execute_tasks(r, plan, device_type, timestamp_global, ctx),
+                device_type_default,
+                on_result=_report,
+                control=control,
+                governor=shared_governor(),
+            )
+        )
+    else:
+        runner = InteractiveCommandRunner()
+
+        def _run(r, ctx, conn):
+            return runner.execute_tasks(
+                r,
+                tasks=plan,
+                device_type_default=device_type_default,
+                timestamp_global=timestamp_global,
+                log=ctx.log,
+                on_connect=ctx.watch,
+                session=conn,
+                credentials=credentials,
+                phase=ctx.phase,
+            )
+
+        results = _netmiko_fanout(
+            targets, _run, device_type_default, concurrency, device_timeout, _report, lease, control
+        )
+
+    if cache is not None:
+        cache.prune()
+    return _finish(routers, served + skipped + results, out, results_file, control)
+
+
+def run_config_push(
+    routers_text: str,
+    config_file: str,
+    device_type_default: str = "cisco_ios",
+    engine: str = ROUTER_SSH_ENGINES[0],
+    concurrency: int = ROUTER_CONCURRENCY_DEFAULT,
+    device_timeout: float = ROUTER_DEVICE_TIMEOUT_DEFAULT,
+    out: TextIO | None = None,
+    err: TextIO | None = None,
+    lease: SessionLease | None = None,
+    report: Callable[[DeviceRunResult], None] | None = None,
+    credentials: SshCredentials | None = None,
+    results_file: str | None = None,
+    preflight: bool = ROUTER_PREFLIGHT_ENABLED,
+    run_budget: float = ROUTER_RUN_BUDGET_DEFAULT,
+    cancel_file: str | None = None,
+    autodetect: bool = ROUTER_AUTODETECT_ENABLED,
+) -> int:
+    """Body of the router_simple runner; the keyword arguments are as for run_router_tasks."""
+    out = out or sys.stdout
+    err = err or sys.stderr
+
+    parser = RouterListParser()
+    routers = parser.parse_from_text(routers_text, "" if autodetect else device_type_default)
+
+    if not routers:
+        print("ERROR: No router IPs found", file=err)
+        return 1
+
+    print(f"Found {len(routers)} router(s)", file=out, flush=True)
+
+    def _report(result):
+        if report is not None:
+            return report(result)
+        print_device_result(result, out=out, err=err)
+
+    control = RunControl(run_budget, cancel_file)
+    targets, skipped = routers, []
+    if preflight:
+        targets, skipped = _preflight(routers, device_type_default, out, _report)
+    targets = _autodetect(targets, credentials, out, err, control)
+
+    if engine == "asyncssh":
+        with open(config_file, "r", encoding="utf-8") as f:
+            commands = [line.rstrip() for line in f if line.strip()]
+        runner = AsyncTaskRunner(credentials=credentials)
+        fanout = AsyncDeviceFanout(concurrency=concurrency, device_timeout=device_timeout)
+        results = asyncio.run(
+            fanout.run(
+                targets,
+                lambda r, device_type, ctx: runner.push_config(r, commands, device_type, ctx),
+                device_type_default,
+                on_result=_report,
+                control=control,
+                governor=shared_governor(),
+            )
+        )
+    else:
+        pusher = SimpleConfigPusher()
+
+        def _push(r, ctx, conn):
+            return pusher.push_from_file(
+                r,
+                config_file=config_file,
+                device_type_default=device_type_default,
+                log=ctx.log,
+                on_connect=ctx.watch,
+                session=conn,
+                credentials=credentials,
+                phase=ctx.phase,
+            )
+
+        results = _netmiko_fanout(
+            targets, _push, device_type_default, concurrency, device_timeout, _report, lease, control
+        )
+
+    return _finish(routers, skipped + results, out, results_file, control)
+
+
+def run_show_query(
+    routers_text: str,
+    query: ShowQuery,
+    device_type_default: str = "cisco_ios",
+    engine: str = ROUTER_SSH_ENGINES[0],
+    concurrency: int = ROUTER_CONCURRENCY_DEFAULT,
+    device_timeout: float = ROUTER_DEVICE_TIMEOUT_DEFAULT,
+    out: TextIO | None = None,
+    err: TextIO | None = None,
+    lease: SessionLease | None = None,
+    report: Callable[[DeviceRunResult], None] | None = None,
+    credentials: SshCredentials | None = None,
+    results_file: str | None = None,
+    preflight: bool = ROUTER_PREFLIGHT_ENABLED,
+    run_budget: float = ROUTER_RUN_BUDGET_DEFAULT,
+    cancel_file: str | None = None,
+    autodetect: bool = ROUTER_AUTODETECT_ENABLED,
+    max_age: float = 0,
+    force_refresh: bool = False,
+) -> int:
+    """
+    Body of the router_query runner: the query's command on every router
+    through run_router_tasks, each output parsed (see QueryParsePool) and
+    reported with its rows as soon as it is parsed. `results_file` gets the
+    parsed results; the other keyword arguments are as for run_router_tasks.
+    """
+    out = out or sys.stdout
+    err = err or sys.stderr
+
+    def _report(result):
+        if report is not None:
+            return report(result)
+        print_device_result(result, done_line=f"Parsed {len(result.rows)} row(s) from {result.ip}", out=out, err=err)
+
+    with QueryParsePool(query, _report) as parsing:
+        returncode = run_router_tasks(
+            routers_text,
+            query.tasks_json(),
+            device_type_default,
+            engine=engine,
+            concurrency=concurrency,
+            device_timeout=device_timeout,
+            out=out,
+            err=err,
+            lease=lease,
+            report=parsing.submit,
+            credentials=credentials,
+            preflight=preflight,
+            run_budget=run_budget,
+            cancel_file=cancel_file,
+            autodetect=autodetect,
+            max_age=max_age,
+            force_refresh=force_refresh,
+        )
+        results = parsing.results()
+
+    if returncode != 0:
+        return returncode
+    table = aggregate_table([asdict(r) for r in results])
+    print(f"Query table: {len(table['rows'])} row(s), {len(table['columns'])} column(s)", file=out, flush=True)
+    if results_file:
+        write_results_jsonl(results_file, results, summarize_results(results))
+    return 0
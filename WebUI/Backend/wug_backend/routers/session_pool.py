@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from netmiko import ConnectHandler
+
+from constants import ROUTER_SESSION_IDLE_TIMEOUT, ROUTER_SESSION_KEEPALIVE, ROUTER_SESSION_POOL_MAX
+
+
+class _PooledSession:
+    def __init__(self, key: tuple[str, str, str], conn, secret_digest: str) -> None:
+        self.key = key
+        self.conn = conn
+        self.secret_digest = secret_digest
+        self.last_used = time.monotonic()
+
+
+def _digest(password: str, secret: str) -> str:
+    return hashlib.sha256(f"{password}\0{secret}".encode("utf-8")).hexdigest()
+
+
+class SshSessionPool:
+    """
+    Long-lived netmiko sessions keyed by (host, username, device_type), for
+    in-process router runs and backups that keep hitting the same devices.
+
+    A lease hands out one session to one caller at a time. Before a pooled
+    session is handed out again it is checked (alive, out of config mode,
+    still in enable) and re-enabled if privilege dropped. A session is only reused when the
+    password and enable secret match the ones it logged in with. Sessions
+    that raised are closed rather than returned. Idle sessions are kept
+    alive with SSH keepalives, closed after `idle_timeout`, and evicted
+    least-recently-used once more than `max_sessions` are idle.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = ROUTER_SESSION_POOL_MAX,
+        idle_timeout: float = ROUTER_SESSION_IDLE_TIMEOUT,
+        keepalive: int = ROUTER_SESSION_KEEPALIVE,
+        connect: Callable[..., object] = ConnectHandler,
+    ) -> None:
+        self._max_sessions = max(1, int(max_sessions))
+        self._idle_timeout = float(idle_timeout)
+        self._keepalive = int(keepalive)
+        self._connect = connect
+        self._idle: OrderedDict[int, _PooledSession] = OrderedDict()
+        self._busy = 0
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._reaper: threading.Thread | None = None
+        self._stats = {"hits": 0, "misses": 0, "evicted": 0, "expired": 0, "discarded": 0}
+
+    # ---------- lifecycle ----------
+    def _ensure_reaper(self) -> None:
+        if self._reaper is None:
+            self._reaper = threading.Thread(target=self._reap_loop, name="ssh-session-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self) -> None:
+        interval = max(5.0, min(self._idle_timeout / 2, 60.0))
+        while not self._closed.wait(interval):
+            self.reap()
+
+    def reap(self) -> int:
+        """Close idle sessions past the idle timeout. Returns how many were closed."""
+        now = time.monotonic()
+        with self._lock:
+            stale = [
+                sid for sid, s in self._idle.items()
+                if now - s.last_used > self._idle_timeout
+            ]
+            expired = [self._idle.pop(sid) for sid in stale]
+            self._stats["expired"] += len(expired)
+        for session in expired:
+            self._close(session)
+        return len(expired)
+
+    def close_all(self) -> None:
+        self._closed.set()
+        with self._lock:
+            sessions = list(self._idle.values())
+            self._idle.clear()
+        for session in sessions:
+            self._close(session)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "idle": len(self._idle), "busy": self._busy}
+
+    # ---------- sessions ----------
+    @staticmethod
+    def _close(session: _PooledSession) -> None:
+        try:
+            session.conn.disconnect()
+        except Exception:
+            pass
+
+    def _open(self, key: tuple[str, str, str], password: str, secret: str) -> _PooledSession:
+        host, username, device_type = key
+        conn = self._connect(
+            device_type=device_type,
+            host=host,
+            username=username,
+            password=password,
+            secret=secret,
+            keepalive=self._keepalive,
+        )
+        return _PooledSession(key, conn, _digest(password, secret))
+
+    def _take_idle(self, key: tuple[str, str, str], secret_digest: str) -> _PooledSession | None:
+        with self._lock:
+            # Most recently used first: it is the least likely to have been dropped by the device.
+            for sid in reversed(self._idle):
+                session = self._idle[sid]
+                if session.key == key:
+                    del self._idle[sid]
+                    if session.secret_digest != secret_digest:
+                        self._stats["discarded"] += 1
+                        break
+                    return session
+            else:
+                return None
+        self._close(session)
+        return None
+
+    @staticmethod
+    def _ready(session: _PooledSession) -> None:
+        conn = session.conn
+        if not conn.is_alive():
+            raise ConnectionError("session no longer alive")
+        if conn.check_config_mode():
+            conn.exit_config_mode()
+        if not conn.check_enable_mode():
+            conn.enable()
+
+    def _release(self, session: _PooledSession, reusable: bool) -> None:
+        evicted: list[_PooledSession] = []
+        with self._lock:
+            self._busy -= 1
+            if reusable and not self._closed.is_set():
+                session.last_used = time.monotonic()
+                self._idle[id(session)] = session
+                while len(self._idle) > self._max_sessions:
+                    evicted.append(self._idle.popitem(last=False)[1])
+                self._stats["evicted"] += len(evicted)
+            else:
+                evicted.append(session)
+                self._stats["discarded"] += 1
+        for s in evicted:
+            self._close(s)
+
+    @contextmanager
+    def lease(self, host: str, username: str, password: str, secret: str = "", device_type: str = "cisco_ios") -> Iterator:
+        """Yield a logged-in connection in enable mode; it goes back to the pool if the block did not raise."""
+        key = (host, username, device_type)
+        secret = secret or password
+        digest = _digest(password, secret)
+        self._ensure_reaper()
+
+        session = self._take_idle(key, digest)
+        if session is not None:
+            try:
+                self._ready(session)
+                with self._lock:
+                    self._stats["hits"] += 1
+            except Exception:
+                with self._lock:
+                    self._stats["discarded"] += 1
+                self._close(session)
+                session = None
+        if session is None:
+            session = self._open(key, password, secret)
+            try:
+                session.conn.enable()
+            except Exception:
+                self._close(session)
+                raise
+            with self._lock:
+                self._stats["misses"] += 1
+
+        with self._lock:
+            self._busy += 1
+        reusable = False
+        try:
+            yield session.conn
+            reusable = True
+        finally:
+            self._release(session, reusable)
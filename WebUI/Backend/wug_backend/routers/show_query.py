@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Callable
+
+import textfsm
+
+try:
+    from ttp import ttp
+except ImportError:  # optional: only needed when a query selects the ttp parser
+    ttp = None
+
+from constants import ROUTER_QUERY_PARSE_WORKERS, ROUTER_QUERY_PARSERS
+from wug_backend.routers.exec_cache import is_read_only
+from wug_backend.routers.fanout import DEVICE_STATUS_FAILED, DeviceRunResult
+from wug_backend.routers.task_plan import compile_task_plan
+
+# Columns every table row starts with; parsed fields follow in the order they were first seen.
+TABLE_BASE_COLUMNS = ("device", "device_status", "device_error")
+
+
+@dataclass(frozen=True)
+class ShowQuery:
+    """
+    One read-only command for every router plus how to parse its output:
+    a TextFSM template (ntc-templates' index picks one by platform and
+    command when none is given) or a TTP template. Checked when built, so
+    a command that is not read-only (see exec_cache.is_read_only) or a bad
+    template fails the request instead of every device.
+    """
+
+    command: str
+    parser: str = ROUTER_QUERY_PARSERS[0]
+    template: str = ""
+
+    def __post_init__(self) -> None:
+        command = (self.command or "").strip()
+        if not command or "\n" in command:
+            raise ValueError("A query needs exactly one command")
+        if not is_read_only(command):
+            raise ValueError("A query command must be read-only (e.g. show ...), without redirect/tee/append")
+        object.__setattr__(self, "command", command)
+        if self.parser not in ROUTER_QUERY_PARSERS:
+            raise ValueError(f"parser must be one of: {', '.join(ROUTER_QUERY_PARSERS)}")
+        if self.parser == "ttp":
+            if ttp is None:
+                raise ValueError("The ttp parser needs the ttp package (pip install ttp)")
+            if not self.template.strip():
+                raise ValueError("The ttp parser needs a template")
+        elif self.template.strip():
+            try:
+                textfsm.TextFSM(io.StringIO(self.template))
+            except textfsm.TextFSMTemplateError as e:
+                raise ValueError(f"Invalid TextFSM template: {e}") from e
+
+    def tasks(self) -> list[dict]:
+        """The task list run on every router: the command as a single exec task."""
+        return [{"name": "query", "type": "exec", "command": self.command}]
+
+    def tasks_json(self) -> str:
+        return json.dumps(self.tasks())
+
+    def command_output(self, device_output: str) -> str:
+        """The command's own output out of a device's run output (connect lines and task header dropped)."""
+        header = f"=== {compile_task_plan(self.tasks()).steps[0].title('TASK', 'TASKS')} ===\n"
+        _, found, text = device_output.partition(header)
+        return text if found else ""
+
+
+def _platform(device_type: str) -> str:
+    return device_type[: -len("_ssh")] if device_type.endswith("_ssh") else device_type
+
+
+def parse_show_output(command: str, parser: str, template: str, device_type: str, output: str) -> list[dict]:
+    """Rows parsed from one device's output. Module level so it can run in a parse worker process."""
+    if parser == "ttp":
+        engine = ttp(data=output, template=template)
+        engine.parse()
+        return [row for row in engine.result(structure="flat_list") if isinstance(row, dict)]
+    if template:
+        fsm = textfsm.TextFSM(io.StringIO(template))
+        return [dict(zip((h.lower() for h in fsm.header), row)) for row in fsm.ParseText(output)]
+    from ntc_templates.parse import parse_output
+
+    return parse_output(platform=_platform(device_type), command=command, data=output)
+
+
+class QueryParsePool:
+    """
+    Parses device results as the fan-out hands them over, in a pool of
+    worker processes so TextFSM/TTP never competes with the SSH threads,
+    and reports each one (with its rows) as soon as it is parsed. A device
+    whose output cannot be parsed is reported failed with the parser's
+    exception. `workers` 0 parses in the caller's thread. Workers are
+    spawned, never forked, so a pool started inside the API process does not
+    copy its threads and locks.
+    """
+
+    def __init__(
+        self,
+        query: ShowQuery,
+        report: Callable[[DeviceRunResult], None],
+        workers: int = ROUTER_QUERY_PARSE_WORKERS,
+    ) -> None:
+        self._query = query
+        self._report = report
+        self._workers = max(0, int(workers))
+        self._executor: ProcessPoolExecutor | None = None
+        self._submitted = 0
+        self._results: list[DeviceRunResult] = []
+        self._cond = threading.Condition()
+
+    def __enter__(self) -> QueryParsePool:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _args(self, result: DeviceRunResult) -> tuple:
+        q = self._query
+        return q.command, q.parser, q.template, result.device_type, q.command_output(result.output)
+
+    def _done(self, result: DeviceRunResult, rows: list[dict] | None, error: Exception | None) -> None:
+        if error is not None:
+            result = replace(
+                result,
+                ok=False,
+                status=DEVICE_STATUS_FAILED,
+                error=f"Could not parse output: {error}",
+                error_class=type(error).__name__,
+            )
+        else:
+            result = replace(result, rows=rows or [])
+        with self._cond:
+            self._results.append(result)
+            self._report(result)
+            self._cond.notify_all()
+
+    def submit(self, result: DeviceRunResult) -> None:
+        """Parse a finished device (failed ones are passed straight through)."""
+        with self._cond:
+            self._submitted += 1
+        if not result.ok:
+            self._done(result, None, None)
+            return
+        if not self._workers:
+            try:
+                rows = parse_show_output(*self._args(result))
+            except Exception as e:
+                self._done(result, None, e)
+                return
+            self._done(result, rows, None)
+            return
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        future = self._executor.submit(parse_show_output, *self._args(result))
+
+        def _finished(f: Future) -> None:
+            if f.cancelled():
+                return
+            error = f.exception()
+            self._done(result, None if error else f.result(), error)
+
+        future.add_done_callback(_finished)
+
+    def results(self) -> list[DeviceRunResult]:
+        """Every device, parsed, in the order parsing finished; waits for parses still running."""
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._results) >= self._submitted)
+            return list(self._results)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+def _cell(value) -> str:
+    if isinstance(value, (list, tuple)):
+        return "; ".join(str(v) for v in value)
+    return "" if value is None else str(value)
+
+
+def aggregate_table(devices: list[dict]) -> dict:
+    """
+    One table over a query's device results (DeviceRunResult dicts): a row
+    per parsed record, led by the device it came from, and a single row for
+    a device with no records so failures show up in the table too.
+    """
+    columns = list(TABLE_BASE_COLUMNS)
+    seen = set(columns)
+    rows = []
+    for d in devices:
+        base = {"device": d.get("ip", ""), "device_status": d.get("status", ""), "device_error": d.get("error", "")}
+        records = d.get("rows") or []
+        if not records:
+            rows.append(base)
+            continue
+        for record in records:
+            for key in record:
+                if key not in seen:
+                    seen.add(key)
+                    columns.append(key)
+            rows.append({**record, **base})
+    return {"columns": columns, "rows": rows}
+
+
+def table_csv(table: dict) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=table["columns"], extrasaction="ignore")
+    writer.writeheader()
+    for row in table["rows"]:
+        writer.writerow({column: _cell(row.get(column)) for column in table["columns"]})
+    return buffer.getvalue()
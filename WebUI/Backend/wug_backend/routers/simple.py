@@ -1,17 +1,46 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from contextlib import nullcontext
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Callable, ContextManager
 
 from netmiko import ConnectHandler
 
 from constants import SSH_ENABLE_PASSWORD, SSH_PASSWORD, SSH_USERNAME
+from wug_backend.routers.file_push import FilePushUnavailable, push_config_file, wants_file_push
 
 
 @dataclass(frozen=True)
 class RouterTarget:
+    """`tags` are the line's key=value fields (e.g. site=nyc, aaa=tacacs-east), used by the connect governor."""
+
     ip: str
     device_type: str
+    tags: tuple[tuple[str, str], ...] = ()
+
+    def tag(self, name: str) -> str:
+        return dict(self.tags).get(name, "")
+
+
+@dataclass(frozen=True)
+class SshCredentials:
+    username: str
+    password: str = field(repr=False)
+    secret: str = field(default="", repr=False)
+
+
+# phase(name) -> context manager timing one step of a device run (see DeviceContext.phase)
+PhaseTimer = Callable[[str], ContextManager]
+
+
+def untimed(name: str) -> ContextManager:
+    return nullcontext()
+
+
+def default_ssh_credentials() -> SshCredentials:
+    """Credentials a runner subprocess was started with (WUG_SSH_* environment)."""
+    return SshCredentials(SSH_USERNAME, SSH_PASSWORD, SSH_ENABLE_PASSWORD)
 
 
 class RouterListParser:
@@ -24,16 +53,15 @@ class RouterListParser:
 
         normalized = raw.replace("|", ",").replace("\t", ",")
         parts = [p.strip() for p in normalized.split(",") if p.strip()]
-
         if len(parts) == 1:
-            space_parts = [p for p in parts[0].split(" ") if p.strip()]
-            if len(space_parts) >= 2:
-                return RouterTarget(ip=space_parts[0].strip(), device_type=space_parts[1].strip())
-            return RouterTarget(ip=parts[0], device_type=default_device_type)
+            parts = [p for p in parts[0].split(" ") if p.strip()]
+
+        tags = tuple((k.strip(), v.strip()) for k, _, v in (p.partition("=") for p in parts[1:] if "=" in p))
+        fields = [parts[0], *(p for p in parts[1:] if "=" not in p)]
 
-        ip = parts[0]
-        dev = parts[1] if len(parts) >= 2 else default_device_type
-        return RouterTarget(ip=ip, device_type=(dev or default_device_type))
+        ip = fields[0]
+        dev = fields[1] if len(fields) >= 2 else default_device_type
+        return RouterTarget(ip=ip, device_type=(dev or default_device_type), tags=tags)
 
     def parse_from_text(self, text: str, default_device_type: str) -> list[RouterTarget]:
         routers: list[RouterTarget] = []
@@ -45,21 +73,54 @@ class RouterListParser:
 
 
 class SimpleConfigPusher:
-    def push_from_file(self, router: RouterTarget, config_file: str, device_type_default: str) -> None:
+    def push_from_file(
+        self,
+        router: RouterTarget,
+        config_file: str,
+        device_type_default: str,
+        log: Callable[[str], None] = print,
+        on_connect: Callable | None = None,
+        session=None,
+        credentials: SshCredentials | None = None,
+        phase: PhaseTimer = untimed,
+    ) -> str:
+        """
+        Push the config file to one router; `session` is an already-open connection (left open).
+        Large configs go over SCP and are applied in one step (see file_push) where the platform allows.
+        """
+        credentials = credentials or default_ssh_credentials()
         device_type = (router.device_type or device_type_default).strip() or device_type_default
-        print("\\n=== Connecting to {router.ip} ({device_type}) ===")
+        log(f"\n=== Connecting to {router.ip} ({device_type}) ===")
 
         device = {
             "device_type": device_type,
             "ip": router.ip,
-            "username": SSH_USERNAME,
-            "password": SSH_PASSWORD,
-            "secret": SSH_ENABLE_PASSWORD,
+            "username": credentials.username,
+            "password": credentials.password,
+            "secret": credentials.secret or credentials.password,
         }
 
-        conn = ConnectHandler(**device)
-        conn.enable()
-        output = conn.send_config_from_file(config_file)
-        conn.disconnect()
-        print(output, flush=True)
-
+        if session is None:
+            with phase("connect"):
+                conn = ConnectHandler(**device)
+        else:
+            conn = session
+        try:
+            if on_connect:
+                on_connect(conn)
+            with phase("enable"):
+                conn.enable()
+            if wants_file_push(device_type, config_file):
+                try:
+                    return push_config_file(conn, config_file, log, phase)
+                except FilePushUnavailable as e:
+                    log(f"File transfer to {router.ip} unavailable ({e}); pushing line by line")
+            with phase("config"):
+                return conn.send_config_from_file(config_file)
+        finally:
+            if session is None:
+                with phase("disconnect"):
+                    try:
+                        conn.disconnect()
+                    except Exception:
+                        pass
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import re
+import string
+from dataclasses import dataclass, field
+
+from wug_backend.routers.prompts import StepMatcher
+
+TASK_TYPES = ("config", "exec", "interactive_exec", "write_memory")
+
+# Placeholders an interactive_exec answer can always use; a task's own `context` adds more.
+BASE_CONTEXT_KEYS = ("hostname", "ip", "timestamp")
+
+
+class TaskPlanError(ValueError):
+    def __init__(self, problems: list[str]) -> None:
+        super().__init__("; ".join(problems))
+        self.problems = problems
+
+
+@dataclass(frozen=True)
+class PlanStep:
+    """
+    One unit of device work. Adjacent config tasks share a step (and one
+    config session); `numbers`/`names` are the tasks it covers, 1-based as
+    in the task list.
+    """
+
+    type: str
+    numbers: tuple[int, ...]
+    names: tuple[str, ...]
+    commands: tuple[str, ...] = ()
+    command: str = ""
+    steps: tuple[dict, ...] = ()
+    context: dict = field(default_factory=dict)
+    matcher: StepMatcher | None = None
+
+    @property
+    def label(self) -> str:
+        """Timing phase name: task_3, or task_3-5 for a merged config session."""
+        first, last = self.numbers[0], self.numbers[-1]
+        return f"task_{first}" if first == last else f"task_{first}-{last}"
+
+    def title(self, singular: str = "task", plural: str = "tasks") -> str:
+        """e.g. "task 2: backup (type=exec)" or "tasks 3-5: ntp, snmp, acl (type=config)"."""
+        if len(self.numbers) == 1:
+            return f"{singular} {self.numbers[0]}: {self.names[0]} (type={self.type})"
+        return f"{plural} {self.numbers[0]}-{self.numbers[-1]}: {', '.join(self.names)} (type={self.type})"
+
+
+@dataclass(frozen=True)
+class TaskPlan:
+    steps: tuple[PlanStep, ...]
+    task_count: int
+
+
+def _placeholders(template: str) -> set[str]:
+    return {name.split(".")[0].split("[")[0] for _, name, _, _ in string.Formatter().parse(template) if name}
+
+
+def _check_steps(number: int, task: dict, problems: list[str]) -> None:
+    known = set(BASE_CONTEXT_KEYS) | set(task.get("context") or {})
+    for i, step in enumerate(task["steps"], start=1):
+        where = f"task {number} step {i}"
+        if not isinstance(step, dict):
+            problems.append(f"{where}: must be an object with prompt and answer")
+            continue
+        if step.get("pattern"):
+            try:
+                if re.compile(step["pattern"]).groups:
+                    problems.append(f"{where}: pattern must not use capturing groups; use (?:...)")
+            except re.error as e:
+                problems.append(f"{where}: invalid pattern: {e}")
+        try:
+            missing = _placeholders(step.get("answer") or "") - known
+        except ValueError as e:
+            problems.append(f"{where}: invalid answer: {e}")
+            continue
+        if missing:
+            problems.append(f"{where}: unknown placeholder(s) in answer: {', '.join(sorted(missing))}")
+
+
+def _validate(number: int, task, problems: list[str]) -> bool:
+    if not isinstance(task, dict):
+        problems.append(f"task {number}: must be an object")
+        return False
+    ttype = task.get("type")
+    if ttype not in TASK_TYPES:
+        problems.append(f"task {number}: unknown type {ttype!r}")
+        return False
+    if ttype == "config":
+        commands = task.get("commands")
+        if isinstance(commands, str):
+            commands = [commands]
+        if not commands or not all(isinstance(c, str) for c in commands):
+            problems.append(f"task {number}: config needs a non-empty commands list")
+            return False
+    elif ttype == "exec":
+        if not task.get("command"):
+            problems.append(f"task {number}: exec needs a command")
+            return False
+    elif ttype == "interactive_exec":
+        if not task.get("command") or not isinstance(task.get("steps"), list) or not task["steps"]:
+            problems.append(f"task {number}: interactive_exec needs a command and a steps list")
+            return False
+        before = len(problems)
+        _check_steps(number, task, problems)
+        return len(problems) == before
+    return True
+
+
+def compile_task_plan(tasks) -> TaskPlan:
+    """
+    Validate the tasks JSON and turn it into the per-device steps, once per
+    run: adjacent config tasks are merged into one config session and
+    interactive_exec prompts are compiled up front. Raises TaskPlanError
+    listing every problem, before any device is contacted.
+    """
+    if not isinstance(tasks, list):
+        raise TaskPlanError(["Tasks must contain a JSON list."])
+
+    problems: list[str] = []
+    steps: list[PlanStep] = []
+    for number, task in enumerate(tasks, start=1):
+        if not _validate(number, task, problems):
+            continue
+        ttype = task["type"]
+        name = task.get("name", f"task_{number}")
+
+        if ttype == "config":
+            commands = task["commands"]
+            commands = (commands,) if isinstance(commands, str) else tuple(commands)
+            prev = steps[-1] if steps else None
+            if prev is not None and prev.type == "config" and prev.numbers[-1] == number - 1:
+                steps[-1] = PlanStep("config", prev.numbers + (number,), prev.names + (name,), prev.commands + commands)
+            else:
+                steps.append(PlanStep("config", (number,), (name,), commands))
+        elif ttype == "exec":
+            steps.append(PlanStep("exec", (number,), (name,), command=task["command"]))
+        elif ttype == "interactive_exec":
+            task_steps = tuple(task["steps"])
+            steps.append(
+                PlanStep(
+                    "interactive_exec",
+                    (number,),
+                    (name,),
+                    command=task["command"],
+                    steps=task_steps,
+                    context=dict(task.get("context") or {}),
+                    matcher=StepMatcher.compile(list(task_steps)),
+                )
+            )
+        else:
+            steps.append(PlanStep("write_memory", (number,), (name,)))
+
+    if problems:
+        raise TaskPlanError(problems)
+    return TaskPlan(tuple(steps), len(tasks))
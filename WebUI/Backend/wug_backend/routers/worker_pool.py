@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+from dataclasses import asdict
+from typing import Callable, TextIO
+
+from constants import (
+    ROUTER_RUN_KILL_GRACE,
+    ROUTER_WORKER_ACQUIRE_TIMEOUT,
+    ROUTER_WORKER_MAX_JOBS,
+    ROUTER_WORKER_PROCESSES,
+)
+from wug_backend.routers.fanout import DeviceRunResult
+from wug_backend.routers.simple import SshCredentials
+
+WORKER_COMMAND = ["python", "-m", "wug_backend.runners.router_worker"]
+
+
+class _Worker:
+    def __init__(self, command: list[str]) -> None:
+        self.proc = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+            env={**os.environ, "PYTHONUNBUFFERED": "1"},
+        )
+        self.pid: int | None = None
+        self.jobs = 0
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def receive(self) -> dict | None:
+        line = self.proc.stdout.readline()
+        return json.loads(line) if line else None
+
+    def wait_ready(self) -> None:
+        if self.pid is not None:
+            return
+        message = self.receive()
+        if not message or message.get("type") != "ready":
+            raise RuntimeError("router worker exited before it was ready")
+        self.pid = message["pid"]
+
+    def send(self, job: dict) -> None:
+        self.proc.stdin.write(json.dumps(job) + "\n")
+        self.proc.stdin.flush()
+
+    def stop(self) -> None:
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=5)
+        except Exception:
+            self.proc.kill()
+
+
+class RunnerWorkerPool:
+    """
+    Long-lived router_worker processes with netmiko already imported, so a
+    router run starts on a warm interpreter instead of `python -m` plus the
+    paramiko/cryptography/textfsm imports. Jobs go to a worker over its
+    stdin and come back as JSON lines (output, per-device results, exit
+    code); credentials travel inside the job, never in the environment.
+
+    One job runs per worker at a time; callers wait up to `acquire_timeout`
+    seconds for a free worker. A worker that died (also while starting) is
+    replaced, and each worker is recycled after `max_jobs_per_worker` jobs. A job still running `kill_grace` seconds
+    past its run budget has its worker killed (and replaced).
+    """
+
+    def __init__(
+        self,
+        size: int = ROUTER_WORKER_PROCESSES,
+        max_jobs_per_worker: int = ROUTER_WORKER_MAX_JOBS,
+        command: list[str] | None = None,
+        kill_grace: float = ROUTER_RUN_KILL_GRACE,
+        acquire_timeout: float = ROUTER_WORKER_ACQUIRE_TIMEOUT,
+    ) -> None:
+        self._size = max(1, int(size))
+        self._max_jobs = max(1, int(max_jobs_per_worker))
+        self._kill_grace = kill_grace
+        self._acquire_timeout = acquire_timeout
+        self._command = command or WORKER_COMMAND
+        self._idle: queue.Queue[_Worker] = queue.Queue()
+        self._workers: set[_Worker] = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {"jobs": 0, "replaced": 0, "recycled": 0, "killed": 0}
+
+    def start(self) -> None:
+        for _ in range(self._size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._command)
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _retire(self, worker: _Worker) -> None:
+        with self._lock:
+            self._workers.discard(worker)
+        worker.stop()
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        self._retire(worker)
+        with self._lock:
+            self._stats["replaced"] += 1
+        return self._spawn()
+
+    def _acquire(self) -> _Worker:
+        try:
+            worker = self._idle.get(timeout=self._acquire_timeout or None)
+        except queue.Empty:
+            raise RuntimeError(f"No router worker became free within {self._acquire_timeout:g}s") from None
+        if not worker.alive():
+            worker = self._replace(worker)
+        try:
+            worker.wait_ready()
+        except Exception:
+            # Keep the slot: a fresh worker goes back for the next caller.
+            self._idle.put(self._replace(worker))
+            raise
+        return worker
+
+    def _release(self, worker: _Worker, healthy: bool) -> None:
+        if self._closed:
+            self._retire(worker)
+            return
+        if healthy and worker.jobs < self._max_jobs:
+            self._idle.put(worker)
+            return
+        self._retire(worker)
+        with self._lock:
+            self._stats["recycled" if healthy else "replaced"] += 1
+        self._idle.put(self._spawn())
+
+    def run(
+        self,
+        job: dict,
+        out: TextIO | None = None,
+        err: TextIO | None = None,
+        report: Callable[[DeviceRunResult], None] | None = None,
+        results_file: str | None = None,
+        cancel_file: str | None = None,
+    ) -> int:
+        """Run a job (see job_for) on a warm worker; same contract as the runs.py bodies."""
+        if self._closed:
+            raise RuntimeError("Router worker pool is shut down")
+        out = out or sys.stdout
+        err = err or sys.stderr
+        worker = self._acquire()
+        healthy = False
+        watchdog = None
+        budget = float(job.get("settings", {}).get("run_budget") or 0)
+        if budget:
+            watchdog = threading.Timer(budget + self._kill_grace, self._kill, args=(worker,))
+            watchdog.daemon = True
+            watchdog.start()
+        try:
+            worker.send({**job, "report": report is not None, "results_file": results_file, "cancel_file": cancel_file})
+            worker.jobs += 1
+            with self._lock:
+                self._stats["jobs"] += 1
+            while True:
+                message = worker.receive()
+                if message is None:
+                    if watchdog is not None and not watchdog.is_alive():
+                        print(f"ERROR: run killed {self._kill_grace:g}s after its {budget:g}s budget", file=err)
+                    else:
+                        print("ERROR: router worker exited during the run", file=err)
+                    return 1
+                kind = message.get("type")
+                if kind == "output":
+                    (err if message["stream"] == "stderr" else out).write(message["text"])
+                elif kind == "device" and report is not None:
+                    report(DeviceRunResult(**message["result"]))
+                elif kind == "done":
+                    healthy = True
+                    return message["returncode"]
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+            self._release(worker, healthy)
+
+    def _kill(self, worker: _Worker) -> None:
+        with self._lock:
+            self._stats["killed"] += 1
+        worker.proc.kill()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "workers": len(self._workers), "idle": self._idle.qsize()}
+
+    def shutdown(self) -> None:
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+
+
+def job_for(
+    kind: str,
+    routers: str,
+    device_type_default: str,
+    settings: dict,
+    credentials: SshCredentials,
+    tasks: str | None = None,
+    config_file: str | None = None,
+    query: dict | None = None,
+    exec_cache: dict | None = None,
+) -> dict:
+    """
+    A router_worker job: `kind` is "interactive" (tasks JSON), "simple"
+    (config file path) or "query" (ShowQuery fields). `exec_cache` holds
+    the max_age/force_refresh of interactive and query runs.
+    """
+    return {
+        "kind": kind,
+        "routers": routers,
+        "tasks": tasks,
+        "config_file": config_file,
+        "query": query,
+        "exec_cache": exec_cache,
+        "device_type_default": device_type_default,
+        "settings": settings,
+        "credentials": asdict(credentials),
+    }
@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+import sys
+
+from wug_backend.bulk.monitors import run_bulk_monitor_cli
+
+
+def main() -> None:
+    raise SystemExit(run_bulk_monitor_cli(sys.argv))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,20 @@
 from __future__ import annotations
 
-import json
 import os
-import sys
-from datetime import datetime
 
-from wug_backend.routers.interactive import InteractiveCommandRunner
-from wug_backend.routers.simple import RouterListParser
+from constants import ENV_WUG_ROUTER_RESULTS
+from wug_backend.routers.fanout import (
+    autodetect_from_env,
+    device_events_from_env,
+    exec_cache_from_env,
+    fanout_settings_from_env,
+    max_concurrency_for,
+    preflight_from_env,
+    print_device_event,
+    run_limits_from_env,
+    ssh_engine_from_env,
+)
+from wug_backend.routers.runs import run_router_tasks
 
 
 def main() -> None:
@@ -14,50 +22,29 @@ def main() -> None:
     tasks_text = os.environ.get("WUG_TASKS")
     device_type_default = (os.environ.get("WUG_DEVICE_TYPE_DEFAULT") or "cisco_ios").strip() or "cisco_ios"
 
-    if not router_list_text:
-        print("ERROR: No routers data provided", file=sys.stderr)
-        raise SystemExit(1)
-
-    parser = RouterListParser()
-    routers = parser.parse_from_text(router_list_text, device_type_default)
-    if not routers:
-        print("ERROR: No router IPs found", file=sys.stderr)
-        raise SystemExit(1)
-
-    print(f"Found {len(routers)} router(s)")
-
-    if not tasks_text:
-        print("ERROR: No tasks data provided", file=sys.stderr)
-        raise SystemExit(1)
-
-    try:
-        tasks = json.loads(tasks_text)
-    except Exception as e:
-        print(f"ERROR: Could not parse tasks JSON: {e}", file=sys.stderr)
-        raise SystemExit(1)
-
-    if not isinstance(tasks, list):
-        print("ERROR: Tasks must contain a JSON list.", file=sys.stderr)
-        raise SystemExit(1)
-
-    print(f"Loaded {len(tasks)} task(s)")
-
-    timestamp_global = datetime.now().strftime("%Y%m%d-%H%M%S")
-    runner = InteractiveCommandRunner()
-
-    for r in routers:
-        log_output = ""
-        try:
-            log_output = runner.execute_tasks(r, tasks=tasks, device_type_default=device_type_default, timestamp_global=timestamp_global)
-            print(log_output, end="")
-            print(f"Done with {r.ip} ({r.ip})")
-        except Exception as e:
-            err_msg = f"ERROR on {r.ip}: {e}"
-            print(err_msg, file=sys.stderr)
-            log_output += "\n" + err_msg + "\n"
-            print(log_output, end="")
+    engine = ssh_engine_from_env()
+    concurrency, device_timeout = fanout_settings_from_env(max_concurrency_for(engine))
+    run_budget, cancel_file = run_limits_from_env()
+    max_age, force_refresh = exec_cache_from_env()
+    raise SystemExit(
+        run_router_tasks(
+            router_list_text,
+            tasks_text,
+            device_type_default,
+            engine=engine,
+            concurrency=concurrency,
+            device_timeout=device_timeout,
+            report=print_device_event if device_events_from_env() else None,
+            results_file=os.environ.get(ENV_WUG_ROUTER_RESULTS) or None,
+            preflight=preflight_from_env(),
+            run_budget=run_budget,
+            cancel_file=cancel_file,
+            autodetect=autodetect_from_env(),
+            max_age=max_age,
+            force_refresh=force_refresh,
+        )
+    )
 
 
 if __name__ == "__main__":
     main()
-
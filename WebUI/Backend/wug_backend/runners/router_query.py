@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import os
+
+from constants import ENV_WUG_QUERY_COMMAND, ENV_WUG_QUERY_PARSER, ENV_WUG_QUERY_TEMPLATE, ENV_WUG_ROUTER_RESULTS
+from wug_backend.routers.fanout import (
+    autodetect_from_env,
+    device_events_from_env,
+    exec_cache_from_env,
+    fanout_settings_from_env,
+    max_concurrency_for,
+    preflight_from_env,
+    print_device_event,
+    run_limits_from_env,
+    ssh_engine_from_env,
+)
+from wug_backend.routers.runs import run_show_query
+from wug_backend.routers.show_query import ShowQuery
+
+
+def main() -> None:
+    router_list_text = os.environ.get("WUG_ROUTERS")
+    device_type_default = (os.environ.get("WUG_DEVICE_TYPE_DEFAULT") or "cisco_ios").strip() or "cisco_ios"
+    query = ShowQuery(
+        os.environ.get(ENV_WUG_QUERY_COMMAND, ""),
+        os.environ.get(ENV_WUG_QUERY_PARSER) or "textfsm",
+        os.environ.get(ENV_WUG_QUERY_TEMPLATE, ""),
+    )
+
+    engine = ssh_engine_from_env()
+    concurrency, device_timeout = fanout_settings_from_env(max_concurrency_for(engine))
+    run_budget, cancel_file = run_limits_from_env()
+    max_age, force_refresh = exec_cache_from_env()
+    raise SystemExit(
+        run_show_query(
+            router_list_text,
+            query,
+            device_type_default,
+            engine=engine,
+            concurrency=concurrency,
+            device_timeout=device_timeout,
+            report=print_device_event if device_events_from_env() else None,
+            results_file=os.environ.get(ENV_WUG_ROUTER_RESULTS) or None,
+            preflight=preflight_from_env(),
+            run_budget=run_budget,
+            cancel_file=cancel_file,
+            autodetect=autodetect_from_env(),
+            max_age=max_age,
+            force_refresh=force_refresh,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,18 @@ from __future__ import annotations
 import os
 import sys
 
-from wug_backend.routers.simple import RouterListParser, SimpleConfigPusher
+from constants import ENV_WUG_ROUTER_RESULTS
+from wug_backend.routers.fanout import (
+    autodetect_from_env,
+    device_events_from_env,
+    fanout_settings_from_env,
+    max_concurrency_for,
+    preflight_from_env,
+    print_device_event,
+    run_limits_from_env,
+    ssh_engine_from_env,
+)
+from wug_backend.routers.runs import run_config_push
 
 
 def main() -> None:
@@ -16,23 +27,26 @@ def main() -> None:
         raise SystemExit(1)
 
     routers_text = open(router_list_file, "r", encoding="utf-8").read()
-    parser = RouterListParser()
-    routers = parser.parse_from_text(routers_text, device_type_default)
-
-    if not routers:
-        print("ERROR: No router IPs found", file=sys.stderr)
-        raise SystemExit(1)
-
-    print(f"Found {len(routers)} router(s)")
-    pusher = SimpleConfigPusher()
-    for r in routers:
-        try:
-            pusher.push_from_file(r, config_file=config_file, device_type_default=device_type_default)
-        except Exception as e:
-            err_msg = f"ERROR on {r.ip}: {e}"
-            print(err_msg, file=sys.stderr)
+    engine = ssh_engine_from_env()
+    concurrency, device_timeout = fanout_settings_from_env(max_concurrency_for(engine))
+    run_budget, cancel_file = run_limits_from_env()
+    raise SystemExit(
+        run_config_push(
+            routers_text,
+            config_file,
+            device_type_default,
+            engine=engine,
+            concurrency=concurrency,
+            device_timeout=device_timeout,
+            report=print_device_event if device_events_from_env() else None,
+            results_file=os.environ.get(ENV_WUG_ROUTER_RESULTS) or None,
+            preflight=preflight_from_env(),
+            run_budget=run_budget,
+            cancel_file=cancel_file,
+            autodetect=autodetect_from_env(),
+        )
+    )
 
 
 if __name__ == "__main__":
     main()
-
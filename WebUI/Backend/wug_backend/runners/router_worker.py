@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+from dataclasses import asdict
+
+# Imported up front so jobs start on a warm interpreter (netmiko pulls in paramiko, cryptography, textfsm).
+import netmiko  # noqa: F401
+
+from wug_backend.routers.runs import run_config_push, run_router_tasks, run_show_query
+from wug_backend.routers.show_query import ShowQuery
+from wug_backend.routers.simple import SshCredentials
+
+
+class _Channel:
+    """JSON-lines messages to the pool on the worker's stdout."""
+
+    def __init__(self, stream) -> None:
+        self._stream = stream
+
+    def send(self, message: dict) -> None:
+        self._stream.write(json.dumps(message) + "\n")
+        self._stream.flush()
+
+
+class _StreamWriter:
+    """File-like out/err for a runs.py body; every write becomes an `output` message."""
+
+    def __init__(self, channel: _Channel, stream: str) -> None:
+        self._channel = channel
+        self._stream = stream
+
+    def write(self, text: str) -> int:
+        if text:
+            self._channel.send({"type": "output", "stream": self._stream, "text": text})
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+
+def run_job(job: dict, channel: _Channel) -> int:
+    out = _StreamWriter(channel, "stdout")
+    err = _StreamWriter(channel, "stderr")
+
+    def _report(result):
+        channel.send({"type": "device", "result": asdict(result)})
+
+    common = {
+        **job.get("settings", {}),
+        "out": out,
+        "err": err,
+        "report": _report if job.get("report") else None,
+        "credentials": SshCredentials(**job["credentials"]),
+        "results_file": job.get("results_file"),
+        "cancel_file": job.get("cancel_file"),
+    }
+    exec_cache = job.get("exec_cache") or {}
+    if job["kind"] == "interactive":
+        return run_router_tasks(job["routers"], job["tasks"], job["device_type_default"], **common, **exec_cache)
+    if job["kind"] == "simple":
+        return run_config_push(job["routers"], job["config_file"], job["device_type_default"], **common)
+    if job["kind"] == "query":
+        return run_show_query(
+            job["routers"], ShowQuery(**job["query"]), job["device_type_default"], **common, **exec_cache
+        )
+    print(f"ERROR: Unknown job kind: {job['kind']}", file=err)
+    return 1
+
+
+def main() -> None:
+    # stdout carries the protocol; anything else printed in here goes to stderr.
+    channel = _Channel(sys.stdout)
+    sys.stdout = sys.stderr
+    channel.send({"type": "ready", "pid": os.getpid()})
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            returncode = run_job(json.loads(line), channel)
+        except Exception as e:
+            channel.send({"type": "output", "stream": "stderr", "text": f"ERROR: {e}\n"})
+            returncode = 1
+        channel.send({"type": "done", "returncode": returncode})
+
+
+if __name__ == "__main__":
+    main()
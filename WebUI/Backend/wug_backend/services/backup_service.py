@@ -1,35 +1,73 @@
 from __future__ import annotations
 
+import io
 import subprocess
+import time
+
+from constants import BACKUP_RUN_TIMEOUT
+from wug_backend.backup.backup_collector import RUNNING_CONFIG, STARTUP_CONFIG, BackupCollector
+
+
+def _text(output) -> str:
+    if isinstance(output, bytes):
+        return output.decode(errors="replace")
+    return output or ""
 
 
 class BackupService:
-    def run_running_backup(self) -> dict:
-        proc = subprocess.run(
-            ["python", "-m", "wug_backend.runners.backup_running"],
-            capture_output=True,
-            text=True,
-        )
+    def __init__(self, session_pool=None, timeout: float = BACKUP_RUN_TIMEOUT) -> None:
+        # With a session pool the collectors run in this process so they can reuse pooled sessions.
+        self._session_pool = session_pool
+        self._timeout = timeout or None
+
+    def _run_runner(self, module: str) -> dict:
+        try:
+            proc = subprocess.run(["python", "-m", module], capture_output=True, text=True, timeout=self._timeout)
+        except subprocess.TimeoutExpired as e:
+            # subprocess.run has killed the runner; keep what it printed before that (bytes on POSIX).
+            return {
+                "returncode": -1,
+                "stdout": _text(e.stdout),
+                "stderr": f"{_text(e.stderr)}ERROR: {e}\n",
+            }
         return {
             "returncode": proc.returncode,
             "stdout": proc.stdout,
             "stderr": proc.stderr,
         }
 
-    def run_startup_backup(self) -> dict:
-        proc = subprocess.run(
-            ["python", "-m", "wug_backend.runners.backup_startup"],
-            capture_output=True,
-            text=True,
-        )
+    def _run_in_process(self, backup_command) -> dict:
+        out, err = io.StringIO(), io.StringIO()
+        deadline = time.monotonic() + self._timeout if self._timeout else None
+
+        def _stop() -> bool:
+            return deadline is not None and time.monotonic() >= deadline
+
+        try:
+            collector = BackupCollector(session_pool=self._session_pool, out=out, err=err, stop=_stop)
+            returncode = collector.collect(backup_command)
+        except SystemExit as e:
+            returncode = e.code if isinstance(e.code, int) else 1
+        except Exception as e:
+            print(f"ERROR: {e}", file=err)
+            returncode = 1
         return {
-            "returncode": proc.returncode,
-            "stdout": proc.stdout,
-            "stderr": proc.stderr,
+            "returncode": returncode,
+            "stdout": out.getvalue(),
+            "stderr": err.getvalue(),
         }
 
+    def run_running_backup(self) -> dict:
+        if self._session_pool is not None:
+            return self._run_in_process(RUNNING_CONFIG)
+        return self._run_runner("wug_backend.runners.backup_running")
+
+    def run_startup_backup(self) -> dict:
+        if self._session_pool is not None:
+            return self._run_in_process(STARTUP_CONFIG)
+        return self._run_runner("wug_backend.runners.backup_startup")
+
     def run_all_backups(self) -> dict:
         running = self.run_running_backup()
         startup = self.run_startup_backup()
         return {"running": running, "startup": startup}
-
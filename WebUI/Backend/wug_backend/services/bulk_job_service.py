@@ -0,0 +1,333 @@
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+from wug_backend.utils.process_utils import file_lock, process_alive
+
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_SUCCEEDED = "succeeded"
+JOB_STATUS_FAILED = "failed"
+JOB_STATUS_CANCELLED = "cancelled"
+
+JOB_FINAL_STATUSES = (JOB_STATUS_SUCCEEDED, JOB_STATUS_FAILED, JOB_STATUS_CANCELLED)
+
+
+def classify_output_line(line: str) -> str:
+    """Map a runner output line to an event level (matches the SUCCESS:/WARNING:/ERROR: prefixes)."""
+    head = line.lstrip().upper()
+    if head.startswith("SUCCESS:") or head.startswith("DELETED DEVICE"):
+        return "success"
+    if head.startswith("WARNING:"):
+        return "warning"
+    if head.startswith("ERROR:"):
+        return "error"
+    return "info"
+
+
+class BulkJob:
+    def __init__(self, job_id: str, operation: str, user_id: str, config_file: str, log_name: str) -> None:
+        self.id = job_id
+        self.operation = operation
+        self.user_id = user_id
+        self.config_file = config_file
+        self.log_name = log_name
+        # The backend process running the job; after a restart its jobs are only failed once it is gone.
+        self.owner_pid = os.getpid()
+        self.status = JOB_STATUS_QUEUED
+        self.created_at = datetime.now().isoformat()
+        self.started_at: str | None = None
+        self.finished_at: str | None = None
+        self.returncode: int | None = None
+        self.row_count = 0
+        self.counts = {"success": 0, "warning": 0, "error": 0, "info": 0}
+        self.events: list[dict] = []
+        self.stdout_lines: list[str] = []
+        self.stderr_lines: list[str] = []
+        self.cancel_requested = False
+        self.proc: subprocess.Popen | None = None
+        self.lock = threading.Lock()
+
+    def add_event(self, stream: str, line: str) -> None:
+        level = classify_output_line(line)
+        with self.lock:
+            self.events.append(
+                {
+                    "seq": len(self.events) + 1,
+                    "stream": stream,
+                    "level": level,
+                    "message": line,
+                    "timestamp": datetime.now().isoformat(),
+                }
+            )
+            self.counts[level] += 1
+            if stream == "stderr":
+                self.stderr_lines.append(line)
+            else:
+                self.stdout_lines.append(line)
+
+    def events_after(self, seq: int) -> list[dict]:
+        with self.lock:
+            return self.events[max(0, seq):]
+
+    def is_finished(self) -> bool:
+        return self.status in JOB_FINAL_STATUSES
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "operation": self.operation,
+            "user_id": self.user_id,
+            "config_file": self.config_file,
+            "log_name": self.log_name,
+            "owner_pid": self.owner_pid,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "returncode": self.returncode,
+            "row_count": self.row_count,
+            "counts": dict(self.counts),
+            "event_count": len(self.events),
+        }
+
+
+class BulkJobManager:
+    """
+    Runs bulk runner subprocesses in the background and keeps their output as
+    a per-line event stream. Job summaries are persisted to a JSON history file
+    so finished jobs can still be listed after a backend restart; it is
+    shared by every backend worker process and rewritten under a file lock.
+    Only the last `live_limit` finished jobs keep their events in memory.
+    """
+
+    def __init__(
+        self,
+        history_file: Path,
+        output_sanitizer,
+        log_writer,
+        max_workers: int = 2,
+        history_limit: int = 200,
+        logger: Callable[[str], None] | None = None,
+        live_limit: int = 20,
+    ) -> None:
+        self._history_file = history_file
+        self._history_lock_file = history_file.with_name(f"{history_file.name}.lock")
+        self._output_sanitizer = output_sanitizer
+        self._log_writer = log_writer
+        self._history_limit = history_limit
+        self._live_limit = live_limit
+        self._logger = logger or print
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="bulk-job")
+        self._jobs: OrderedDict[str, BulkJob] = OrderedDict()
+        self._jobs_lock = threading.Lock()
+        self._history_lock = threading.Lock()
+
+    # ---------- history ----------
+    def _load_history(self) -> list[dict]:
+        if not self._history_file.exists():
+            return []
+        try:
+            data = json.loads(self._history_file.read_text(encoding="utf-8"))
+            return data if isinstance(data, list) else []
+        except (json.JSONDecodeError, OSError):
+            return []
+
+    def _write_history(self, items: list[dict]) -> None:
+        # Replaced whole so readers that skip the lock never see a half-written file.
+        tmp = self._history_file.with_name(f"{self._history_file.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(items, indent=2), encoding="utf-8")
+        os.replace(tmp, self._history_file)
+
+    def _persist(self, job: BulkJob) -> None:
+        with self._history_lock, file_lock(self._history_lock_file):
+            items = [j for j in self._load_history() if j.get("id") != job.id]
+            items.append(job.summary())
+            items = items[-self._history_limit:]
+            self._write_history(items)
+
+    def fail_interrupted(self) -> int:
+        """
+        Mark jobs the history still shows as queued or running as failed when
+        the backend process that ran them is gone (their runner died with it).
+        Jobs of other live worker processes are left alone. Returns how many.
+        """
+        me = os.getpid()
+        with self._history_lock, file_lock(self._history_lock_file):
+            items = self._load_history()
+            now = datetime.now().isoformat()
+            interrupted = [
+                j
+                for j in items
+                if j.get("status") not in JOB_FINAL_STATUSES
+                # A job recorded under this process's own pid is from an earlier process that had it.
+                and (j.get("owner_pid") == me or not process_alive(int(j.get("owner_pid") or 0)))
+            ]
+            for item in interrupted:
+                item["status"] = JOB_STATUS_FAILED
+                item["finished_at"] = item.get("finished_at") or now
+            if interrupted:
+                self._write_history(items)
+        for item in interrupted:
+            self._logger(f"[BULK JOBS] {item.get('id')} was interrupted by a backend restart; marked failed")
+        return len(interrupted)
+
+    def list_jobs(self, limit: int = 50, user_id: str | None = None) -> list[dict]:
+        """Newest first; only `user_id`'s jobs when given."""
+        by_id = {j.get("id"): j for j in self._load_history()}
+        with self._jobs_lock:
+            for job in self._jobs.values():
+                by_id[job.id] = job.summary()
+        items = sorted(by_id.values(), key=lambda j: j.get("created_at") or "", reverse=True)
+        if user_id is not None:
+            items = [j for j in items if j.get("user_id") == user_id]
+        return items[:limit]
+
+    def get_job(self, job_id: str) -> BulkJob | None:
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    def active_job_for(self, operation: str, config_file: str) -> BulkJob | None:
+        with self._jobs_lock:
+            for job in self._jobs.values():
+                if job.operation == operation and job.config_file == config_file and not job.is_finished():
+                    return job
+        return None
+
+    def get_summary(self, job_id: str) -> dict | None:
+        job = self.get_job(job_id)
+        if job is not None:
+            return job.summary()
+        for item in self._load_history():
+            if item.get("id") == job_id:
+                return item
+        return None
+
+    # ---------- lifecycle ----------
+    def submit(
+        self,
+        operation: str,
+        command: list[str],
+        config_file: str,
+        row_count: int,
+        log_name: str,
+        user_id: str,
+        on_finished: Callable[[BulkJob], None] | None = None,
+    ) -> BulkJob:
+        job = BulkJob(uuid.uuid4().hex, operation, user_id, config_file, log_name)
+        job.row_count = row_count
+        self._register(job)
+        self._persist(job)
+        self._executor.submit(self._run, job, command, on_finished)
+        return job
+
+    def _register(self, job: BulkJob) -> None:
+        with self._jobs_lock:
+            self._jobs[job.id] = job
+            finished = [jid for jid, j in self._jobs.items() if j.is_finished()]
+            for jid in finished[: max(0, len(finished) - self._live_limit)]:
+                del self._jobs[jid]
+
+    def cancel(self, job_id: str) -> dict | None:
+        job = self.get_job(job_id)
+        if job is None:
+            return None
+        if job.is_finished():
+            return job.summary()
+        job.cancel_requested = True
+        proc = job.proc
+        if proc is not None and proc.poll() is None:
+            proc.terminate()
+        elif job.status == JOB_STATUS_QUEUED:
+            job.add_event("stderr", "WARNING: Job cancelled by user")
+            job.status = JOB_STATUS_CANCELLED
+            job.finished_at = datetime.now().isoformat()
+            self._persist(job)
+        return job.summary()
+
+    def _pump(self, job: BulkJob, stream_name: str, stream) -> None:
+        for raw in iter(stream.readline, ""):
+            line = self._output_sanitizer.sanitize_output(raw.rstrip("\r\n"))
+            if line:
+                job.add_event(stream_name, line)
+        stream.close()
+
+    def _run(self, job: BulkJob, command: list[str], on_finished) -> None:
+        if job.cancel_requested:
+            return
+
+        env = os.environ.copy()
+        env["PYTHONUNBUFFERED"] = "1"
+        job.status = JOB_STATUS_RUNNING
+        job.started_at = datetime.now().isoformat()
+        self._persist(job)
+
+        try:
+            job.proc = subprocess.Popen(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                bufsize=1,
+                env=env,
+            )
+            if job.cancel_requested:
+                job.proc.terminate()
+            readers = [
+                threading.Thread(target=self._pump, args=(job, "stdout", job.proc.stdout), daemon=True),
+                threading.Thread(target=self._pump, args=(job, "stderr", job.proc.stderr), daemon=True),
+            ]
+            for t in readers:
+                t.start()
+            job.returncode = job.proc.wait()
+            for t in readers:
+                t.join()
+        except Exception as e:
+            job.add_event("stderr", f"ERROR: {e}")
+            job.returncode = -1
+
+        if job.cancel_requested:
+            # Event first: SSE consumers stop once they see a final status.
+            job.add_event("stderr", "WARNING: Job cancelled by user")
+            job.status = JOB_STATUS_CANCELLED
+        elif job.returncode == 0:
+            job.status = JOB_STATUS_SUCCEEDED
+        else:
+            job.status = JOB_STATUS_FAILED
+        job.finished_at = datetime.now().isoformat()
+        job.proc = None
+
+        try:
+            self._log_writer.save_log(
+                "bulk_operation",
+                "\n".join(job.stdout_lines),
+                "\n".join(job.stderr_lines),
+                job.returncode,
+                job.log_name,
+            )
+        except Exception as e:
+            self._logger(f"[BULK JOBS] failed to write log for {job.id}: {e}")
+
+        self._persist(job)
+        if on_finished is not None:
+            try:
+                on_finished(job)
+            except Exception as e:
+                self._logger(f"[BULK JOBS] completion hook failed for {job.id}: {e}")
+
+    def shutdown(self) -> None:
+        with self._jobs_lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if not job.is_finished():
+                self.cancel(job.id)
+        self._executor.shutdown(wait=False, cancel_futures=True)
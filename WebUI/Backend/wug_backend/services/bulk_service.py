@@ -1,16 +1,34 @@
 from __future__ import annotations
 
+import csv
 import subprocess
 import tempfile
+import threading
+from contextlib import contextmanager
+from dataclasses import fields
 from pathlib import Path
 
-import pandas as pd
-
 from constants import (
-    CSV_NAMES,
     ENCODING_UTF8_SIG,
+    ERROR_BULK_RUN_ACTIVE,
+    ERROR_CHECKPOINT_FINISHED,
     ERROR_INVALID_OPERATION,
+    ERROR_NO_CHECKPOINT,
+    ERROR_PREFLIGHT_FAILED,
 )
+from wug_backend.bulk.checkpoint import checkpoint_path_for, load_checkpoint
+from wug_backend.bulk.engine import BulkRunOptions
+from wug_backend.bulk.ingest import BulkUploadIngestor
+
+
+class BulkPreflightFailed(Exception):
+    def __init__(self, row_count: int, errors: list[dict]) -> None:
+        super().__init__(ERROR_PREFLIGHT_FAILED)
+        self.row_count = row_count
+        self.errors = errors
+
+    def to_detail(self) -> dict:
+        return {"message": ERROR_PREFLIGHT_FAILED, "row_count": self.row_count, "errors": self.errors}
 
 
 class BulkOperationService:
@@ -24,6 +42,7 @@ class BulkOperationService:
         activity_logger,
         config_prefix_bulk: str,
         activity_bulk_operation: str,
+        job_manager=None,
     ) -> None:
         self._device_repo = device_repo
         self._config_dir = config_dir
@@ -33,64 +52,265 @@ class BulkOperationService:
         self._activity_logger = activity_logger
         self._config_prefix_bulk = config_prefix_bulk
         self._activity_bulk_operation = activity_bulk_operation
+        self._job_manager = job_manager
+        self._ingestor = BulkUploadIngestor(device_repo)
+        # (operation, config file) of synchronous runs in progress; background jobs are in the job manager.
+        self._active_runs: set[tuple[str, str]] = set()
+        self._active_lock = threading.Lock()
 
-    def run_bulk(self, operation: str, upload_file, config_name: str, log_name: str, current_user: dict):
+    def _check_operation(self, operation: str) -> None:
         from constants import SCRIPTS
 
         if operation not in SCRIPTS:
             # caller maps this to HTTPException to preserve existing behavior/message
             raise ValueError(ERROR_INVALID_OPERATION)
 
-        df = pd.read_excel(upload_file.file)
-        device_types = self._device_repo.load_device_types()
-        device_groups = self._device_repo.load_device_groups()
-
-        if operation == "add":
-            df["DeviceType"] = df["DeviceType"].apply(lambda v: device_types.get(str(v).strip()))
-            df["DeviceGroup"] = df["DeviceGroup"].apply(lambda v: device_groups.get(str(v).strip()))
-        elif operation == "update":
-            if "DeviceType" in df:
-                df["DeviceType"] = df["DeviceType"].apply(
-                    lambda v: device_types.get(str(v).strip()) if pd.notna(v) else v
-                )
-            if "GroupName" in df:
-                df["GroupName"] = df["GroupName"].apply(
-                    lambda v: device_groups.get(str(v).strip()) if pd.notna(v) else v
-                )
-            if "NewDeviceGroup" in df:
-                df["NewDeviceGroup"] = df["NewDeviceGroup"].apply(
-                    lambda v: device_groups.get(str(v).strip()) if pd.notna(v) else v
-                )
+    def _ingest(self, operation: str, upload_file, config_name: str, preflight: bool = True):
+        self._check_operation(operation)
 
+        config_filename = self._filename_service.generate_filename(self._config_prefix_bulk, "csv", config_name)
+        saved_cfg = self._config_dir / f"bulk_{operation}" / config_filename
+        ingested = self._ingestor.ingest(operation, upload_file, saved_cfg, validate=preflight)
+        if ingested.errors:
+            # Nothing was run, so do not leave a saved config behind for it.
+            saved_cfg.unlink(missing_ok=True)
+            raise BulkPreflightFailed(ingested.row_count, ingested.errors)
+        return ingested
+
+    def preflight(self, operation: str, upload_file) -> dict:
+        """Validate an upload without saving it or touching the DB beyond lookups."""
+        self._check_operation(operation)
         with tempfile.TemporaryDirectory() as tmp:
-            csv_path = Path(tmp) / CSV_NAMES[operation]
-            df.to_csv(csv_path, index=False, encoding=ENCODING_UTF8_SIG)
+            ingested = self._ingestor.ingest(operation, upload_file, Path(tmp) / "preflight.csv", validate=True)
+        return {
+            "ok": not ingested.errors,
+            "row_count": ingested.row_count,
+            "errors": ingested.errors,
+        }
 
-            config_filename = self._filename_service.generate_filename(self._config_prefix_bulk, "csv", config_name)
-            saved_cfg = self._config_dir / f"bulk_{operation}" / config_filename
-            df.to_csv(saved_cfg, index=False, encoding=ENCODING_UTF8_SIG)
+    @contextmanager
+    def _exclusive(self, operation: str, config_file: str):
+        """
+        Hold a saved config for one run (synchronous, or while a job is
+        submitted); LookupError if a run or queued/running job already has it.
+        """
+        key = (operation, config_file)
+        with self._active_lock:
+            if key in self._active_runs or (
+                self._job_manager is not None and self._job_manager.active_job_for(operation, config_file)
+            ):
+                raise LookupError(ERROR_BULK_RUN_ACTIVE)
+            self._active_runs.add(key)
+        try:
+            yield
+        finally:
+            with self._active_lock:
+                self._active_runs.discard(key)
 
-            proc = subprocess.run(
-                ["python", "-m", SCRIPTS[operation], str(csv_path)],
-                capture_output=True,
-                text=True,
+    def _runner_command(
+        self,
+        operation: str,
+        csv_path: Path,
+        options: BulkRunOptions | None = None,
+        resume: bool = False,
+    ) -> list[str]:
+        from constants import SCRIPTS
+
+        command = ["python", "-m", SCRIPTS[operation], str(csv_path), *(options or BulkRunOptions()).to_cli_args()]
+        command += ["--checkpoint", str(checkpoint_path_for(csv_path))]
+        if resume:
+            command.append("--resume")
+        return command
+
+    def run_bulk(
+        self,
+        operation: str,
+        upload_file,
+        config_name: str,
+        log_name: str,
+        current_user: dict,
+        preflight: bool = True,
+        options: BulkRunOptions | None = None,
+    ):
+        ingested = self._ingest(operation, upload_file, config_name, preflight)
+        # Held so the config cannot be resumed from its checkpoint while this run still writes it.
+        with self._exclusive(operation, ingested.path.name):
+            return self._run_command(
+                operation,
+                self._runner_command(operation, ingested.path, options),
+                log_name,
+                current_user,
+                f"Executed {operation} operation with {ingested.row_count} devices",
             )
 
-            clean_stdout = self._output_sanitizer.sanitize_output(proc.stdout)
-            clean_stderr = self._output_sanitizer.sanitize_output(proc.stderr)
+    def _run_command(self, operation: str, command: list[str], log_name: str, current_user: dict, activity: str):
+        proc = subprocess.run(
+            command,
+            capture_output=True,
+            text=True,
+        )
+
+        clean_stdout = self._output_sanitizer.sanitize_output(proc.stdout)
+        clean_stderr = self._output_sanitizer.sanitize_output(proc.stderr)
+
+        self._log_writer.save_log("bulk_operation", clean_stdout, clean_stderr, proc.returncode, log_name)
+
+        self._activity_logger(current_user["id"], self._activity_bulk_operation, activity, "bulk")
+
+        return {
+            "returncode": proc.returncode,
+            "stdout": clean_stdout,
+            "stderr": clean_stderr,
+        }
 
-            self._log_writer.save_log("bulk_operation", clean_stdout, clean_stderr, proc.returncode, log_name)
+    def enqueue_bulk(
+        self,
+        operation: str,
+        upload_file,
+        config_name: str,
+        log_name: str,
+        current_user: dict,
+        preflight: bool = True,
+        options: BulkRunOptions | None = None,
+    ):
+        """Queue the bulk operation as a background job; the runner reads the saved config copy."""
+        if self._job_manager is None:
+            raise RuntimeError("Background bulk jobs are not configured")
+
+        ingested = self._ingest(operation, upload_file, config_name, preflight)
+        return self._submit_job(
+            operation,
+            self._runner_command(operation, ingested.path, options),
+            ingested.path.name,
+            ingested.row_count,
+            log_name,
+            current_user,
+            f"Executed {operation} operation with {ingested.row_count} devices",
+        )
 
+    def _submit_job(
+        self,
+        operation: str,
+        command: list[str],
+        config_file: str,
+        row_count: int,
+        log_name: str,
+        current_user: dict,
+        activity: str,
+    ):
+        def _on_finished(job) -> None:
             self._activity_logger(
                 current_user["id"],
                 self._activity_bulk_operation,
-                f"Executed {operation} operation with {len(df)} devices",
+                f"{activity} (job {job.id}, {job.status})",
                 "bulk",
             )
 
-            return {
-                "returncode": proc.returncode,
-                "stdout": clean_stdout,
-                "stderr": clean_stderr,
-            }
+        job = self._job_manager.submit(
+            operation=operation,
+            command=command,
+            config_file=config_file,
+            row_count=row_count,
+            log_name=log_name,
+            user_id=current_user["id"],
+            on_finished=_on_finished,
+        )
+        return {"job_id": job.id, "status": job.status}
+
+    # ---------- checkpoint / resume ----------
+    def _saved_config(self, operation: str, config_file: str) -> Path:
+        self._check_operation(operation)
+        saved_cfg = self._config_dir / f"bulk_{operation}" / Path(config_file).name
+        if not saved_cfg.is_file():
+            raise FileNotFoundError(config_file)
+        return saved_cfg
+
+    def checkpoint_status(self, operation: str, config_file: str) -> dict:
+        saved_cfg = self._saved_config(operation, config_file)
+        checkpoint = checkpoint_path_for(saved_cfg)
+        if not checkpoint.exists():
+            return {"exists": False, "config_file": saved_cfg.name}
+        return {"exists": True, **load_checkpoint(checkpoint).summary()}
+
+    def resume_bulk(
+        self,
+        operation: str,
+        config_file: str,
+        log_name: str,
+        current_user: dict,
+        async_job: bool = False,
+    ):
+        """Re-run a saved config from its checkpoint; rows committed by earlier runs are skipped."""
+        saved_cfg = self._saved_config(operation, config_file)
+        checkpoint = checkpoint_path_for(saved_cfg)
+        if not checkpoint.exists():
+            raise LookupError(ERROR_NO_CHECKPOINT)
+        state = load_checkpoint(checkpoint)
+        if state.finished:
+            raise LookupError(ERROR_CHECKPOINT_FINISHED)
+
+        # Same batch size / parallelism / diff mode as the interrupted run.
+        known = {f.name for f in fields(BulkRunOptions)}
+        options = BulkRunOptions(**{k: v for k, v in state.options.items() if k in known})
+        command = self._runner_command(operation, saved_cfg, options, resume=True)
+        activity = f"Resumed {operation} operation from {saved_cfg.name} ({len(state.committed)} rows already committed)"
+
+        if not async_job:
+            with self._exclusive(operation, saved_cfg.name):
+                return self._run_command(operation, command, log_name, current_user, activity)
+        if self._job_manager is None:
+            raise RuntimeError("Background bulk jobs are not configured")
+        with open(saved_cfg, newline="", encoding=ENCODING_UTF8_SIG) as f:
+            row_count = max(sum(1 for _ in csv.reader(f)) - 1, 0)
+        # Once submitted the job itself holds the config (see BulkJobManager.active_job_for).
+        with self._exclusive(operation, saved_cfg.name):
+            return self._submit_job(operation, command, saved_cfg.name, row_count, log_name, current_user, activity)
+
+    # ---------- active monitors ----------
+    def run_monitor(
+        self,
+        action: str,
+        monitor: str,
+        upload_file,
+        group_name: str,
+        argument: str,
+        comment: str,
+        config_name: str,
+        log_name: str,
+        current_user: dict,
+        async_job: bool = False,
+    ):
+        """Assign/remove an active monitor type on the devices of a sheet or a device group."""
+        from constants import BULK_MONITOR_ACTIONS, BULK_MONITOR_SCRIPT
+
+        if action not in BULK_MONITOR_ACTIONS:
+            raise ValueError(f"action must be one of: {', '.join(BULK_MONITOR_ACTIONS)}")
+        if not (monitor or "").strip():
+            raise ValueError("monitor is required")
+        if (upload_file is None) == (not group_name):
+            raise ValueError("Give either a device sheet or a device group")
+
+        # Free-text values go as --name=value, so one starting with "-" is not read as another option.
+        command = ["python", "-m", BULK_MONITOR_SCRIPT, "--action", action, f"--monitor={monitor.strip()}"]
+        if argument:
+            command.append(f"--argument={argument}")
+        if comment:
+            command.append(f"--comment={comment}")
+
+        config_file, row_count = "", 0
+        target = f"group {group_name}"
+        if upload_file is not None:
+            config_filename = self._filename_service.generate_filename(self._config_prefix_bulk, "csv", config_name)
+            ingested = self._ingestor.ingest("monitor", upload_file, self._config_dir / "bulk_monitor" / config_filename)
+            command.insert(3, str(ingested.path))
+            config_file, row_count = ingested.path.name, ingested.row_count
+            target = f"{row_count} sheet rows"
+        else:
+            command.append(f"--group={group_name}")
 
+        activity = f"Bulk monitor {action} of {monitor.strip()} on {target}"
+        if not async_job:
+            return self._run_command("monitor", command, log_name, current_user, activity)
+        if self._job_manager is None:
+            raise RuntimeError("Background bulk jobs are not configured")
+        return self._submit_job("monitor", command, config_file, row_count, log_name, current_user, activity)
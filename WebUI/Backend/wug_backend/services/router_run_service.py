@@ -0,0 +1,390 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator
+
+from constants import ENV_WUG_ROUTER_CANCEL_FILE, ROUTER_RUN_KILL_GRACE
+from wug_backend.routers.fanout import DEVICE_EVENT_PREFIX, DeviceRunResult
+from wug_backend.routers.run_results import summarize_results, write_results_jsonl
+from wug_backend.services.bulk_job_service import (
+    JOB_FINAL_STATUSES,
+    JOB_STATUS_CANCELLED,
+    JOB_STATUS_FAILED,
+    JOB_STATUS_QUEUED,
+    JOB_STATUS_RUNNING,
+    JOB_STATUS_SUCCEEDED,
+    classify_output_line,
+)
+
+
+class RouterRun:
+    def __init__(self, run_id: str, kind: str, user_id: str, log_name: str, device_count: int) -> None:
+        self.id = run_id
+        self.kind = kind
+        self.user_id = user_id
+        self.log_name = log_name
+        self.device_count = device_count
+        self.status = JOB_STATUS_QUEUED
+        self.created_at = datetime.now().isoformat()
+        self.started_at: str | None = None
+        self.finished_at: str | None = None
+        self.returncode: int | None = None
+        self.log_file: str | None = None
+        self.results_file: str | None = None
+        self.devices = {"ok": 0, "failed": 0, "timed_out": 0, "unreachable": 0}
+        self.results: list[dict] = []
+        self.events: list[dict] = []
+        self.proc: subprocess.Popen | None = None
+        self.lock = threading.Lock()
+        # Polled by the run's fan-out (see RunControl) wherever it executes: here, a worker or a runner.
+        self.cancel_file = str(Path(tempfile.gettempdir()) / f"wug-router-run-{run_id}.cancel")
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        Path(self.cancel_file).touch()
+
+    def _append(self, event: dict) -> None:
+        with self.lock:
+            event["seq"] = len(self.events) + 1
+            event["timestamp"] = datetime.now().isoformat()
+            self.events.append(event)
+
+    def add_line(self, stream: str, line: str) -> None:
+        self._append({"type": "line", "stream": stream, "level": classify_output_line(line), "message": line})
+
+    def add_device(self, result: dict) -> None:
+        with self.lock:
+            if result.get("ok"):
+                self.devices["ok"] += 1
+            else:
+                self.devices["failed"] += 1
+                if result.get("timed_out"):
+                    self.devices["timed_out"] += 1
+                elif result.get("status") == "unreachable":
+                    self.devices["unreachable"] += 1
+            self.results.append(result)
+        self._append({"type": "device", **result})
+
+    def events_after(self, seq: int) -> list[dict]:
+        with self.lock:
+            return self.events[max(0, seq):]
+
+    def is_finished(self) -> bool:
+        return self.status in JOB_FINAL_STATUSES
+
+    def results_summary(self) -> dict:
+        """Per-status/error-class counts and p50/p95 per phase over the devices finished so far."""
+        with self.lock:
+            results = list(self.results)
+        return summarize_results(results)
+
+    def summary(self) -> dict:
+        with self.lock:
+            devices = dict(self.devices)
+            event_count = len(self.events)
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "user_id": self.user_id,
+            "log_name": self.log_name,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "returncode": self.returncode,
+            "device_count": self.device_count,
+            "devices": devices,
+            "log_file": self.log_file,
+            "results_file": self.results_file,
+            "cancelled": self.cancelled,
+            "event_count": event_count,
+            "results_summary": self.results_summary(),
+        }
+
+
+class _LineSink:
+    """File-like target for in-process runs: each complete line is handed to `emit`."""
+
+    def __init__(self, emit: Callable[[str], None]) -> None:
+        self._emit = emit
+        self._buf = ""
+
+    def write(self, text: str) -> int:
+        self._buf += text
+        *lines, self._buf = self._buf.split("\n")
+        for line in lines:
+            self._emit(line)
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        if self._buf:
+            self._emit(self._buf)
+            self._buf = ""
+
+
+class RouterRunManager:
+    """
+    Background router runs whose output is streamed while they run: every
+    runner line becomes an event, every finished device becomes a `device`
+    event (status, timing and its output block), and the log file is written
+    as the output arrives instead of once at the end. Runs are kept in memory
+    only; the log file is the durable record.
+
+    It is also the registry of blocking runs (see `track`), so any run can be
+    cancelled by id: the fan-out stops, in-flight devices are reported as
+    timed out, and a runner process still alive after `kill_grace` seconds
+    is killed.
+    """
+
+    def __init__(
+        self,
+        output_sanitizer,
+        log_writer,
+        max_workers: int = 4,
+        history_limit: int = 50,
+        logger: Callable[[str], None] | None = None,
+        kill_grace: float = ROUTER_RUN_KILL_GRACE,
+    ) -> None:
+        self._output_sanitizer = output_sanitizer
+        self._log_writer = log_writer
+        self._history_limit = history_limit
+        self._logger = logger or print
+        self._kill_grace = kill_grace
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="router-run")
+        self._runs: OrderedDict[str, RouterRun] = OrderedDict()
+        self._runs_lock = threading.Lock()
+
+    def get_run(self, run_id: str) -> RouterRun | None:
+        with self._runs_lock:
+            return self._runs.get(run_id)
+
+    def list_runs(self, user_id: str | None = None) -> list[dict]:
+        """Newest first; only `user_id`'s runs when given."""
+        with self._runs_lock:
+            runs = [r for r in self._runs.values() if user_id is None or r.user_id == user_id]
+        return [r.summary() for r in reversed(runs)]
+
+    def _register(self, run: RouterRun) -> None:
+        with self._runs_lock:
+            self._runs[run.id] = run
+            finished = [rid for rid, r in self._runs.items() if r.is_finished()]
+            for rid in finished[: max(0, len(self._runs) - self._history_limit)]:
+                del self._runs[rid]
+
+    def cancel(self, run_id: str) -> RouterRun | None:
+        run = self.get_run(run_id)
+        if run is None or run.is_finished():
+            return run
+        run.cancel()
+        self._logger(f"[ROUTER RUNS] cancel requested for {run_id}")
+        timer = threading.Timer(self._kill_grace, self._kill, args=(run,))
+        timer.daemon = True
+        timer.start()
+        return run
+
+    def _kill(self, run: RouterRun) -> None:
+        proc = run.proc
+        if proc is not None and proc.poll() is None:
+            self._logger(f"[ROUTER RUNS] killing {run.id}: still running {self._kill_grace:g}s after cancel")
+            proc.kill()
+
+    def check_run_id(self, run_id: str) -> None:
+        if not re.fullmatch(r"[A-Za-z0-9_-]{1,64}", run_id):
+            raise ValueError("run_id must be 1-64 letters, digits, '-' or '_'")
+        if self.get_run(run_id) is not None:
+            raise ValueError(f"Run {run_id} already exists")
+
+    @contextmanager
+    def track(
+        self, kind: str, user_id: str, log_name: str, device_count: int, run_id: str | None = None
+    ) -> Iterator[RouterRun]:
+        """
+        Register a blocking run (executed by the caller) so it is listed and
+        can be cancelled like a streamed one. `run_id` may be chosen by the
+        client so it can cancel a request that has not returned yet.
+        """
+        if run_id is not None:
+            self.check_run_id(run_id)
+        run = RouterRun(run_id or uuid.uuid4().hex, kind, user_id, log_name, device_count)
+        run.status = JOB_STATUS_RUNNING
+        run.started_at = datetime.now().isoformat()
+        self._register(run)
+        try:
+            yield run
+        except BaseException:
+            run.returncode = -1
+            raise
+        finally:
+            self._finish(run)
+
+    def _finish(self, run: RouterRun) -> None:
+        run.proc = None
+        if os.path.exists(run.cancel_file):
+            os.remove(run.cancel_file)
+        if run.cancelled:
+            run.status = JOB_STATUS_CANCELLED
+        else:
+            run.status = JOB_STATUS_SUCCEEDED if run.returncode == 0 else JOB_STATUS_FAILED
+        run.finished_at = datetime.now().isoformat()
+
+    def start(
+        self,
+        kind: str,
+        log_prefix: str,
+        log_name: str,
+        user_id: str,
+        device_count: int,
+        command: list[str] | None = None,
+        env: dict | None = None,
+        run_in_process: Callable[..., int] | None = None,
+        cleanup: Callable[[], None] | None = None,
+        timeout: float | None = None,
+    ) -> RouterRun:
+        """
+        Start a run either as a runner subprocess (`command`, `env`) or
+        in-process: `run_in_process(out=, err=, report=, cancel_file=)` is a
+        runs.py body. A runner subprocess is killed after `timeout` seconds.
+        """
+        run = RouterRun(uuid.uuid4().hex, kind, user_id, log_name, device_count)
+        self._register(run)
+        self._executor.submit(self._run, run, log_prefix, command, env, run_in_process, cleanup, timeout)
+        return run
+
+    # ---------- output ----------
+    def _on_line(self, run: RouterRun, log, stream: str, raw: str) -> None:
+        line = self._output_sanitizer.sanitize_output(raw.rstrip("\r\n"))
+        if stream == "stdout" and line.startswith(DEVICE_EVENT_PREFIX):
+            try:
+                result = json.loads(line[len(DEVICE_EVENT_PREFIX):])
+            except json.JSONDecodeError:
+                result = None
+            if isinstance(result, dict):
+                self._on_device(run, log, result)
+                return
+        if line:
+            run.add_line(stream, line)
+            log.write(line, stream)
+
+    def _on_device(self, run: RouterRun, log, result: dict) -> None:
+        run.add_device(result)
+        if result.get("output"):
+            log.write(result["output"])
+        if not result.get("ok"):
+            log.write(f"ERROR on {result.get('ip')}: {result.get('error')}", "stderr")
+
+    def _pump(self, run: RouterRun, log, stream_name: str, stream) -> None:
+        for raw in iter(stream.readline, ""):
+            self._on_line(run, log, stream_name, raw)
+        stream.close()
+
+    # ---------- lifecycle ----------
+    def _run_subprocess(self, run: RouterRun, log, command: list[str], env: dict, timeout: float | None) -> int:
+        env = dict(env)
+        env["PYTHONUNBUFFERED"] = "1"
+        env[ENV_WUG_ROUTER_CANCEL_FILE] = run.cancel_file
+        run.proc = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+            env=env,
+        )
+        readers = [
+            threading.Thread(target=self._pump, args=(run, log, "stdout", run.proc.stdout), daemon=True),
+            threading.Thread(target=self._pump, args=(run, log, "stderr", run.proc.stderr), daemon=True),
+        ]
+        for t in readers:
+            t.start()
+        try:
+            returncode = run.proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            run.proc.kill()
+            returncode = run.proc.wait()
+            run.add_line("stderr", f"ERROR: runner killed after {timeout:g}s")
+            log.write(f"ERROR: runner killed after {timeout:g}s", "stderr")
+            returncode = -1
+        for t in readers:
+            t.join()
+        return returncode
+
+    def _run_in_process(self, run: RouterRun, log, body: Callable[..., int]) -> int:
+        out = _LineSink(lambda line: self._on_line(run, log, "stdout", line))
+        err = _LineSink(lambda line: self._on_line(run, log, "stderr", line))
+
+        def _report(result: DeviceRunResult) -> None:
+            self._on_device(run, log, asdict(result))
+
+        try:
+            return body(out=out, err=err, report=_report, cancel_file=run.cancel_file)
+        finally:
+            out.close()
+            err.close()
+
+    def _run(self, run: RouterRun, log_prefix: str, command, env, run_in_process, cleanup, timeout) -> None:
+        run.status = JOB_STATUS_RUNNING
+        run.started_at = datetime.now().isoformat()
+        log = None
+        try:
+            log = self._log_writer.open_stream(log_prefix, run.log_name)
+            run.log_file = log.path.name
+            if run_in_process is not None:
+                run.returncode = self._run_in_process(run, log, run_in_process)
+            else:
+                run.returncode = self._run_subprocess(run, log, command, env or os.environ.copy(), timeout)
+        except Exception as e:
+            run.add_line("stderr", f"ERROR: {e}")
+            if log is not None:
+                log.write(f"ERROR: {e}", "stderr")
+            run.returncode = -1
+        finally:
+            run.proc = None
+            if log is not None:
+                log.close(run.returncode)
+                self._save_results(run, log.path)
+            if cleanup is not None:
+                try:
+                    cleanup()
+                except Exception as e:
+                    self._logger(f"[ROUTER RUNS] cleanup failed for {run.id}: {e}")
+
+        self._finish(run)
+
+    def _save_results(self, run: RouterRun, log_path: Path) -> None:
+        """Per-device results (<log>.jsonl) and output shards beside the run's log."""
+        with run.lock:
+            results = list(run.results)
+        if not results:
+            return
+        path = log_path.with_suffix(".jsonl")
+        try:
+            write_results_jsonl(path, results, summarize_results(results))
+            run.results_file = path.name
+            self._log_writer.save_device_logs(log_path, results)
+        except OSError as e:
+            self._logger(f"[ROUTER RUNS] could not save results for {run.id}: {e}")
+
+    def shutdown(self) -> None:
+        with self._runs_lock:
+            runs = list(self._runs.values())
+        for run in runs:
+            proc = run.proc
+            if proc is not None and proc.poll() is None:
+                proc.terminate()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,10 +1,46 @@
 from __future__ import annotations
 
+import io
 import os
+import shutil
 import subprocess
 import tempfile
+from contextlib import nullcontext
+from dataclasses import asdict
+from functools import partial
 from pathlib import Path
+from typing import Callable
 
+from constants import (
+    ENV_WUG_DEVICE_TIMEOUT,
+    ENV_WUG_EXEC_CACHE_MAX_AGE,
+    ENV_WUG_EXEC_CACHE_REFRESH,
+    ENV_WUG_QUERY_COMMAND,
+    ENV_WUG_QUERY_PARSER,
+    ENV_WUG_QUERY_TEMPLATE,
+    ENV_WUG_ROUTER_AUTODETECT,
+    ENV_WUG_ROUTER_CANCEL_FILE,
+    ENV_WUG_ROUTER_CONCURRENCY,
+    ENV_WUG_ROUTER_EVENTS,
+    ENV_WUG_ROUTER_PREFLIGHT,
+    ENV_WUG_ROUTER_RESULTS,
+    ENV_WUG_RUN_BUDGET,
+    ENV_WUG_SSH_ENGINE,
+    ROUTER_AUTODETECT_ENABLED,
+    ROUTER_CONCURRENCY_DEFAULT,
+    ROUTER_DEVICE_TIMEOUT_DEFAULT,
+    ROUTER_EXEC_CACHE_MAX_AGE,
+    ROUTER_PREFLIGHT_ENABLED,
+    ROUTER_RUN_BUDGET_DEFAULT,
+    ROUTER_RUN_KILL_GRACE,
+    ROUTER_SSH_ENGINES,
+)
+from wug_backend.routers.fanout import max_concurrency_for
+from wug_backend.routers.run_results import read_results_jsonl
+from wug_backend.routers.runs import run_config_push, run_router_tasks, run_show_query
+from wug_backend.routers.show_query import ShowQuery, aggregate_table
+from wug_backend.routers.simple import SshCredentials
+from wug_backend.routers.worker_pool import job_for
 
 
 class RouterCommandService:
@@ -30,6 +66,12 @@ class RouterCommandService:
         activity_interactive_commands: str,
         activity_interactive_commands_error: str,
         activity_simple_commands: str,
+        log_file_prefix_query: str,
+        activity_show_query: str,
+        activity_show_query_error: str,
+        session_pool=None,
+        run_manager=None,
+        worker_pool=None,
     ) -> None:
         self._router_scripts_dir = router_scripts_dir
         self._log_dir = log_dir
@@ -51,6 +93,197 @@ class RouterCommandService:
         self._activity_interactive_commands = activity_interactive_commands
         self._activity_interactive_commands_error = activity_interactive_commands_error
         self._activity_simple_commands = activity_simple_commands
+        self._log_file_prefix_query = log_file_prefix_query
+        self._activity_show_query = activity_show_query
+        self._activity_show_query_error = activity_show_query_error
+        self._session_pool = session_pool
+        self._run_manager = run_manager
+        self._worker_pool = worker_pool
+
+    def _fanout_settings(
+        self,
+        concurrency: int | None,
+        device_timeout: float | None,
+        engine: str | None,
+        preflight: bool | None = None,
+        run_budget: float | None = None,
+        autodetect: bool | None = None,
+    ) -> dict:
+        engine = (engine or ROUTER_SSH_ENGINES[0]).strip().lower()
+        if engine not in ROUTER_SSH_ENGINES:
+            raise ValueError(f"Unknown SSH engine: {engine}")
+        concurrency = ROUTER_CONCURRENCY_DEFAULT if concurrency is None else concurrency
+        device_timeout = ROUTER_DEVICE_TIMEOUT_DEFAULT if device_timeout is None else device_timeout
+        run_budget = ROUTER_RUN_BUDGET_DEFAULT if run_budget is None else run_budget
+        return {
+            "engine": engine,
+            "concurrency": min(max(1, int(concurrency)), max_concurrency_for(engine)),
+            "device_timeout": max(0.0, float(device_timeout)),
+            "preflight": ROUTER_PREFLIGHT_ENABLED if preflight is None else bool(preflight),
+            "run_budget": max(0.0, float(run_budget)),
+            "autodetect": ROUTER_AUTODETECT_ENABLED if autodetect is None else bool(autodetect),
+        }
+
+    def _fanout_env(self, env: dict, settings: dict) -> None:
+        env[ENV_WUG_SSH_ENGINE] = settings["engine"]
+        env[ENV_WUG_ROUTER_CONCURRENCY] = str(settings["concurrency"])
+        env[ENV_WUG_DEVICE_TIMEOUT] = str(settings["device_timeout"])
+        env[ENV_WUG_ROUTER_PREFLIGHT] = "1" if settings["preflight"] else "0"
+        env[ENV_WUG_RUN_BUDGET] = str(settings["run_budget"])
+        env[ENV_WUG_ROUTER_AUTODETECT] = "1" if settings["autodetect"] else "0"
+
+    @staticmethod
+    def _exec_cache(max_age: float | None, force_refresh: bool) -> dict:
+        """Exec result cache options of a run (see exec_cache); max_age 0 leaves the cache out."""
+        max_age = float(max_age or 0)
+        if not 0 <= max_age <= ROUTER_EXEC_CACHE_MAX_AGE:
+            raise ValueError(f"max_age must be between 0 and {ROUTER_EXEC_CACHE_MAX_AGE:g} seconds")
+        return {"max_age": max_age, "force_refresh": bool(force_refresh)}
+
+    @staticmethod
+    def _exec_cache_env(env: dict, exec_cache: dict) -> None:
+        env[ENV_WUG_EXEC_CACHE_MAX_AGE] = str(exec_cache["max_age"])
+        env[ENV_WUG_EXEC_CACHE_REFRESH] = "1" if exec_cache["force_refresh"] else "0"
+
+    @staticmethod
+    def _kill_after(settings: dict) -> float | None:
+        """Hard limit for a runner process: the run budget plus time to report and write results."""
+        return settings["run_budget"] + ROUTER_RUN_KILL_GRACE if settings["run_budget"] else None
+
+    def _in_process(self, settings: dict) -> bool:
+        # Pooled sessions live in this process, so pooled runs cannot go through a runner subprocess.
+        return self._session_pool is not None and settings["engine"] == "netmiko"
+
+    def _lease_for(self, username: str, password: str, enable_password: str):
+        def _lease(target, device_type):
+            return self._session_pool.lease(target.ip, username, password, enable_password or password, device_type)
+
+        return _lease
+
+    def _on_worker(self, job: dict) -> Callable[..., int]:
+        def _body(**kwargs):
+            return self._worker_pool.run(job, **kwargs)
+
+        return _body
+
+    def _credentials_env(self, env: dict, username: str, password: str, enable_password: str) -> None:
+        # Only runner subprocesses get credentials through the environment; pooled runs get them in memory.
+        env[self._env_wug_ssh_user] = username
+        env[self._env_wug_ssh_pass] = password
+        env[self._env_wug_ssh_enable] = enable_password or password
+
+    def _run_in_process(
+        self, run: Callable[..., int], results_file: str, cancel_file: str | None
+    ) -> subprocess.CompletedProcess:
+        """Run a runner body here or on a pooled worker; the result looks like the runner subprocess's."""
+        out, err = io.StringIO(), io.StringIO()
+        try:
+            returncode = run(out=out, err=err, results_file=results_file, cancel_file=cancel_file)
+        except Exception as e:
+            print(f"ERROR: {e}", file=err)
+            returncode = 1
+        return subprocess.CompletedProcess(["in-process"], returncode, out.getvalue(), err.getvalue())
+
+    def _run_subprocess(
+        self, command: list[str], env: dict, timeout: float | None, tracked
+    ) -> subprocess.CompletedProcess:
+        """subprocess.run with a hard timeout that keeps whatever the runner printed before it was killed."""
+        proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env)
+        if tracked is not None:
+            tracked.proc = proc
+        try:
+            stdout, stderr = proc.communicate(timeout=timeout)
+            return subprocess.CompletedProcess(command, proc.returncode, stdout, stderr)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            stdout, stderr = proc.communicate()
+            stderr = f"{stderr}ERROR: runner killed after {timeout:g}s\n"
+            return subprocess.CompletedProcess(command, -1, stdout, stderr)
+
+    def _run_to_completion(
+        self, command: list[str], env: dict, body: Callable[..., int] | None, settings: dict, tracked=None
+    ) -> tuple[subprocess.CompletedProcess, str]:
+        """Blocking run; also returns the JSON-lines file the runner wrote its per-device results to."""
+        fd, results_file = tempfile.mkstemp(suffix=".jsonl")
+        os.close(fd)
+        cancel_file = tracked.cancel_file if tracked is not None else None
+        if body is not None:
+            return self._run_in_process(body, results_file, cancel_file), results_file
+        env[ENV_WUG_ROUTER_RESULTS] = results_file
+        if cancel_file:
+            env[ENV_WUG_ROUTER_CANCEL_FILE] = cancel_file
+        return self._run_subprocess(command, env, self._kill_after(settings), tracked), results_file
+
+    def _check_run_id(self, run_id: str | None, stream: bool) -> None:
+        if not run_id:
+            return
+        if stream:
+            raise ValueError("run_id is assigned by the server for streamed runs")
+        if self._run_manager is None:
+            raise ValueError("Cancellable router runs are not available")
+        self._run_manager.check_run_id(run_id)
+
+    def _track(self, kind: str, log_name: str, router_count: int, current_user: dict, run_id: str | None):
+        """Register a blocking run with the run manager so it can be cancelled by id."""
+        if self._run_manager is None:
+            return nullcontext()
+        return self._run_manager.track(kind, current_user["id"], log_name, router_count, run_id or None)
+
+    def _keep_results(self, results_file: str, log_path: Path) -> tuple[list[dict], dict | None]:
+        """Read the run's per-device results and keep them, and per-device output shards, beside its log."""
+        try:
+            if os.path.getsize(results_file) == 0:
+                return [], None
+            devices, summary = read_results_jsonl(results_file)
+            shutil.move(results_file, log_path.with_suffix(".jsonl"))
+            self._log_writer.save_device_logs(log_path, devices)
+            return devices, summary
+        finally:
+            if os.path.exists(results_file):
+                os.remove(results_file)
+
+    @staticmethod
+    def _record(tracked, proc: subprocess.CompletedProcess, log_path: Path, devices: list[dict]) -> None:
+        if tracked is None:
+            return
+        tracked.returncode = proc.returncode
+        tracked.log_file = log_path.name
+        tracked.results_file = log_path.with_suffix(".jsonl").name if devices else None
+        for device in devices:
+            tracked.add_device(device)
+
+    def _start_stream(
+        self,
+        kind: str,
+        log_prefix: str,
+        log_name: str,
+        routers: str,
+        current_user: dict,
+        command: list[str],
+        env: dict,
+        body: Callable[..., int] | None,
+        activity: str,
+        message: str,
+        settings: dict,
+        cleanup: Callable[[], None] | None = None,
+    ) -> dict:
+        if self._run_manager is None:
+            raise ValueError("Streaming router runs are not available")
+        env[ENV_WUG_ROUTER_EVENTS] = "1"
+        run = self._run_manager.start(
+            kind=kind,
+            log_prefix=log_prefix,
+            log_name=log_name,
+            user_id=current_user["id"],
+            device_count=len([r for r in routers.splitlines() if r.strip()]),
+            command=command,
+            env=env,
+            run_in_process=body,
+            cleanup=cleanup,
+            timeout=self._kill_after(settings),
+        )
+        self._activity_logger(current_user["id"], activity, message, "routers")
+        return run.summary()
 
     def run_interactive(
         self,
@@ -64,28 +297,88 @@ class RouterCommandService:
         log_name: str,
         current_user: dict,
         filename_service,
+        concurrency: int | None = None,
+        device_timeout: float | None = None,
+        engine: str | None = None,
+        stream: bool = False,
+        preflight: bool | None = None,
+        run_budget: float | None = None,
+        run_id: str | None = None,
+        autodetect: bool | None = None,
+        max_age: float | None = None,
+        force_refresh: bool = False,
     ):
+        self._check_run_id(run_id, stream)
         env = os.environ.copy()
         env[self._env_wug_routers] = routers
         env[self._env_wug_tasks] = tasks_json
-        env[self._env_wug_ssh_user] = username
-        env[self._env_wug_ssh_pass] = password
-        env[self._env_wug_ssh_enable] = enable_password or password
         env["WUG_DEVICE_TYPE_DEFAULT"] = (device_type_default or "").strip() or "cisco_ios"
+        settings = self._fanout_settings(concurrency, device_timeout, engine, preflight, run_budget, autodetect)
+        self._fanout_env(env, settings)
+        exec_cache = self._exec_cache(max_age, force_refresh)
+        self._exec_cache_env(env, exec_cache)
+        command = ["python", "-m", "wug_backend.runners.router_interactive"]
 
-        try:
-            proc = subprocess.run(
-                ["python", "-m", "wug_backend.runners.router_interactive"],
-                capture_output=True,
-                text=True,
-                env=env,
+        body = None
+        credentials = SshCredentials(username, password, enable_password or password)
+        if self._in_process(settings):
+            lease = self._lease_for(username, password, enable_password)
+
+            def run_in_process(**kwargs):
+                return run_router_tasks(
+                    routers,
+                    tasks_json,
+                    env["WUG_DEVICE_TYPE_DEFAULT"],
+                    **settings,
+                    **exec_cache, lease=lease,
+                    credentials=credentials,
+                    **kwargs,
+                )
+
+            body = run_in_process
+        elif self._worker_pool is not None:
+            body = self._on_worker(
+                job_for(
+                    "interactive",
+                    routers,
+                    env["WUG_DEVICE_TYPE_DEFAULT"],
+                    settings,
+                    credentials,
+                    tasks=tasks_json,
+                    exec_cache=exec_cache,
+                )
             )
+        else:
+            self._credentials_env(env, username, password, enable_password)
 
-            # No longer collecting script-side logs; behavior preserved by returning stdout/stderr like before.
+        router_count = len([r for r in routers.splitlines() if r.strip()])
+        if stream:
+            return self._start_stream(
+                "interactive",
+                self._log_file_prefix_interactive,
+                log_name,
+                routers,
+                current_user,
+                command,
+                env,
+                body,
+                self._activity_interactive_commands,
+                f"Started streamed tasks on {router_count} router(s)",
+                settings,
+            )
+
+        try:
+            with self._track("interactive", log_name, router_count, current_user, run_id) as tracked:
+                proc, results_file = self._run_to_completion(command, env, body, settings, tracked)
 
-            self._log_writer.save_log(self._log_file_prefix_interactive, proc.stdout, proc.stderr, proc.returncode, log_name)
+                # No longer collecting script-side logs; behavior preserved by returning stdout/stderr like before.
+
+                log_path = self._log_writer.save_log(
+                    self._log_file_prefix_interactive, proc.stdout, proc.stderr, proc.returncode, log_name
+                )
+                devices, summary = self._keep_results(results_file, log_path)
+                self._record(tracked, proc, log_path, devices)
 
-            router_count = len([r for r in routers.splitlines() if r.strip()])
             self._activity_logger(
                 current_user["id"],
                 self._activity_interactive_commands,
@@ -97,6 +390,8 @@ class RouterCommandService:
                 "returncode": proc.returncode,
                 "stdout": proc.stdout,
                 "stderr": proc.stderr,
+                "devices": devices,
+                "summary": summary,
             }
         except Exception as e:
             self._activity_logger(
@@ -123,8 +418,20 @@ class RouterCommandService:
         log_name: str,
         current_user: dict,
         filename_service,
+        concurrency: int | None = None,
+        device_timeout: float | None = None,
+        engine: str | None = None,
+        stream: bool = False,
+        preflight: bool | None = None,
+        run_budget: float | None = None,
+        run_id: str | None = None,
+        autodetect: bool | None = None,
     ):
-        with tempfile.TemporaryDirectory() as tmp:
+        self._check_run_id(run_id, stream)
+        # Streamed runs outlive this request, so their input files are removed when the run ends.
+        tmp = tempfile.mkdtemp()
+        cleanup = partial(shutil.rmtree, tmp, ignore_errors=True)
+        try:
             routers_file = os.path.join(tmp, "routers.txt")
             config_file = os.path.join(tmp, "config.txt")
 
@@ -134,29 +441,70 @@ class RouterCommandService:
             with open(config_file, "w", encoding=self._default_encoding) as f:
                 f.write(config)
 
+            config_filename = filename_service.generate_filename(self._config_prefix_simple, "txt", config_name)
+            saved_cfg = self._config_router_simple_dir / config_filename
+            shutil.copy(config_file, saved_cfg)
+
             env = os.environ.copy()
             env["WUG_ROUTERS_FILE"] = routers_file
             env["WUG_CONFIG_FILE"] = config_file
-            env["WUG_SSH_USER"] = username
-            env["WUG_SSH_PASS"] = password
-            env["WUG_SSH_ENABLE"] = enable_password or password
             env["WUG_DEVICE_TYPE_DEFAULT"] = (device_type_default or "").strip() or "cisco_ios"
+            settings = self._fanout_settings(concurrency, device_timeout, engine, preflight, run_budget, autodetect)
+            self._fanout_env(env, settings)
+            command = ["python", "-m", "wug_backend.runners.router_simple"]
 
-            proc = subprocess.run(
-                ["python", "-m", "wug_backend.runners.router_simple"],
-                capture_output=True,
-                text=True,
-                env=env,
-            )
+            body = None
+            credentials = SshCredentials(username, password, enable_password or password)
+            if self._in_process(settings):
+                lease = self._lease_for(username, password, enable_password)
 
-            config_filename = filename_service.generate_filename(self._config_prefix_simple, "txt", config_name)
-            saved_cfg = self._config_router_simple_dir / config_filename
-            import shutil
-            shutil.copy(config_file, saved_cfg)
+                def run_in_process(**kwargs):
+                    return run_config_push(
+                        routers,
+                        config_file,
+                        env["WUG_DEVICE_TYPE_DEFAULT"],
+                        **settings,
+                        lease=lease,
+                        credentials=credentials,
+                        **kwargs,
+                    )
 
-            self._log_writer.save_log(self._log_file_prefix_simple, proc.stdout, proc.stderr, proc.returncode, log_name)
+                body = run_in_process
+            elif self._worker_pool is not None:
+                body = self._on_worker(
+                    job_for("simple", routers, env["WUG_DEVICE_TYPE_DEFAULT"], settings, credentials, config_file=config_file)
+                )
+            else:
+                self._credentials_env(env, username, password, enable_password)
 
             router_count = len([r for r in routers.splitlines() if r.strip()])
+            if stream:
+                summary = self._start_stream(
+                    "simple",
+                    self._log_file_prefix_simple,
+                    log_name,
+                    routers,
+                    current_user,
+                    command,
+                    env,
+                    body,
+                    self._activity_simple_commands,
+                    f"Started streamed simple config on {router_count} router(s)",
+                    settings,
+                    cleanup=cleanup,
+                )
+                cleanup = None
+                return summary
+
+            with self._track("simple", log_name, router_count, current_user, run_id) as tracked:
+                proc, results_file = self._run_to_completion(command, env, body, settings, tracked)
+
+                log_path = self._log_writer.save_log(
+                    self._log_file_prefix_simple, proc.stdout, proc.stderr, proc.returncode, log_name
+                )
+                devices, summary = self._keep_results(results_file, log_path)
+                self._record(tracked, proc, log_path, devices)
+
             self._activity_logger(
                 current_user["id"],
                 self._activity_simple_commands,
@@ -168,5 +516,139 @@ class RouterCommandService:
                 "returncode": proc.returncode,
                 "stdout": proc.stdout,
                 "stderr": proc.stderr,
+                "devices": devices,
+                "summary": summary,
             }
+        finally:
+            if cleanup is not None:
+                cleanup()
+
+    def run_query(
+        self,
+        routers: str,
+        command: str,
+        parser: str,
+        template: str,
+        device_type_default: str,
+        username: str,
+        password: str,
+        enable_password: str,
+        log_name: str,
+        current_user: dict,
+        concurrency: int | None = None,
+        device_timeout: float | None = None,
+        engine: str | None = None,
+        stream: bool = False,
+        preflight: bool | None = None,
+        run_budget: float | None = None,
+        run_id: str | None = None,
+        autodetect: bool | None = None,
+        max_age: float | None = None,
+        force_refresh: bool = False,
+    ):
+        """
+        Run one show command on every router and parse each output into rows
+        (see show_query). Blocking runs return the aggregated table; streamed
+        runs report each device with its rows, and the table so far is at
+        /routers/runs/{run_id}/table. `max_age`/`force_refresh` as for
+        run_interactive (see exec_cache).
+        """
+        self._check_run_id(run_id, stream)
+        query = ShowQuery(command, parser or "textfsm", template or "")
+        env = os.environ.copy()
+        env[self._env_wug_routers] = routers
+        env[ENV_WUG_QUERY_COMMAND] = query.command
+        env[ENV_WUG_QUERY_PARSER] = query.parser
+        env[ENV_WUG_QUERY_TEMPLATE] = query.template
+        env["WUG_DEVICE_TYPE_DEFAULT"] = (device_type_default or "").strip() or "cisco_ios"
+        settings = self._fanout_settings(concurrency, device_timeout, engine, preflight, run_budget, autodetect)
+        self._fanout_env(env, settings)
+        exec_cache = self._exec_cache(max_age, force_refresh)
+        self._exec_cache_env(env, exec_cache)
+        command_line = ["python", "-m", "wug_backend.runners.router_query"]
+
+        body = None
+        credentials = SshCredentials(username, password, enable_password or password)
+        if self._in_process(settings):
+            lease = self._lease_for(username, password, enable_password)
+
+            def run_in_process(**kwargs):
+                return run_show_query(
+                    routers,
+                    query,
+                    env["WUG_DEVICE_TYPE_DEFAULT"],
+                    **settings,
+                    **exec_cache, lease=lease,
+                    credentials=credentials,
+                    **kwargs,
+                )
+
+            body = run_in_process
+        elif self._worker_pool is not None:
+            body = self._on_worker(
+                job_for(
+                    "query",
+                    routers,
+                    env["WUG_DEVICE_TYPE_DEFAULT"],
+                    settings,
+                    credentials,
+                    query=asdict(query),
+                    exec_cache=exec_cache,
+                )
+            )
+        else:
+            self._credentials_env(env, username, password, enable_password)
+
+        router_count = len([r for r in routers.splitlines() if r.strip()])
+        if stream:
+            return self._start_stream(
+                "query",
+                self._log_file_prefix_query,
+                log_name,
+                routers,
+                current_user,
+                command_line,
+                env,
+                body,
+                self._activity_show_query,
+                f"Started streamed query '{query.command}' on {router_count} router(s)",
+                settings,
+            )
 
+        try:
+            with self._track("query", log_name, router_count, current_user, run_id) as tracked:
+                proc, results_file = self._run_to_completion(command_line, env, body, settings, tracked)
+
+                log_path = self._log_writer.save_log(
+                    self._log_file_prefix_query, proc.stdout, proc.stderr, proc.returncode, log_name
+                )
+                devices, summary = self._keep_results(results_file, log_path)
+                self._record(tracked, proc, log_path, devices)
+
+            self._activity_logger(
+                current_user["id"],
+                self._activity_show_query,
+                f"Ran query '{query.command}' on {router_count} router(s)",
+                "routers",
+            )
+
+            return {
+                "returncode": proc.returncode,
+                "stdout": proc.stdout,
+                "stderr": proc.stderr,
+                "devices": devices,
+                "summary": summary,
+                "table": aggregate_table(devices),
+            }
+        except Exception as e:
+            self._activity_logger(
+                current_user["id"],
+                self._activity_show_query_error,
+                f"Error: {str(e)}",
+                "routers",
+            )
+            return {
+                "returncode": -1,
+                "stdout": "",
+                "stderr": str(e),
+            }
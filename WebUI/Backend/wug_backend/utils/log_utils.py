@@ -1,7 +1,31 @@
 from __future__ import annotations
 
+import gzip
+import json
+import os
 import shutil
+import threading
 from pathlib import Path
+from typing import Iterable
+
+from constants import (
+    LOG_DEVICE_INDEX_SUFFIX,
+    LOG_DEVICE_SHARD_LEVEL,
+    LOG_DEVICE_SHARDS_SUFFIX,
+    LOG_RESULTS_SUFFIX,
+)
+
+LOG_COMPANION_SUFFIXES = (LOG_RESULTS_SUFFIX, LOG_DEVICE_SHARDS_SUFFIX, LOG_DEVICE_INDEX_SUFFIX)
+
+
+def is_log_companion(name: str) -> bool:
+    """Results/shard/index files that belong to a run log rather than being logs themselves."""
+    return name.endswith(LOG_COMPANION_SUFFIXES)
+
+
+def log_companions(log_path: Path) -> list[Path]:
+    """Files kept beside a run log (`run.log` -> `run.jsonl`, `run.devices.gz`, `run.devices.json`)."""
+    return [log_path.with_name(log_path.stem + suffix) for suffix in LOG_COMPANION_SUFFIXES]
 
 
 class LogCollector:
@@ -37,6 +61,101 @@ class OutputSanitizer:
         return text
 
 
+class LogStream:
+    """
+    A log file written as output arrives. stdout lines go in as they are,
+    stderr lines carry the stderr prefix, and the exit code is appended
+    when the run closes the stream.
+    """
+
+    def __init__(self, path: Path, encoding: str, prefix_exit_code: str, prefix_stdout: str, prefix_stderr: str) -> None:
+        self.path = path
+        self._prefix_exit_code = prefix_exit_code
+        self._prefix_stderr = prefix_stderr
+        self._lock = threading.Lock()
+        self._file = open(path, "w", encoding=encoding)
+        self._file.write(f"{prefix_stdout}\n")
+        self._file.flush()
+
+    def write(self, text: str, stream: str = "stdout") -> None:
+        if stream == "stderr":
+            text = "\n".join(f"{self._prefix_stderr} {line}" for line in text.split("\n"))
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(text + "\n")
+            self._file.flush()
+
+    def close(self, code: int | None) -> None:
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(f"\n{self._prefix_exit_code} {code}\n")
+            self._file.close()
+
+
+class DeviceLogShards:
+    """
+    A run's per-device output kept beside its log: `<log>.devices.gz` holds
+    one gzip member per device and `<log>.devices.json` indexes them by
+    device with status, offset and size, so one router's output is read
+    back with a seek instead of loading the whole run log. Concatenated
+    members are still one valid gzip file, so zcat prints every device.
+    """
+
+    def __init__(self, log_path: Path, encoding: str = "utf-8") -> None:
+        self.shards_path = log_path.with_name(log_path.stem + LOG_DEVICE_SHARDS_SUFFIX)
+        self.index_path = log_path.with_name(log_path.stem + LOG_DEVICE_INDEX_SUFFIX)
+        self._encoding = encoding
+
+    def exists(self) -> bool:
+        return self.index_path.exists() and self.shards_path.exists()
+
+    def write(self, devices: Iterable[dict], level: int = LOG_DEVICE_SHARD_LEVEL) -> int:
+        """Shard each device's `output`; returns the number of devices written."""
+        entries = []
+        with open(self.shards_path, "wb") as f:
+            for device in devices:
+                raw = (device.get("output") or "").encode(self._encoding, errors="replace")
+                data = gzip.compress(raw, compresslevel=level)
+                entries.append(
+                    {
+                        "ip": device.get("ip", ""),
+                        "device_type": device.get("device_type", ""),
+                        "status": device.get("status", ""),
+                        "error": device.get("error", ""),
+                        "error_class": device.get("error_class", ""),
+                        "seconds": device.get("seconds", 0.0),
+                        "offset": f.tell(),
+                        "size": len(data),
+                        "raw_size": len(raw),
+                    }
+                )
+                f.write(data)
+        # The index goes last and atomically: a reader that finds it can trust the offsets.
+        tmp = self.index_path.with_name(f"{self.index_path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"devices": entries}, f)
+        os.replace(tmp, self.index_path)
+        return len(entries)
+
+    def index(self) -> list[dict]:
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            return json.load(f)["devices"]
+
+    def read(self, ip: str) -> str | None:
+        """Output of every shard recorded for `ip` (a router listed twice has two), None if it has none."""
+        entries = [e for e in self.index() if e["ip"] == ip]
+        if not entries:
+            return None
+        parts = []
+        with open(self.shards_path, "rb") as f:
+            for entry in entries:
+                f.seek(entry["offset"])
+                parts.append(gzip.decompress(f.read(entry["size"])).decode(self._encoding, errors="replace"))
+        return "\n".join(parts)
+
+
 class LogWriter:
     def __init__(
         self,
@@ -58,15 +177,34 @@ class LogWriter:
         with open(path, "w", encoding=self._default_encoding) as f:
             f.write(content)
 
-    def save_log(self, name: str, stdout: str, stderr: str, code: int, log_name: str | None = None) -> None:
-        """Save log file with optional custom name."""
+    def _log_path(self, name: str, log_name: str | None) -> Path:
         if log_name and log_name.strip():
             filename = self._filename_service.generate_filename("log", "log", log_name)
         else:
             filename = f"{self._filename_service.timestamp()}_{name}.log"
-        path = self._log_dir / filename
+        return self._log_dir / filename
+
+    def open_stream(self, name: str, log_name: str | None = None) -> LogStream:
+        """Open a log that is written incrementally (streamed runs) instead of all at once."""
+        return LogStream(
+            self._log_path(name, log_name),
+            self._default_encoding,
+            self._log_prefix_exit_code,
+            self._log_prefix_stdout,
+            self._log_prefix_stderr,
+        )
+
+    def save_log(self, name: str, stdout: str, stderr: str, code: int, log_name: str | None = None) -> Path:
+        """Save log file with optional custom name."""
+        path = self._log_path(name, log_name)
         self.save_file(
             path,
             f"{self._log_prefix_exit_code} {code}\n\n{self._log_prefix_stdout}\n{stdout}\n\n{self._log_prefix_stderr}\n{stderr}",
         )
+        return path
 
+    def save_device_logs(self, log_path: Path, devices: Iterable[dict]) -> DeviceLogShards:
+        """Shard per-device results (DeviceRunResult dicts) beside the run log at `log_path`."""
+        shards = DeviceLogShards(log_path, self._default_encoding)
+        shards.write(devices)
+        return shards
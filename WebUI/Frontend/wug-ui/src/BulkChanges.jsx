@@ -170,6 +170,7 @@ function BulkChnages() {
               <option value={OPERATIONS.ADD}>Add devices</option>
               <option value={OPERATIONS.DELETE}>Delete devices</option>
               <option value={OPERATIONS.UPDATE}>Update devices</option>
+              <option value={OPERATIONS.UPSERT}>Add or update devices</option>
             </select>
             <span className="helper-text">
               Choose what you want to do with the devices listed in the Excel
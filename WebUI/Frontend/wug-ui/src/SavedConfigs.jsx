@@ -5,6 +5,8 @@ const SECTIONS = [
   "bulk_add",
   "bulk_update",
   "bulk_delete",
+  "bulk_upsert",
+  "bulk_monitor",
   "router_simple",
   "router_interactive",
 ];
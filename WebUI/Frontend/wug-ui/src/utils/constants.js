@@ -68,6 +68,7 @@ export const OPERATIONS = {
   ADD: "add",
   UPDATE: "update",
   DELETE: "delete",
+  UPSERT: "upsert",
   INTERACTIVE: "interactive",
   SIMPLE: "simple",
 };
@@ -143,6 +144,7 @@ export const TEMPLATE_NAMES = {
   BULK_ADD: "bulk_add_template.xlsx",
   BULK_UPDATE: "bulk_update_template.xlsx",
   BULK_DELETE: "bulk_delete_template.xlsx",
+  BULK_UPSERT: "bulk_upsert_template.xlsx",
 };
 
 // ================= ERROR MESSAGES =================